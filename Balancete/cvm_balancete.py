@@ -1,28 +1,39 @@
-
 import sys, os
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
 	sys.path.insert(0, project_root)
-from utils.cvm_utils import baixar_arquivo
+from utils.cvm_utils import baixar_arquivo, gerar_lista_ano_mes
+from utils import downloader
+
+DATASET = 'balancete'
+URL = 'https://dados.cvm.gov.br/dados/FI/DOC/BALANCETE/DADOS/balancete_fi_{periodo}.zip'
 
 # ================================
 # Função para baixar e carregar dados de balancete de um mês/ano
 # ================================
 def carregar_dados_balancete(ano, mes):
-    mes = str(mes).zfill(2)
-    url = f'https://dados.cvm.gov.br/dados/FI/DOC/BALANCETE/DADOS/balancete_fi_{ano}{mes}.zip'
-    nome_arquivo = f"balancete_fi_{ano}{mes}.zip"
+    periodo = f"{ano}{str(mes).zfill(2)}"
+    url = URL.format(periodo=periodo)
+    nome_arquivo = f"balancete_fi_{periodo}.zip"
     return baixar_arquivo(url, nome_arquivo)
 
+# ================================
+# Funções para uso pelo pipeline (vários períodos AAAAMM)
+# ================================
+def montar_jobs(periodos):
+    return downloader.montar_jobs(DATASET, URL, periodos)
+
+def baixar_periodos(periodos, engine=None, callback=None):
+    """Baixa os balancetes dos períodos AAAAMM informados; retorna um resultado por período."""
+    return downloader.baixar_periodos(DATASET, URL, periodos, engine, callback)
+
 # ================================
 # 2. Definir anos e meses desejados (edite conforme necessário)
 # ================================
-anos = [2024]
-meses = [1, 2, 3]
+if __name__ == "__main__":
+	anos = [2024]
+	meses = [1, 2, 3]
 
-for ano in anos:
-	for mes in meses:
-		try:
-			zip_path = carregar_dados_balancete(str(ano), mes)
-		except Exception as e:
-			print(f"Erro ao baixar arquivo para {ano}-{str(mes).zfill(2)}: {e}")
\ No newline at end of file
+	for resultado in baixar_periodos(gerar_lista_ano_mes(anos, meses)):
+		if not resultado.ok:
+			print(f"Erro ao baixar arquivo para {resultado.job.periodo}: {resultado.erro}")
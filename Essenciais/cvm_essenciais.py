@@ -1,29 +1,39 @@
-
 import sys, os
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
 	sys.path.insert(0, project_root)
 from utils.cvm_utils import baixar_arquivo, gerar_lista_ano_mes
+from utils import downloader
+
+DATASET = 'essenciais'
+URL = "https://dados.cvm.gov.br/dados/FI/DOC/LAMINA/DADOS/lamina_fi_{periodo}.zip"
 
 # ================================
 # Função para baixar e salvar arquivos essenciais (LAMINA)
 # ================================
 def baixar_lamina(ano_mes):
-    url = f"https://dados.cvm.gov.br/dados/FI/DOC/LAMINA/DADOS/lamina_fi_{ano_mes}.zip"
+    url = URL.format(periodo=ano_mes)
     nome_arquivo = f"lamina_fi_{ano_mes}.zip"
     return baixar_arquivo(url, nome_arquivo)
 
 # ================================
+# Funções para uso pelo pipeline (vários períodos AAAAMM)
+# ================================
+def montar_jobs(periodos):
+    return downloader.montar_jobs(DATASET, URL, periodos)
+
+def baixar_periodos(periodos, engine=None, callback=None):
+    """Baixa as lâminas dos períodos AAAAMM informados; retorna um resultado por período."""
+    return downloader.baixar_periodos(DATASET, URL, periodos, engine, callback)
 
 # ================================
 # Escolha dos anos e meses (edite conforme necessário)
 # ================================
-anos = [2024]
-meses = [1, 2, 3]
-ano_mes_list = gerar_lista_ano_mes(anos, meses)
+if __name__ == "__main__":
+	anos = [2024]
+	meses = [1, 2, 3]
+	ano_mes_list = gerar_lista_ano_mes(anos, meses)
 
-for ano_mes in ano_mes_list:
-	try:
-		zip_path = baixar_lamina(ano_mes)
-	except Exception as e:
-		print(f"Erro ao baixar arquivo para {ano_mes}: {e}")
\ No newline at end of file
+	for resultado in baixar_periodos(ano_mes_list):
+		if not resultado.ok:
+			print(f"Erro ao baixar arquivo para {resultado.job.periodo}: {resultado.erro}")
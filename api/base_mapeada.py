@@ -0,0 +1,228 @@
+"""
+Base da API mapeada em memória (mmap), com índice de deslocamentos por CNPJ.
+
+Formato do arquivo (.cvmdb):
+
+    MAGIA (8 bytes)
+    um blob por fundo: o JSON de /fundos/{cnpj}, já serializado
+    índice: JSON com, para cada fundo em ordem de CNPJ normalizado,
+            [cnpj normalizado, deslocamento, tamanho, fund, valores das métricas do ranking]
+    rodapé: deslocamento e tamanho do índice (uint64 little-endian) + MAGIA
+
+Na abertura só o índice é lido: a API sobe sem converter nenhum fundo, serve
+/fundos/{cnpj} fatiando os bytes do blob e só converte um fundo para colunas
+quando um endpoint precisa dos seus históricos. O arquivo é mapeado somente
+leitura, então vários workers do uvicorn compartilham o mesmo page cache em
+vez de cada um manter sua cópia da base.
+
+Uso (a origem pode ser o database.json ou a pasta Parquet):
+    python api/base_mapeada.py api/database.json api/database.cvmdb
+    CVM_DATABASE=api/database.cvmdb uvicorn main:app
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional, Tuple
+from indicadores import METRICAS_RANKING
+from series import DadosFundo, Dicionario, dados_do_fundo
+
+MAGIA = b"CVMDB\x00\x01\n"
+_RODAPE = struct.Struct("<QQ8s")
+
+# Fundos convertidos para colunas mantidos em memória por base aberta
+FUNDOS_EM_CACHE = 256
+
+def _serializar(dados) -> bytes:
+    # Mesma serialização do JSONResponse da API
+    return json.dumps(dados, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+# ------------------------------
+# ESCRITA
+# ------------------------------
+def gravar_base_mapeada(fundos: Iterable[Tuple[str, DadosFundo]], destino: str) -> int:
+    """
+    Grava (cnpj normalizado, DadosFundo) no formato mapeado, um fundo por vez.
+    O arquivo é escrito ao lado e só substitui o destino ao final.
+    """
+    tmp_path = destino + ".tmp"
+    entradas = []
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIA)
+            for chave, dados in fundos:
+                blob = _serializar(dados.como_dict())
+                metricas = [dados.indicadores.get(m) for m in METRICAS_RANKING]
+                entradas.append([chave, f.tell(), len(blob), dados.fund, metricas])
+                f.write(blob)
+            entradas.sort(key=lambda e: e[0])
+            indice = _serializar({"metricas": list(METRICAS_RANKING), "fundos": entradas})
+            inicio_indice = f.tell()
+            f.write(indice)
+            f.write(_RODAPE.pack(inicio_indice, len(indice), MAGIA))
+        os.replace(tmp_path, destino)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(entradas)
+
+# ------------------------------
+# LEITURA
+# ------------------------------
+class BaseMapeada:
+    """Arquivo .cvmdb aberto com mmap: índice em memória, blobs lidos do page cache."""
+
+    def __init__(self, caminho: str):
+        with open(caminho, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mmap) < len(MAGIA) + _RODAPE.size or self._mmap[:len(MAGIA)] != MAGIA:
+                raise ValueError(f"{caminho} não é uma base mapeada")
+            inicio, tamanho, magia = _RODAPE.unpack(self._mmap[-_RODAPE.size:])
+            if magia != MAGIA:
+                raise ValueError(f"{caminho} está incompleto (rodapé ausente)")
+            indice = json.loads(self._mmap[inicio:inicio + tamanho])
+        except BaseException:
+            self._mmap.close()
+            raise
+
+        metricas = indice["metricas"]
+        entradas = indice["fundos"]
+        self.chaves: List[str] = [e[0] for e in entradas]
+        self.resumo: List[dict] = [e[3] for e in entradas]
+        self.indicadores: List[dict] = [dict(zip(metricas, e[4])) for e in entradas]
+        self._blobs: Dict[str, Tuple[int, int]] = {e[0]: (e[1], e[2]) for e in entradas}
+
+    @staticmethod
+    def reconhece(caminho: str) -> bool:
+        """True se o arquivo começa com a assinatura do formato mapeado."""
+        if not os.path.isfile(caminho):
+            return False
+        with open(caminho, "rb") as f:
+            return f.read(len(MAGIA)) == MAGIA
+
+    def json(self, chave: str) -> Optional[bytes]:
+        """JSON pronto do fundo (o corpo de /fundos/{cnpj}), ou None."""
+        posicao = self._blobs.get(chave)
+        if posicao is None:
+            return None
+        inicio, tamanho = posicao
+        return self._mmap[inicio:inicio + tamanho]
+
+    def fundo(self, chave: str) -> Optional[dict]:
+        """O fundo como dict (o conteúdo do blob), ou None."""
+        bruto = self.json(chave)
+        return None if bruto is None else json.loads(bruto)
+
+    def close(self):
+        """Libera o mapeamento do arquivo. Sem isso, ele é liberado quando a base deixa de ser referenciada."""
+        self._mmap.close()
+
+    def __contains__(self, chave: str) -> bool:
+        return chave in self._blobs
+
+    def __len__(self) -> int:
+        return len(self.chaves)
+
+class FundosMapeados(Mapping):
+    """
+    CNPJ normalizado -> DadosFundo de uma base lida sob demanda (mapeada ou SQL,
+    ver base_sql.py). Cada fundo é convertido para colunas quando pedido e fica
+    num cache LRU de `maximo` fundos.
+    """
+
+    def __init__(self, base, dicionarios: Dict[str, Dicionario], maximo: int = FUNDOS_EM_CACHE):
+        self.base = base
+        self.dicionarios = dicionarios
+        self.maximo = maximo
+        self._cache: "OrderedDict[str, DadosFundo]" = OrderedDict()
+        # Protege só o LRU e `_convertendo`; a leitura e a conversão rodam fora dele
+        self._lock = threading.Lock()
+        # Um lock por fundo em conversão, para que pedidos simultâneos do mesmo CNPJ o convertam uma vez
+        self._convertendo: Dict[str, threading.Lock] = {}
+
+    def _em_cache(self, chave: str) -> Optional[DadosFundo]:
+        with self._lock:
+            dados = self._cache.get(chave)
+            if dados is not None:
+                self._cache.move_to_end(chave)
+            return dados
+
+    def __getitem__(self, chave: str) -> DadosFundo:
+        dados = self._em_cache(chave)
+        if dados is not None:
+            return dados
+        with self._lock:
+            lock_fundo = self._convertendo.setdefault(chave, threading.Lock())
+
+        with lock_fundo:
+            # Outra thread pode ter convertido o fundo enquanto esta esperava
+            dados = self._em_cache(chave)
+            if dados is not None:
+                return dados
+            try:
+                bruto = self.base.fundo(chave)
+                if bruto is None:
+                    raise KeyError(chave)
+                try:
+                    dados = dados_do_fundo(bruto, self.dicionarios)
+                except Exception as e:
+                    # Como na carga do database.json: um fundo inválido fica fora da base
+                    print(f"Erro ao carregar fundo {chave}: {e}")
+                    raise KeyError(chave) from e
+                with self._lock:
+                    self._cache[chave] = dados
+                    if len(self._cache) > self.maximo:
+                        self._cache.popitem(last=False)
+                return dados
+            finally:
+                with self._lock:
+                    self._convertendo.pop(chave, None)
+
+    def __contains__(self, chave) -> bool:
+        return chave in self.base
+
+    def __iter__(self):
+        return iter(self.base.chaves)
+
+    def __len__(self) -> int:
+        return len(self.base)
+
+# ------------------------------
+# CONVERSÃO
+# ------------------------------
+def main():
+    from store import ler_fundos, normalize_cnpj
+
+    parser = argparse.ArgumentParser(description="Converte a base da API para o formato mapeado (.cvmdb).")
+    parser.add_argument("origem", help="database.json ou pasta do armazenamento Parquet")
+    parser.add_argument("destino", help="Arquivo .cvmdb a gerar")
+    args = parser.parse_args()
+
+    inicio = time.monotonic()
+    dicionarios: Dict[str, Dicionario] = {}
+
+    def convertidos():
+        vistos = set()
+        for cnpj, dados in ler_fundos(args.origem):
+            chave = normalize_cnpj(cnpj)
+            if chave in vistos:
+                continue
+            vistos.add(chave)
+            try:
+                yield chave, dados_do_fundo(dados, dicionarios)
+            except Exception as e:
+                print(f"Erro ao converter fundo {cnpj}: {e}")
+
+    total = gravar_base_mapeada(convertidos(), args.destino)
+    print(f"Base mapeada com {total} fundos gravada em {args.destino} ({time.monotonic() - inicio:.1f}s)")
+
+if __name__ == "__main__":
+    main()
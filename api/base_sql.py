@@ -0,0 +1,158 @@
+"""
+Leitura da base da API em SQLite (gerada por utils/monta_base.py com destino .sqlite).
+
+Os fundos não ficam em memória: cada um é lido pelas suas chaves indexadas
+(chave, data) quando um endpoint precisa dele. As consultas entre fundos
+(PL de um tipo numa data, uma conta do balancete em todos os fundos, os
+detentores de um ativo) usam os índices do banco em vez de percorrer a base, e
+os indicadores do ranking vêm prontos da tabela `indicadores`.
+
+Cada thread usa sua própria conexão, aberta somente leitura.
+"""
+
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import quote
+import numpy as np
+from indicadores import METRICAS_RANKING
+from posicoes import resumir_posicoes
+from series import HISTORICOS, LOGICO
+
+ASSINATURA = b"SQLite format 3\x00"
+
+class BaseSQL:
+    """Banco SQLite da API: dados básicos em memória, históricos lidos sob demanda."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._local = threading.local()
+        linhas = self._conexao().execute("SELECT chave, cnpj, name, tipo FROM fundos ORDER BY chave").fetchall()
+        self.chaves: List[str] = [linha[0] for linha in linhas]
+        self.resumo: List[dict] = [{"cnpj": cnpj, "name": name, "tipo": tipo} for _, cnpj, name, tipo in linhas]
+        # Posição de cada fundo em `chaves` (e em `resumo`)
+        self._posicoes: Dict[str, int] = {chave: i for i, chave in enumerate(self.chaves)}
+
+    @staticmethod
+    def reconhece(caminho: str) -> bool:
+        """True se o arquivo é um banco SQLite."""
+        try:
+            with open(caminho, "rb") as f:
+                return f.read(len(ASSINATURA)) == ASSINATURA
+        except OSError:
+            return False
+
+    def _conexao(self) -> sqlite3.Connection:
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(f"file:{quote(self.caminho)}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conexao = conexao
+        return conexao
+
+    def historico(self, chave: str, atributo: str) -> List[dict]:
+        """Registros de um histórico do fundo, na ordem em que foram gravados."""
+        campos = HISTORICOS[atributo][1]
+        logicos = [campo for campo, tipo in campos.items() if tipo == LOGICO]
+        cursor = self._conexao().execute(
+            f"SELECT {', '.join(campos)} FROM {atributo} WHERE chave = ? ORDER BY rowid", (chave,))
+        registros = [dict(zip(campos, linha)) for linha in cursor]
+        for registro in registros:
+            # SQLite guarda booleanos como 0/1
+            for campo in logicos:
+                if registro[campo] is not None:
+                    registro[campo] = bool(registro[campo])
+        return registros
+
+    def fundo(self, chave: str) -> Optional[dict]:
+        """O fundo no formato do database.json, ou None."""
+        linha = self._conexao().execute("SELECT cnpj, name, tipo FROM fundos WHERE chave = ?", (chave,)).fetchone()
+        if linha is None:
+            return None
+        fundo = {"fund": dict(zip(("cnpj", "name", "tipo"), linha))}
+        for atributo in HISTORICOS:
+            fundo[atributo] = self.historico(chave, atributo)
+        return fundo
+
+    def indicadores(self) -> Optional[List[dict]]:
+        """
+        Métricas do ranking de cada fundo, na ordem de `chaves`, calculadas na montagem
+        da base. None se o banco foi gerado antes da tabela `indicadores` existir.
+        """
+        conexao = self._conexao()
+        existe = conexao.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'indicadores'").fetchone()
+        if existe is None:
+            return None
+        vazio = dict.fromkeys(METRICAS_RANKING)
+        por_chave = {linha[0]: dict(zip(METRICAS_RANKING, linha[1:])) for linha in
+                     conexao.execute(f"SELECT chave, {', '.join(METRICAS_RANKING)} FROM indicadores")}
+        return [por_chave.get(chave, vazio) for chave in self.chaves]
+
+    def __contains__(self, chave: str) -> bool:
+        return chave in self._posicoes
+
+    def __len__(self) -> int:
+        return len(self.chaves)
+
+    # ------------------------------
+    # CONSULTAS ENTRE FUNDOS
+    # ------------------------------
+    def patrimonio_na_data(self, data: str, tipo: Optional[str] = None, pl_min: Optional[float] = None,
+                           pl_max: Optional[float] = None, limit: int = 100) -> List[dict]:
+        """Fundos com PL informado no informe diário da data, do maior para o menor PL."""
+        filtros, parametros = ["d.data = ?", "d.vl_patrim_liq IS NOT NULL"], [data]
+        if tipo is not None:
+            filtros.append("f.tipo = ?")
+            parametros.append(tipo)
+        if pl_min is not None:
+            filtros.append("d.vl_patrim_liq >= ?")
+            parametros.append(pl_min)
+        if pl_max is not None:
+            filtros.append("d.vl_patrim_liq <= ?")
+            parametros.append(pl_max)
+        # Se um fundo tiver mais de uma linha na data, vale a primeira (como nos indicadores)
+        sql = f"""
+            SELECT f.cnpj, f.name, f.tipo, d.data, d.vl_patrim_liq
+            FROM daily_info d JOIN fundos f ON f.chave = d.chave
+            WHERE {' AND '.join(filtros)}
+              AND d.rowid = (SELECT MIN(rowid) FROM daily_info WHERE chave = d.chave AND data = d.data)
+            ORDER BY d.vl_patrim_liq DESC
+            LIMIT ?"""
+        cursor = self._conexao().execute(sql, (*parametros, limit))
+        return [dict(zip(("cnpj", "name", "tipo", "data", "vl_patrim_liq"), linha)) for linha in cursor]
+
+    def saldos_da_conta(self, codigo_conta: str, data: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """Saldos de uma conta do balancete em todos os fundos (mais recentes e maiores primeiro)."""
+        filtros, parametros = ["b.codigo_conta = ?"], [codigo_conta]
+        if data is not None:
+            filtros.append("b.data = ?")
+            parametros.append(data)
+        sql = f"""
+            SELECT f.cnpj, f.name, f.tipo, b.data, b.plano_conta, b.codigo_conta, b.saldo
+            FROM balances b JOIN fundos f ON f.chave = b.chave
+            WHERE {' AND '.join(filtros)}
+            ORDER BY b.data DESC, b.saldo DESC
+            LIMIT ?"""
+        cursor = self._conexao().execute(sql, (*parametros, limit))
+        campos = ("cnpj", "name", "tipo", "data", "plano_conta", "codigo_conta", "saldo")
+        return [dict(zip(campos, linha)) for linha in cursor]
+
+    def detentores(self, codigo: str, resumo: List[dict], periodo: Optional[str] = None,
+                   limit: int = 100) -> Optional[dict]:
+        """
+        Mesma resposta de IndicePosicoes.detentores, lendo só as linhas de CDA do ativo
+        pelos índices ISIN/SELIC do banco, sem converter nenhum fundo.
+        """
+        cursor = self._conexao().execute(
+            "SELECT chave, data, valor_mercado, quantidade, isin = ? FROM applications"
+            " WHERE isin = ? OR selic = ? ORDER BY chave, rowid", (codigo, codigo, codigo))
+        linhas = cursor.fetchall()
+        # Como no índice em memória: o ISIN tem precedência sobre o código SELIC
+        campo = "isin" if any(linha[4] for linha in linhas) else "selic"
+        linhas = [linha for linha in linhas if bool(linha[4]) == (campo == "isin")]
+        if not linhas:
+            return None
+        chaves, datas, valores, quantidades, _ = zip(*linhas)
+        fundo = np.array([self._posicoes[chave] for chave in chaves], dtype=np.int32)
+        return resumir_posicoes(codigo, campo, resumo, fundo, np.array(datas, dtype="datetime64[D]"),
+                                np.array(valores, dtype=np.float64), np.array(quantidades, dtype=np.float64),
+                                periodo, limit)
@@ -0,0 +1,149 @@
+"""
+Benchmark da API: requisições por segundo com a serialização padrão e com
+a serialização rápida (CVM_JSON_RAPIDO=1, orjson).
+
+Gera uma base sintética com volumes próximos dos reais (um ano de
+informações diárias e alguns milhares de linhas de CDA nos fundos maiores),
+sobe a API com uvicorn uma vez para cada modo e mede os endpoints de
+detalhes e de aplicações. O cache de respostas é desligado para medir a
+serialização, e não o cache.
+
+Uso:
+    python api/benchmark.py --fundos 200 --segundos 10 --conexoes 8
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import requests
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ------------------------------
+# BASE SINTÉTICA
+# ------------------------------
+def gerar_base(caminho: str, fundos: int, aplicacoes: int, semente: int = 42):
+    """Grava um database.json sintético com `fundos` fundos e até `aplicacoes` linhas de CDA por fundo."""
+    rng = random.Random(semente)
+    dias = [datetime.date(2024, 1, 1) + datetime.timedelta(d) for d in range(366)]
+    dias = [d.isoformat() for d in dias if d.weekday() < 5]
+    meses = [f"2024-{m:02d}-28" for m in range(1, 13)]
+    tipos_aplic = ["Títulos Públicos", "Cotas de Fundos", "Operações Compromissadas", "Debêntures", "Ações"]
+    base = {}
+    for i in range(fundos):
+        cnpj = f"{i // 1000:02d}.{i % 1000:03d}.{rng.randint(0, 999):03d}/0001-{i % 97:02d}"
+        # Poucos fundos grandes concentram a maior parte das aplicações
+        n_aplic = aplicacoes if i % 10 == 0 else aplicacoes // 20
+        base[cnpj] = {
+            "fund": {"cnpj": cnpj, "name": f"FUNDO DE INVESTIMENTO {i} MULTIMERCADO", "tipo": rng.choice(["FI", "FIC", "FIF"])},
+            "balances": [{"data": meses[m], "plano_conta": "COFI", "codigo_conta": str(10000000 + j),
+                          "saldo": rng.random() * 1e7} for m in range(3) for j in range(40)],
+            "applications": [{"data": meses[j % 12], "tipo_aplic": rng.choice(tipos_aplic),
+                              "tipo_ativo": "Título público federal", "emissor_ligado": rng.choice([True, False, None]),
+                              "tipo_negoc": "Para negociação", "quantidade": float(rng.randint(1, 10000)),
+                              "valor_mercado": rng.random() * 1e6, "custo": None,
+                              "isin": f"BRSTNCNTB{rng.randint(0, 999):03d}", "selic": str(760000 + rng.randint(0, 999)),
+                              "emissao": "2018-01-10", "vencimento": "2028-08-15"} for j in range(n_aplic)],
+            "patrimonio": [{"data": m, "vl_patrim_liq": rng.random() * 1e8} for m in meses],
+            "daily_info": [{"data": d, "vl_total": rng.random() * 1e8, "vl_quota": 1 + rng.random(),
+                            "vl_patrim_liq": rng.random() * 1e8, "captc_dia": rng.random() * 1e4,
+                            "resg_dia": rng.random() * 1e4, "nr_cotst": float(rng.randint(1, 5000))} for d in dias],
+        }
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(base, f, ensure_ascii=False)
+    return list(base)
+
+# ------------------------------
+# SERVIDOR E CARGA
+# ------------------------------
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def subir_api(db_path: str, json_rapido: bool):
+    porta = _porta_livre()
+    env = dict(os.environ, CVM_DATABASE=db_path, CVM_JSON_RAPIDO="1" if json_rapido else "0", CVM_CACHE_BYTES="0")
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(porta), "--log-level", "warning"],
+        cwd=API_DIR, env=env,
+    )
+    url = f"http://127.0.0.1:{porta}"
+    for _ in range(600):
+        try:
+            requests.get(url + "/", timeout=1)
+            return processo, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    processo.terminate()
+    raise RuntimeError("A API não subiu a tempo")
+
+def medir(url: str, caminhos: list, segundos: float, conexoes: int) -> float:
+    """Requisições por segundo, com `conexoes` threads fazendo GETs em sequência."""
+    fim = time.monotonic() + segundos
+    contagens = [0] * conexoes
+
+    def trabalhador(i):
+        sessao = requests.Session()
+        # Sem compressão: mede a serialização, não o gzip
+        sessao.headers["Accept-Encoding"] = "identity"
+        rng = random.Random(i)
+        while time.monotonic() < fim:
+            r = sessao.get(url + rng.choice(caminhos))
+            r.raise_for_status()
+            contagens[i] += 1
+
+    threads = [threading.Thread(target=trabalhador, args=(i,)) for i in range(conexoes)]
+    inicio = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(contagens) / (time.monotonic() - inicio)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da serialização JSON da API.")
+    parser.add_argument("--fundos", type=int, default=200)
+    parser.add_argument("--aplicacoes", type=int, default=5000, help="Linhas de CDA dos maiores fundos")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--conexoes", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, "database.json")
+        print(f"Gerando base sintética com {args.fundos} fundos...")
+        cnpjs = gerar_base(db_path, args.fundos, args.aplicacoes)
+        grandes = [c for i, c in enumerate(cnpjs) if i % 10 == 0]
+        cenarios = {
+            "/fundos/{cnpj} (fundos grandes)": [f"/fundos/{c}" for c in grandes],
+            "/fundos/{cnpj}/applications": [f"/fundos/{c}/applications" for c in grandes],
+            "/fundos/{cnpj}/daily-info": [f"/fundos/{c}/daily-info" for c in cnpjs],
+        }
+
+        resultados = {}
+        for nome_modo, rapido in (("padrão", False), ("orjson", True)):
+            processo, url = subir_api(db_path, rapido)
+            try:
+                for cenario, caminhos in cenarios.items():
+                    medir(url, caminhos, 1, args.conexoes)  # aquecimento
+                    resultados[(cenario, nome_modo)] = medir(url, caminhos, args.segundos, args.conexoes)
+                    print(f"{nome_modo:>7} | {cenario}: {resultados[(cenario, nome_modo)]:.1f} req/s")
+            finally:
+                processo.terminate()
+                processo.wait()
+
+    print("\nCenário                                  padrão     orjson   ganho")
+    for cenario in cenarios:
+        antes, depois = resultados[(cenario, "padrão")], resultados[(cenario, "orjson")]
+        print(f"{cenario:<38} {antes:>8.1f} {depois:>10.1f} {depois / antes:>6.2f}x")
+
+if __name__ == "__main__":
+    main()
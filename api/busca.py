@@ -0,0 +1,79 @@
+"""
+Busca de fundos por nome e tipo, com índice invertido montado na carga da base.
+
+Nomes e tipos são normalizados (sem acentos, minúsculas) e quebrados em
+palavras: "FUNDO DE AÇÕES" vira ["fundo", "de", "acoes"]. Cada palavra aponta
+para a lista ordenada das posições dos fundos que a contêm. Numa consulta,
+cada palavra buscada casa por prefixo ("aco" encontra "acoes") e os fundos
+precisam conter todas elas.
+"""
+
+import bisect
+import re
+import unicodedata
+from typing import Dict, List, Optional
+import numpy as np
+
+_SEPARADORES = re.compile(r"[^0-9a-z]+")
+
+def normalizar_texto(texto: str) -> str:
+    """Remove acentos e passa para minúsculas ("AÇÕES" -> "acoes")."""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+def palavras(texto: str) -> List[str]:
+    return [p for p in _SEPARADORES.split(normalizar_texto(texto)) if p]
+
+class IndiceBusca:
+    """
+    Índice invertido sobre `name` e `tipo` dos fundos, na ordem de `chaves` do store.
+    `pls` traz o último PL de cada fundo (NaN se desconhecido), para filtro e ordenação.
+    """
+
+    def __init__(self, resumo: List[dict], pls: np.ndarray):
+        self.pls = pls
+        postagens: Dict[str, List[int]] = {}
+        tipos: Dict[str, List[int]] = {}
+        for posicao, fund in enumerate(resumo):
+            for palavra in set(palavras(fund.get("name", "")) + palavras(fund.get("tipo", ""))):
+                postagens.setdefault(palavra, []).append(posicao)
+            tipos.setdefault(normalizar_texto(fund.get("tipo", "")), []).append(posicao)
+        # Palavras em ordem alfabética: as que começam com um prefixo ficam contíguas
+        self.palavras = sorted(postagens)
+        self.postagens = [np.array(postagens[p], dtype=np.int32) for p in self.palavras]
+        self.tipos = {tipo: np.array(posicoes, dtype=np.int32) for tipo, posicoes in tipos.items()}
+        self.total = len(resumo)
+
+    def _por_prefixo(self, prefixo: str) -> np.ndarray:
+        inicio = bisect.bisect_left(self.palavras, prefixo)
+        fim = bisect.bisect_left(self.palavras, prefixo + "\uffff")
+        if fim - inicio == 1:
+            return self.postagens[inicio]
+        return np.unique(np.concatenate(self.postagens[inicio:fim] or [np.empty(0, dtype=np.int32)]))
+
+    def buscar(self, consulta: Optional[str] = None, tipo: Optional[str] = None,
+               pl_min: Optional[float] = None, pl_max: Optional[float] = None) -> np.ndarray:
+        """Posições dos fundos que atendem à consulta e aos filtros, do maior para o menor PL."""
+        posicoes = None
+        for termo in palavras(consulta or ""):
+            encontrados = self._por_prefixo(termo)
+            posicoes = encontrados if posicoes is None else np.intersect1d(posicoes, encontrados, assume_unique=True)
+            if not len(posicoes):
+                return posicoes
+        if tipo:
+            do_tipo = self.tipos.get(normalizar_texto(tipo), np.empty(0, dtype=np.int32))
+            posicoes = do_tipo if posicoes is None else np.intersect1d(posicoes, do_tipo, assume_unique=True)
+        if posicoes is None:
+            posicoes = np.arange(self.total, dtype=np.int32)
+
+        pls = self.pls[posicoes]
+        if pl_min is not None or pl_max is not None:
+            # Comparações com NaN são falsas: fundos sem PL ficam de fora
+            dentro = np.ones(len(posicoes), dtype=bool)
+            if pl_min is not None:
+                dentro &= pls >= pl_min
+            if pl_max is not None:
+                dentro &= pls <= pl_max
+            posicoes, pls = posicoes[dentro], pls[dentro]
+        # Maior PL primeiro; fundos sem PL por último
+        return posicoes[np.argsort(np.where(np.isnan(pls), np.inf, -pls), kind="stable")]
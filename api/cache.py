@@ -0,0 +1,262 @@
+"""
+Cache HTTP da API: ETag, 304, compressão e cache LRU das respostas serializadas.
+
+A base só muda quando o pipeline publica um novo database.json, então toda
+resposta GET pode ser identificada pela versão da base + rota + parâmetros:
+
+- o ETag é derivado disso, e um If-None-Match igual (ou `*`) responde 304
+  só quando o endpoint responderia 200: direto do cache, se a resposta já
+  estiver lá, ou depois de executá-lo; erros (404, 400) seguem como estão;
+- corpos a partir de COMPRIMIR_A_PARTIR_DE bytes são comprimidos com gzip
+  (ou brotli, se o pacote `brotli` estiver instalado e o cliente aceitar);
+- os bytes finais (já comprimidos) ficam num cache LRU limitado por um
+  orçamento de memória e descartado inteiro quando a versão da base muda.
+
+Respostas de até LIMITE_BUFFER bytes são montadas inteiras antes de sair; as
+maiores seguem em streaming, comprimidas em blocos, e entram no cache ao final
+se couberem no limite por item. Corpos e blocos grandes são comprimidos no
+executor da API (ver execucao.py), fora do laço de eventos.
+"""
+
+import functools
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+try:
+    import brotli
+except ImportError:  # dependência opcional
+    brotli = None
+
+COMPRIMIR_A_PARTIR_DE = 1024
+ORCAMENTO_PADRAO = 64 * 1024 * 1024
+MAX_AGE_PADRAO = 0
+
+# Bytes do corpo acumulados antes de responder; acima disso a resposta segue em streaming
+LIMITE_BUFFER = 256 * 1024
+
+# Acima disso a compressão vai para o executor em vez de rodar no laço de eventos
+COMPRIMIR_NO_LACO_ATE = 64 * 1024
+
+# Cabeçalhos da resposta original que não valem para o corpo recodificado
+_CABECALHOS_DESCARTADOS = {"content-length", "content-encoding", "content-type", "etag", "cache-control", "vary"}
+
+class RespostaCacheada(NamedTuple):
+    corpo: bytes
+    media_type: Optional[str]
+    cabecalhos: List[Tuple[str, str]]  # demais cabeçalhos do endpoint (ex.: X-Next-Cursor)
+    codificacao: Optional[str]         # compressão aplicada ao corpo
+
+# ------------------------------
+# CACHE LRU COM ORÇAMENTO DE MEMÓRIA
+# ------------------------------
+class CacheRespostas:
+    """Respostas serializadas por (rota + parâmetros, codificação), da versão atual da base."""
+
+    def __init__(self, orcamento_bytes: int = ORCAMENTO_PADRAO):
+        self.orcamento_bytes = orcamento_bytes
+        # Um item maior que isso ocuparia uma fatia grande demais do cache
+        self.maximo_item = orcamento_bytes // 8
+        self._itens: "OrderedDict[tuple, RespostaCacheada]" = OrderedDict()
+        self._versao = None
+        self._tamanho = 0
+        self._lock = threading.Lock()
+
+    def _trocar_versao(self, versao: str):
+        if versao != self._versao:
+            self._itens.clear()
+            self._tamanho = 0
+            self._versao = versao
+
+    def get(self, versao: str, chave: tuple) -> Optional[RespostaCacheada]:
+        with self._lock:
+            self._trocar_versao(versao)
+            item = self._itens.get(chave)
+            if item is not None:
+                self._itens.move_to_end(chave)
+            return item
+
+    def guardar(self, versao: str, chave: tuple, item: RespostaCacheada):
+        if len(item.corpo) > self.maximo_item:
+            return
+        with self._lock:
+            self._trocar_versao(versao)
+            antigo = self._itens.pop(chave, None)
+            if antigo is not None:
+                self._tamanho -= len(antigo.corpo)
+            self._itens[chave] = item
+            self._tamanho += len(item.corpo)
+            # Descarta os menos usados até caber no orçamento
+            while self._tamanho > self.orcamento_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self._tamanho -= len(removido.corpo)
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+    @property
+    def tamanho(self) -> int:
+        return self._tamanho
+
+# ------------------------------
+# COMPRESSÃO
+# ------------------------------
+def escolher_codificacao(accept_encoding: str) -> Optional[str]:
+    """'br', 'gzip' ou None, conforme o Accept-Encoding do cliente."""
+    aceitas = set()
+    for parte in accept_encoding.lower().split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        if parametros.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        aceitas.add(nome.strip())
+    if brotli is not None and "br" in aceitas:
+        return "br"
+    if "gzip" in aceitas or "*" in aceitas:
+        return "gzip"
+    return None
+
+class _Compressor:
+    """Compressão em blocos (gzip ou brotli) para os corpos em streaming."""
+
+    def __init__(self, codificacao: str):
+        if codificacao == "br":
+            self._objeto = brotli.Compressor(quality=5)
+            self.comprimir, self.finalizar = self._objeto.process, self._objeto.finish
+        else:
+            self._objeto = zlib.compressobj(6, zlib.DEFLATED, 31)
+            self.comprimir, self.finalizar = self._objeto.compress, self._objeto.flush
+
+def comprimir(corpo: bytes, codificacao: str) -> bytes:
+    compressor = _Compressor(codificacao)
+    return compressor.comprimir(corpo) + compressor.finalizar()
+
+# ------------------------------
+# MIDDLEWARE
+# ------------------------------
+def _sem_prefixo_fraco(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+def _etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip() for e in if_none_match.split(",")]
+    # Comparação fraca: W/"x" e "x" são equivalentes
+    return "*" in etiquetas or _sem_prefixo_fraco(etag) in map(_sem_prefixo_fraco, etiquetas)
+
+class CacheHTTP(BaseHTTPMiddleware):
+    """
+    Aplica ETag, 304, compressão e o cache de respostas às requisições GET e HEAD.
+    `store` é o StoreAssincrono da API.
+    """
+
+    def __init__(self, app, store, orcamento_bytes: int = ORCAMENTO_PADRAO, max_age: int = MAX_AGE_PADRAO):
+        super().__init__(app)
+        self.store = store
+        self.cache = CacheRespostas(orcamento_bytes)
+        self.cache_control = f"public, max-age={max_age}, must-revalidate"
+
+    def _cabecalhos(self, etag: str, codificacao: Optional[str] = None,
+                    originais: List[Tuple[str, str]] = ()) -> dict:
+        cabecalhos = dict(originais)
+        cabecalhos.update({"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"})
+        if codificacao:
+            cabecalhos["Content-Encoding"] = codificacao
+        return cabecalhos
+
+    async def _comprimir(self, funcao, dados: bytes) -> bytes:
+        if len(dados) <= COMPRIMIR_NO_LACO_ATE:
+            return funcao(dados)
+        return await self.store.executar(funcao, dados, admitir=False)
+
+    async def dispatch(self, request: Request, call_next):
+        # HEAD passa pelo mesmo caminho (ETag, 304, cache); o servidor descarta o corpo
+        if request.method not in ("GET", "HEAD"):
+            return await call_next(request)
+
+        # Verifica (com o intervalo do store) se há uma base nova antes de montar o ETag
+        await self.store.atualizar()
+        versao = self.store.versao
+        url = request.url.path + "?" + request.url.query
+        etag = 'W/"%s-%s"' % (versao, hashlib.sha1(url.encode("utf-8")).hexdigest()[:16])
+        confere = _etag_confere(request.headers.get("if-none-match"), etag)
+
+        codificacao = escolher_codificacao(request.headers.get("accept-encoding", ""))
+        chave = (url, codificacao)
+        item = self.cache.get(versao, chave)
+        if item is not None:
+            # Só respostas 200 entram no cache, então o 304 é seguro sem executar o endpoint
+            if confere:
+                return Response(status_code=304, headers=self._cabecalhos(etag))
+            cabecalhos = self._cabecalhos(etag, item.codificacao, item.cabecalhos)
+            return Response(item.corpo, headers=cabecalhos, media_type=item.media_type)
+
+        resposta = await call_next(request)
+        # Erros não são cacheados nem viram 304; nem respostas de uma base trocada durante a requisição
+        if resposta.status_code != 200 or self.store.versao != versao:
+            return resposta
+
+        cabecalhos = [(k, v) for k, v in resposta.headers.items() if k.lower() not in _CABECALHOS_DESCARTADOS]
+        media_type = resposta.headers.get("content-type")
+
+        partes, tamanho, completo = [], 0, True
+        corpo_iter = resposta.body_iterator.__aiter__()
+        async for parte in corpo_iter:
+            partes.append(parte)
+            tamanho += len(parte)
+            if tamanho > LIMITE_BUFFER:
+                completo = False
+                break
+
+        if completo:
+            corpo = b"".join(partes)
+            usada = codificacao if codificacao and len(corpo) >= COMPRIMIR_A_PARTIR_DE else None
+            if usada:
+                corpo = await self._comprimir(functools.partial(comprimir, codificacao=usada), corpo)
+            self.cache.guardar(versao, chave, RespostaCacheada(corpo, media_type, cabecalhos, usada))
+            if confere:
+                return Response(status_code=304, headers=self._cabecalhos(etag))
+            return Response(corpo, headers=self._cabecalhos(etag, usada, cabecalhos), media_type=media_type)
+
+        if confere:
+            # O cliente já tem o corpo: o restante do streaming é descartado
+            fechar = getattr(corpo_iter, "aclose", None)
+            if fechar is not None:
+                await fechar()
+            return Response(status_code=304, headers=self._cabecalhos(etag))
+
+        # Maior que o buffer: segue em streaming, comprimido em blocos. Os bytes enviados
+        # são copiados para o cache enquanto couberem no limite por item
+        async def continuar():
+            compressor = _Compressor(codificacao) if codificacao else None
+            copia, tamanho_copia = [], 0
+
+            async def blocos():
+                while partes:
+                    yield partes.pop(0)
+                async for parte in corpo_iter:
+                    yield parte
+
+            async for parte in blocos():
+                saida = await self._comprimir(compressor.comprimir, parte) if compressor else parte
+                if copia is not None:
+                    copia.append(saida)
+                    tamanho_copia += len(saida)
+                    if tamanho_copia > self.cache.maximo_item:
+                        copia = None
+                yield saida
+            if compressor:
+                final = compressor.finalizar()
+                if copia is not None:
+                    copia.append(final)
+                yield final
+            if copia is not None and self.store.versao == versao:
+                self.cache.guardar(versao, chave, RespostaCacheada(b"".join(copia), media_type, cabecalhos,
+                                                                   codificacao))
+
+        return StreamingResponse(continuar(), headers=self._cabecalhos(etag, codificacao, cabecalhos),
+                                 media_type=media_type)
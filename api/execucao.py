@@ -0,0 +1,83 @@
+"""
+Execução do trabalho pesado da API fora do laço de eventos.
+
+Os endpoints são async. O que só consulta índices em memória (página de
+/fundos, ranking, busca, um fundo de uma base já carregada, o JSON pronto de
+uma base mapeada) responde no próprio laço, sem passar por thread nenhuma. O
+que bloqueia ou ocupa a CPU por mais tempo (montar e serializar um fundo
+inteiro, converter um fundo lido da base mapeada ou SQLite, consultas SQL,
+índice de ativos, recarga da base, os blocos das respostas em streaming e a
+compressão de corpos grandes) roda neste executor, que tem:
+
+- no máximo CVM_TRABALHADORES tarefas ao mesmo tempo (padrão: nº de CPUs);
+- no máximo CVM_FILA tarefas esperando por uma thread (padrão: 64). Acima
+  disso a requisição nova recebe 503 com Retry-After em vez de se acumular
+  (backpressure). Os blocos de uma resposta já iniciada nunca são recusados.
+
+Como o executor é separado do threadpool do Starlette e um cliente lento só
+ocupa uma thread enquanto o próximo bloco é montado, muitas conexões lentas
+não atrasam as consultas rápidas.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, TypeVar
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+TRABALHADORES = int(os.environ.get("CVM_TRABALHADORES", 0)) or os.cpu_count() or 4
+FILA = int(os.environ.get("CVM_FILA", 64))
+
+_FIM = object()
+
+class ExecutorLimitado:
+    """Pool de threads com concorrência e fila limitadas, para uso a partir do laço de eventos."""
+
+    def __init__(self, trabalhadores: int = TRABALHADORES, fila: int = FILA):
+        self.trabalhadores = trabalhadores
+        self.fila = fila
+        self._executor = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="cvm")
+        # Tarefas submetidas e ainda não terminadas (em execução ou na fila).
+        # Só é alterado no laço de eventos, então dispensa lock.
+        self._pendentes = 0
+
+    @property
+    def pendentes(self) -> int:
+        return self._pendentes
+
+    def _liberar(self):
+        self._pendentes -= 1
+
+    async def executar(self, funcao: Callable[..., T], *args, admitir: bool = True) -> T:
+        """
+        Executa `funcao(*args)` numa thread do pool e aguarda o resultado.
+        Com `admitir`, recusa com 503 se a fila já estiver cheia.
+        """
+        if admitir and self._pendentes >= self.trabalhadores + self.fila:
+            raise HTTPException(status_code=503, detail="Servidor ocupado, tente novamente",
+                                headers={"Retry-After": "1"})
+        laco = asyncio.get_running_loop()
+        tarefa = self._executor.submit(functools.partial(funcao, *args))
+        self._pendentes += 1
+        # Libera a vaga quando a thread termina, mesmo que o cliente tenha desistido antes
+        tarefa.add_done_callback(lambda _: laco.call_soon_threadsafe(self._liberar))
+        return await asyncio.wrap_future(tarefa)
+
+    async def iterar(self, iterador: Iterable[T]) -> AsyncIterator[T]:
+        """Consome um iterador síncrono (ex.: blocos de uma resposta) um item por vez no pool."""
+        iterador = iter(iterador)
+        while True:
+            item = await self.executar(next, iterador, _FIM, admitir=False)
+            if item is _FIM:
+                return
+            yield item
+
+async def no_laco(iterador: Iterable[T]) -> AsyncIterator[T]:
+    """Consome um iterador síncrono barato direto no laço de eventos."""
+    for item in iterador:
+        yield item
+
+executor = ExecutorLimitado()
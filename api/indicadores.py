@@ -0,0 +1,139 @@
+"""
+Indicadores pré-calculados de cada fundo e ranking entre fundos.
+
+Calculados uma vez por carga da base, de forma vetorizada sobre as colunas
+das séries (ver series.py), a partir das informações diárias:
+
+- retornos da cota (`vl_quota`): último dia, mês corrente, ano (YTD), janelas
+  móveis (1m, 3m, 6m, 12m) e a série de retornos mensais;
+- volatilidade anualizada dos retornos diários e drawdown máximo;
+- captação líquida (`captc_dia - resg_dia`) total e no último mês;
+- número de cotistas no início e no fim da série;
+- último patrimônio líquido.
+
+Fundos com subclasses podem ter mais de uma linha por data; para os
+indicadores é usada a primeira linha de cada data.
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+DIAS_UTEIS_ANO = 252
+
+# Janelas móveis de retorno, em dias corridos até a última data do fundo
+JANELAS = {"1m": 30, "3m": 91, "6m": 182, "12m": 365}
+
+# Indicadores que podem ser usados no ranking
+METRICAS_RANKING = (
+    "retorno_dia", "retorno_mes", "retorno_ano",
+    *(f"retorno_{janela}" for janela in JANELAS),
+    "volatilidade_anual", "drawdown_maximo",
+    "captacao_liquida", "captacao_liquida_mes", "pl",
+)
+
+def _ultimo_valido(valores: np.ndarray) -> Optional[float]:
+    validos = valores[~np.isnan(valores)]
+    return float(validos[-1]) if len(validos) else None
+
+# ------------------------------
+# INDICADORES DE UM FUNDO
+# ------------------------------
+def _retornos(datas: np.ndarray, quota: np.ndarray) -> dict:
+    """Indicadores derivados da cota. `datas` e `quota` já sem repetições e sem cotas inválidas."""
+    resultado = {"retorno_dia": None, "retorno_mes": None, "retorno_ano": None,
+                 **{f"retorno_{janela}": None for janela in JANELAS},
+                 "volatilidade_anual": None, "drawdown_maximo": None, "retornos_mensais": []}
+    if len(quota) < 2:
+        return resultado
+
+    diarios = quota[1:] / quota[:-1] - 1
+    resultado["retorno_dia"] = float(diarios[-1])
+    if len(diarios) >= 2:
+        resultado["volatilidade_anual"] = float(np.std(diarios, ddof=1) * math.sqrt(DIAS_UTEIS_ANO))
+    resultado["drawdown_maximo"] = float(np.min(quota / np.maximum.accumulate(quota) - 1))
+
+    # Retorno de cada mês: última cota do mês sobre a última cota do mês anterior
+    # (no primeiro mês, sobre a primeira cota da série)
+    meses = datas.astype("datetime64[M]")
+    fim_mes = np.append(np.flatnonzero(meses[1:] != meses[:-1]), len(quota) - 1)
+    cota_fim = quota[fim_mes]
+    base = np.concatenate(([quota[0]], cota_fim[:-1]))
+    mensais = cota_fim / base - 1
+    resultado["retornos_mensais"] = [{"mes": str(m), "retorno": float(r)}
+                                     for m, r in zip(meses[fim_mes], mensais)]
+    resultado["retorno_mes"] = float(mensais[-1])
+
+    # Ano corrente: sobre a última cota do ano anterior, se houver
+    anos = datas.astype("datetime64[Y]")
+    inicio_ano = int(np.searchsorted(anos, anos[-1]))
+    resultado["retorno_ano"] = float(quota[-1] / quota[max(inicio_ano - 1, 0)] - 1)
+
+    # Janelas móveis: só quando a série cobre a janela inteira
+    for janela, dias in JANELAS.items():
+        pos = int(np.searchsorted(datas, datas[-1] - np.timedelta64(dias, "D"), side="right")) - 1
+        if pos >= 0:
+            resultado[f"retorno_{janela}"] = float(quota[-1] / quota[pos] - 1)
+    return resultado
+
+def calcular_indicadores(series: dict) -> dict:
+    """Indicadores de um fundo a partir das suas séries (histórico -> SerieTemporal)."""
+    datas, _ = series["daily_info"].coluna("vl_quota")
+    # Uma linha por data (a primeira), mantendo o alinhamento entre as colunas
+    datas, primeiras = np.unique(datas, return_index=True)
+    colunas = {campo: series["daily_info"].coluna(campo)[1][primeiras]
+               for campo in ("vl_quota", "vl_patrim_liq", "captc_dia", "resg_dia", "nr_cotst")}
+
+    quota = colunas["vl_quota"]
+    com_cota = ~np.isnan(quota) & (quota > 0)
+    indicadores = {
+        "data_inicio": str(datas[0]) if len(datas) else None,
+        "data_fim": str(datas[-1]) if len(datas) else None,
+        **_retornos(datas[com_cota], quota[com_cota]),
+    }
+
+    indicadores["captacao_liquida"] = indicadores["captacao_liquida_mes"] = None
+    if len(datas):
+        fluxo = np.nan_to_num(colunas["captc_dia"]) - np.nan_to_num(colunas["resg_dia"])
+        meses = datas.astype("datetime64[M]")
+        indicadores["captacao_liquida"] = float(fluxo.sum())
+        indicadores["captacao_liquida_mes"] = float(fluxo[meses == meses[-1]].sum())
+
+    cotistas = colunas["nr_cotst"][~np.isnan(colunas["nr_cotst"])]
+    indicadores["cotistas_inicio"] = float(cotistas[0]) if len(cotistas) else None
+    indicadores["cotistas_fim"] = float(cotistas[-1]) if len(cotistas) else None
+    indicadores["variacao_cotistas"] = float(cotistas[-1] - cotistas[0]) if len(cotistas) else None
+
+    # Patrimônio: informação diária mais recente ou, na falta dela, o da CDA
+    pl = _ultimo_valido(colunas["vl_patrim_liq"])
+    if pl is None:
+        pl = _ultimo_valido(series["patrimonio"].coluna("vl_patrim_liq")[1])
+    indicadores["pl"] = pl
+    return indicadores
+
+# ------------------------------
+# RANKING ENTRE FUNDOS
+# ------------------------------
+class Ranking:
+    """
+    Uma coluna por métrica com o valor de cada fundo, na ordem de `chaves`,
+    e a ordem crescente dos fundos com valor definido, montada na carga.
+    """
+
+    def __init__(self, chaves: List[str], indicadores: List[dict]):
+        self.chaves = chaves
+        self.valores: Dict[str, np.ndarray] = {}
+        self.ordem: Dict[str, np.ndarray] = {}
+        for metrica in METRICAS_RANKING:
+            valores = np.array([np.nan if i[metrica] is None else i[metrica] for i in indicadores],
+                               dtype=np.float64)
+            definidos = np.flatnonzero(~np.isnan(valores))
+            self.valores[metrica] = valores
+            self.ordem[metrica] = definidos[np.argsort(valores[definidos], kind="stable")]
+
+    def top(self, metrica: str, n: int, decrescente: bool = True) -> List[Tuple[str, float]]:
+        """Os `n` primeiros fundos pela métrica: (chave, valor)."""
+        ordem = self.ordem[metrica]
+        selecionados = ordem[::-1][:n] if decrescente else ordem[:n]
+        valores = self.valores[metrica]
+        return [(self.chaves[i], float(valores[i])) for i in selecionados]
@@ -1,89 +1,243 @@
-from fastapi import FastAPI, HTTPException
-import json
+from contextlib import asynccontextmanager
+from datetime import date
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 import os
-from typing import Dict
-from models import Fundo
 import re
-
-app = FastAPI(title="API de Fundos de Investimentos", version="1.0")
+from typing import Literal, Optional
+from cache import ORCAMENTO_PADRAO, CacheHTTP
+from execucao import executor
+from indicadores import METRICAS_RANKING
+from models import Application, Balance, ConsultaLote, DailyInfo, FundInfo, Patrimonio
+from respostas import (ITENS_NO_LACO, JSON_RAPIDO, FiltroDatas, ParametrosLista, RespostaJSONRapida, campos_do_modelo,
+                       paginar, parse_fields, responder_lista, responder_lote)
+from series import SerieTemporal
+from store import FundStore, StoreAssincrono
 
 # ------------------------------
-# FUNÇÃO PARA CARREGAR O "BANCO"
+# "BANCO" EM MEMÓRIA
 # ------------------------------
-def load_data() -> Dict[str, Fundo]:
-    db_path = os.path.join(os.path.dirname(__file__), "database.json")
-    with open(db_path, "r", encoding="utf-8") as f:
-        raw_data = json.load(f)
-
-    fundos = {}
-    for cnpj, data in raw_data.items():
-        try:
-            fundos[normalize_cnpj(cnpj)] = Fundo(**data)
-        except Exception as e:
-            print(f"Erro ao carregar fundo {cnpj}: {e}")
-    return fundos
+DB_PATH = os.environ.get("CVM_DATABASE", os.path.join(os.path.dirname(__file__), "database.json"))
+# Os endpoints são async e usam o store pelo executor limitado (ver execucao.py)
+store = StoreAssincrono(FundStore(DB_PATH), executor)
+RespostaPadrao = RespostaJSONRapida if JSON_RAPIDO else JSONResponse
 
-# ------------------------------
-# FUNÇÃO PARA NORMALIZAR CNPJs
-# ------------------------------
-def normalize_cnpj(cnpj: str) -> str:
-    """Remove pontos, barras e hífens do CNPJ"""
-    return re.sub(r"\D", "", cnpj)
+# Máximo de CNPJs por consulta em lote
+LIMITE_LOTE = 1000
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Carrega a base uma única vez na inicialização
+    await store.atualizar(forcar=True)
+    yield
+
+app = FastAPI(title="API de Fundos de Investimentos", version="1.0", lifespan=lifespan,
+              default_response_class=RespostaPadrao)
+app.add_middleware(
+    CacheHTTP,
+    store=store,
+    orcamento_bytes=int(os.environ.get("CVM_CACHE_BYTES", ORCAMENTO_PADRAO)),
+    max_age=int(os.environ.get("CVM_CACHE_MAX_AGE", 0)),
+)
+
+def serializar(conteudo) -> Response:
+    """A resposta JSON que o FastAPI montaria para `conteudo` (para rodar no executor)."""
+    return RespostaPadrao(jsonable_encoder(conteudo))
+
+async def responder(conteudo, quantidade: int):
+    """Respostas com até ITENS_NO_LACO itens são serializadas no laço; as maiores, no executor."""
+    if quantidade <= ITENS_NO_LACO:
+        return conteudo
+    return await store.executar(serializar, conteudo, admitir=False)
+
+async def get_serie(cnpj: str, atributo: str) -> SerieTemporal:
+    serie = await store.serie(cnpj, atributo)
+    if serie is None:
+        raise HTTPException(status_code=404, detail="Fundo não encontrado")
+    return serie
+
+async def ultimo_registro(cnpj: str, atributo: str):
+    registro = (await get_serie(cnpj, atributo)).ultimo()
+    if registro is None:
+        raise HTTPException(status_code=404, detail="Fundo sem registros")
+    return registro
+
+def itens(serie: SerieTemporal, posicoes: range):
+    # Com JSON_RAPIDO as linhas vão direto das colunas para o orjson, sem modelos
+    return serie.linhas(posicoes) if JSON_RAPIDO else serie.registros(posicoes)
+
+async def listar_registros(cnpj: str, atributo: str, modelo, datas: FiltroDatas, params: ParametrosLista):
+    """Histórico de um fundo (ordenado por data) filtrado, paginado e serializado em streaming."""
+    campos = parse_fields(params.fields, campos_do_modelo(modelo))
+    serie = await get_serie(cnpj, atributo)
+    # Só as linhas da página viram modelos, e em blocos durante o streaming
+    posicoes, proximo = paginar(serie.intervalo(datas.date_from, datas.date_to), params.cursor, params.limit)
+    return responder_lista(itens(serie, posicoes), params, campos, proximo, tamanho=len(posicoes))
+
+async def buscar_lote(consulta: ConsultaLote):
+    if len(consulta.cnpjs) > LIMITE_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo de {LIMITE_LOTE} CNPJs por consulta")
+    return await store.buscar(consulta.cnpjs)
+
+async def series_em_lote(consulta: ConsultaLote, atributo: str, modelo, datas: FiltroDatas, fields: Optional[str]):
+    """Um histórico de vários fundos numa única resposta, filtrado por data."""
+    campos = parse_fields(fields, campos_do_modelo(modelo))
+    encontrados, nao_encontrados = await buscar_lote(consulta)
+    resultados = ((fundo.fund["cnpj"], itens(fundo.series[atributo],
+                                             fundo.series[atributo].intervalo(datas.date_from, datas.date_to)))
+                  for fundo in encontrados)
+    return responder_lote(resultados, nao_encontrados, campos)
 
 # ------------------------------
 # ENDPOINTS
 # ------------------------------
 @app.get("/")
-def root():
+async def root():
     return {"message": "Bem-vindo à API de Fundos de Investimentos"}
 
 @app.get("/fundos")
-def listar_fundos():
-    """Lista todos os fundos (dados básicos)"""
-    data = load_data()
-    return [f.fund.dict() for f in data.values()]
+async def listar_fundos(params: ParametrosLista = Depends()):
+    """Lista os fundos (dados básicos), ordenados por CNPJ. Aceita limit/cursor/fields."""
+    campos = parse_fields(params.fields, campos_do_modelo(FundInfo))
+    fundos, proximo = await store.pagina(params.cursor, params.limit)
+    return responder_lista(fundos, params, campos, proximo)
 
-@app.get("/fundos/{cnpj:path}")
-def detalhes_fundo(cnpj: str):
-    """Detalhes completos de um fundo pelo CNPJ (qualquer formato)"""
-    data = load_data()
-    fundo = data.get(normalize_cnpj(cnpj))
-    if not fundo:
+@app.post("/fundos/batch")
+async def fundos_em_lote(consulta: ConsultaLote):
+    """Detalhes completos de vários fundos (CNPJs em qualquer formato) numa única requisição"""
+    encontrados, nao_encontrados = await buscar_lote(consulta)
+    return responder_lote(((fundo.fund["cnpj"], fundo.como_dict() if JSON_RAPIDO else fundo.modelo())
+                           for fundo in encontrados), nao_encontrados)
+
+@app.post("/fundos/batch/patrimonio")
+async def patrimonio_em_lote(consulta: ConsultaLote, datas: FiltroDatas = Depends(),
+                             fields: Optional[str] = Query(None)):
+    """Histórico de patrimônio líquido de vários fundos"""
+    return await series_em_lote(consulta, "patrimonio", Patrimonio, datas, fields)
+
+@app.post("/fundos/batch/daily-info")
+async def daily_info_em_lote(consulta: ConsultaLote, datas: FiltroDatas = Depends(),
+                             fields: Optional[str] = Query(None)):
+    """Informações diárias de vários fundos"""
+    return await series_em_lote(consulta, "daily_info", DailyInfo, datas, fields)
+
+@app.get("/fundos/busca")
+async def buscar_fundos(
+    q: Optional[str] = Query(None, description="Palavras do nome ou tipo (sem distinção de acentos, por prefixo)"),
+    tipo: Optional[str] = Query(None, description="Tipo exato do fundo (FI, FIC, ...)"),
+    pl_min: Optional[float] = Query(None, description="PL mínimo"),
+    pl_max: Optional[float] = Query(None, description="PL máximo"),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """Busca fundos por nome/tipo com filtros de tipo e faixa de PL, do maior para o menor PL"""
+    fundos = await store.pesquisar(q, tipo, pl_min, pl_max, limit)
+    return await responder(fundos, len(fundos))
+
+@app.get("/ativos/{codigo}/fundos")
+async def fundos_do_ativo(
+    codigo: str,
+    periodo: Optional[str] = Query(None, description="Mês da CDA (AAAA-MM)"),
+    limit: int = Query(100, ge=1, le=10000, description="Máximo de posições listadas"),
+):
+    """Fundos que detêm um ativo (ISIN ou código SELIC), com exposição por fundo e totais por período"""
+    if periodo is not None and not re.fullmatch(r"\d{4}-\d{2}", periodo):
+        raise HTTPException(status_code=400, detail="Período inválido: use AAAA-MM")
+    resultado = await store.detentores(codigo, periodo, limit)
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Ativo não encontrado")
+    return await responder(resultado, len(resultado["posicoes"]))
+
+@app.get("/ranking")
+async def ranking_fundos(
+    metrica: Literal[METRICAS_RANKING] = Query("retorno_mes", description="Indicador usado na ordenação"),
+    n: int = Query(10, ge=1, le=1000, description="Quantidade de fundos"),
+    ordem: Literal["desc", "asc"] = "desc",
+):
+    """Fundos ordenados por um indicador pré-calculado (retorno em uma janela, PL, captação, ...)"""
+    fundos = await store.ranking(metrica, n, decrescente=ordem == "desc")
+    return await responder(fundos, len(fundos))
+
+# ------------------------------
+# CONSULTAS ENTRE FUNDOS (BASE SQL)
+# ------------------------------
+async def exigir_base_sql(resultado):
+    if resultado is None:
+        raise HTTPException(status_code=501, detail="Consulta disponível apenas com a base SQLite (CVM_DATABASE=*.sqlite)")
+    return await responder(resultado, len(resultado))
+
+@app.get("/consultas/patrimonio")
+async def consulta_patrimonio(
+    data: date = Query(..., description="Data do informe diário (AAAA-MM-DD)"),
+    tipo: Optional[str] = Query(None, description="Tipo exato do fundo (FI, FIC, ...)"),
+    pl_min: Optional[float] = Query(None, description="PL mínimo"),
+    pl_max: Optional[float] = Query(None, description="PL máximo"),
+    limit: int = Query(100, ge=1, le=10000),
+):
+    """Fundos com PL na faixa pedida na data, do maior para o menor PL (usa os índices da base SQL)"""
+    return await exigir_base_sql(await store.patrimonio_na_data(data.isoformat(), tipo, pl_min, pl_max, limit))
+
+@app.get("/consultas/contas/{codigo_conta}")
+async def consulta_conta(
+    codigo_conta: str,
+    data: Optional[date] = Query(None, description="Data do balancete (AAAA-MM-DD)"),
+    limit: int = Query(100, ge=1, le=10000),
+):
+    """Saldos de uma conta do balancete em todos os fundos (usa os índices da base SQL)"""
+    return await exigir_base_sql(await store.saldos_da_conta(codigo_conta, data.isoformat() if data else None, limit))
+
+@app.get("/fundos/{cnpj:path}/indicadores")
+async def get_indicadores(cnpj: str):
+    """Indicadores pré-calculados: retornos, volatilidade, drawdown, captação líquida, cotistas"""
+    indicadores = await store.indicadores(cnpj)
+    if indicadores is None:
         raise HTTPException(status_code=404, detail="Fundo não encontrado")
-    return fundo
+    return indicadores
 
+# As rotas dos históricos vêm antes de /fundos/{cnpj:path}, que casaria com elas
 @app.get("/fundos/{cnpj:path}/balances")
-def get_balances(cnpj: str):
+async def get_balances(cnpj: str, datas: FiltroDatas = Depends(), params: ParametrosLista = Depends()):
     """Lista de saldos (balances)"""
-    data = load_data()
-    fundo = data.get(normalize_cnpj(cnpj))
-    if not fundo:
-        raise HTTPException(status_code=404, detail="Fundo não encontrado")
-    return fundo.balances
+    return await listar_registros(cnpj, "balances", Balance, datas, params)
 
 @app.get("/fundos/{cnpj:path}/applications")
-def get_applications(cnpj: str):
+async def get_applications(cnpj: str, datas: FiltroDatas = Depends(), params: ParametrosLista = Depends()):
     """Lista de aplicações"""
-    data = load_data()
-    fundo = data.get(normalize_cnpj(cnpj))
-    if not fundo:
-        raise HTTPException(status_code=404, detail="Fundo não encontrado")
-    return fundo.applications
+    return await listar_registros(cnpj, "applications", Application, datas, params)
 
 @app.get("/fundos/{cnpj:path}/patrimonio")
-def get_patrimonio(cnpj: str):
+async def get_patrimonio(cnpj: str, datas: FiltroDatas = Depends(), params: ParametrosLista = Depends()):
     """Histórico de patrimônio líquido"""
-    data = load_data()
-    fundo = data.get(normalize_cnpj(cnpj))
-    if not fundo:
-        raise HTTPException(status_code=404, detail="Fundo não encontrado")
-    return fundo.patrimonio
+    return await listar_registros(cnpj, "patrimonio", Patrimonio, datas, params)
+
+@app.get("/fundos/{cnpj:path}/patrimonio/latest")
+async def get_patrimonio_atual(cnpj: str):
+    """Patrimônio líquido mais recente"""
+    return await ultimo_registro(cnpj, "patrimonio")
 
 @app.get("/fundos/{cnpj:path}/daily-info")
-def get_daily_info(cnpj: str):
+async def get_daily_info(cnpj: str, datas: FiltroDatas = Depends(), params: ParametrosLista = Depends()):
     """Informações diárias do fundo"""
-    data = load_data()
-    fundo = data.get(normalize_cnpj(cnpj))
-    if not fundo:
+    return await listar_registros(cnpj, "daily_info", DailyInfo, datas, params)
+
+@app.get("/fundos/{cnpj:path}/daily-info/latest")
+async def get_daily_info_atual(cnpj: str):
+    """Informação diária mais recente"""
+    return await ultimo_registro(cnpj, "daily_info")
+
+@app.get("/fundos/{cnpj:path}")
+async def detalhes_fundo(cnpj: str):
+    """Detalhes completos de um fundo pelo CNPJ (qualquer formato)"""
+    corpo = await store.json_do_fundo(cnpj)
+    if corpo is not None:
+        # Base mapeada: o JSON do fundo já está pronto no arquivo
+        return Response(corpo, media_type="application/json")
+    # Montar e serializar um fundo inteiro é o trabalho mais pesado da API: vai para o executor
+    if JSON_RAPIDO:
+        # Serializa direto das colunas, sem montar nem revalidar o modelo Fundo
+        resposta = await store.com_fundo(cnpj, lambda dados: RespostaJSONRapida(dados.como_dict()))
+    else:
+        resposta = await store.com_fundo(cnpj, lambda dados: serializar(dados.modelo()))
+    if resposta is None:
         raise HTTPException(status_code=404, detail="Fundo não encontrado")
-    return fundo.daily_info
+    return resposta
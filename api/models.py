@@ -45,3 +45,6 @@ class Fundo(BaseModel):
     applications: List[Application] = []
     patrimonio: List[Patrimonio] = []
     daily_info: List[DailyInfo] = []
+
+class ConsultaLote(BaseModel):
+    cnpjs: List[str]
@@ -0,0 +1,148 @@
+"""
+Índice reverso das carteiras (CDA): quais fundos detêm um ativo.
+
+Na carga da base, as linhas de `applications` de todos os fundos são
+juntadas em colunas únicas e ordenadas por (código do ativo, data), uma vez
+para ISIN e outra para código SELIC. As posições de um ativo ficam então
+contíguas: uma consulta é uma fatia dessas colunas, sem percorrer os fundos.
+"""
+
+import threading
+from typing import Dict, List, Mapping, Optional
+import numpy as np
+from series import Dicionario
+
+CAMPOS_CODIGO = ("isin", "selic")
+
+class IndicePosicoes:
+    """
+    Colunas de todas as linhas de CDA da base (fundo, data, valor de mercado,
+    quantidade) e, para cada tipo de código, a ordem das linhas por código e
+    os limites de cada código nessa ordem.
+    """
+
+    def __init__(self, chaves: List[str], fundos: Mapping, dicionarios: Dict[str, Dicionario]):
+        series = []
+        for chave in chaves:
+            fundo = fundos.get(chave)
+            # Numa base lida sob demanda, um fundo que não passa na validação fica sem posições
+            series.append(fundo.series["applications"] if fundo is not None else ())
+        tamanhos = np.array([len(s) for s in series], dtype=np.int64)
+        self.fundo = np.repeat(np.arange(len(chaves), dtype=np.int32), tamanhos)
+
+        def juntar(obter, dtype):
+            partes = [obter(s) for s in series if len(s)]
+            return np.concatenate(partes) if partes else np.empty(0, dtype=dtype)
+
+        self.datas = juntar(lambda s: s.datas, "datetime64[D]")
+        self.valor_mercado = juntar(lambda s: s.colunas["valor_mercado"], np.float64)
+        self.quantidade = juntar(lambda s: s.colunas["quantidade"], np.float64)
+
+        self.dicionarios = {}
+        self.ordem: Dict[str, np.ndarray] = {}
+        self.limites: Dict[str, np.ndarray] = {}
+        for campo in CAMPOS_CODIGO:
+            dicionario = dicionarios.get(campo)
+            if dicionario is None:
+                continue
+            codigos = juntar(lambda s: s.colunas[campo], np.int32)
+            com_codigo = np.flatnonzero(codigos >= 0)
+            # Por código e, dentro de cada código, por data
+            ordem = com_codigo[np.lexsort((self.datas[com_codigo], codigos[com_codigo]))]
+            self.dicionarios[campo] = dicionario
+            self.ordem[campo] = ordem
+            self.limites[campo] = np.searchsorted(codigos[ordem], np.arange(len(dicionario.valores) + 1))
+
+    def linhas(self, codigo: str) -> Optional[tuple]:
+        """(campo, linhas) do ativo pelo ISIN ou, se não houver, pelo código SELIC."""
+        for campo in CAMPOS_CODIGO:
+            dicionario = self.dicionarios.get(campo)
+            indice = dicionario.codigo(codigo) if dicionario else None
+            if indice is not None:
+                limites = self.limites[campo]
+                linhas = self.ordem[campo][limites[indice]:limites[indice + 1]]
+                if len(linhas):
+                    return campo, linhas
+        return None
+
+    def detentores(self, codigo: str, resumo: List[dict], periodo: Optional[str] = None,
+                   limit: int = 100) -> Optional[dict]:
+        """
+        Fundos que detêm o ativo (ISIN ou SELIC), com a exposição de cada um por data
+        e os totais por período. `periodo` (AAAA-MM) restringe a um mês da CDA.
+        """
+        encontrado = self.linhas(codigo)
+        if encontrado is None:
+            return None
+        campo, linhas = encontrado
+        return resumir_posicoes(codigo, campo, resumo, self.fundo[linhas], self.datas[linhas],
+                                self.valor_mercado[linhas], self.quantidade[linhas], periodo, limit)
+
+def resumir_posicoes(codigo: str, campo: str, resumo: List[dict], fundo: np.ndarray, datas: np.ndarray,
+                     valor_mercado: np.ndarray, quantidade: np.ndarray, periodo: Optional[str] = None,
+                     limit: int = 100) -> dict:
+    """
+    Resposta de /ativos/{codigo}/fundos a partir das linhas de CDA do ativo, ordenadas
+    por data: posição do fundo em `resumo`, data, valor de mercado e quantidade.
+    """
+    if periodo:
+        mes = np.datetime64(periodo, "M")
+        no_mes = datas.astype("datetime64[M]") == mes
+        fundo, datas = fundo[no_mes], datas[no_mes]
+        valor_mercado, quantidade = valor_mercado[no_mes], quantidade[no_mes]
+
+    valor = np.nan_to_num(valor_mercado)
+    quantidade = np.nan_to_num(quantidade)
+
+    # Um fundo pode ter o mesmo ativo em várias linhas da mesma data: soma por (fundo, data)
+    dias = datas.astype(np.int64)
+    chaves, grupo = np.unique(np.stack([fundo.astype(np.int64), dias]), axis=1, return_inverse=True)
+    grupo = grupo.ravel()
+    valor_grupo = np.bincount(grupo, weights=valor, minlength=chaves.shape[1])
+    quantidade_grupo = np.bincount(grupo, weights=quantidade, minlength=chaves.shape[1])
+
+    meses = chaves[1].astype("datetime64[D]").astype("datetime64[M]")
+    por_periodo = []
+    for mes in np.unique(meses):
+        do_mes = meses == mes
+        por_periodo.append({
+            "periodo": str(mes),
+            "valor_mercado": float(valor_grupo[do_mes].sum()),
+            "fundos": int(len(np.unique(chaves[0][do_mes]))),
+        })
+
+    maiores = np.argsort(-valor_grupo, kind="stable")[:limit]
+    posicoes = [{
+        **resumo[int(chaves[0][i])],
+        "data": str(chaves[1][i].astype("datetime64[D]")),
+        "valor_mercado": float(valor_grupo[i]),
+        "quantidade": float(quantidade_grupo[i]),
+    } for i in maiores]
+
+    return {
+        "codigo": codigo,
+        "tipo_codigo": campo,
+        "periodo": periodo,
+        "valor_mercado_total": float(valor_grupo.sum()),
+        "fundos_detentores": int(len(np.unique(chaves[0]))),
+        "por_periodo": por_periodo,
+        "posicoes": posicoes,
+    }
+
+class PosicoesSobDemanda:
+    """
+    IndicePosicoes montado na primeira consulta. Usado com a base mapeada, em que
+    montar o índice exige converter todos os fundos e a maioria dos workers nunca o usa.
+    A base SQLite não precisa dele: consulta os índices ISIN/SELIC do banco (ver base_sql.py).
+    """
+
+    def __init__(self, chaves: List[str], fundos: Mapping, dicionarios: Dict[str, Dicionario]):
+        self._argumentos = (chaves, fundos, dicionarios)
+        self._indice: Optional[IndicePosicoes] = None
+        self._lock = threading.Lock()
+
+    def detentores(self, *args, **kwargs) -> Optional[dict]:
+        with self._lock:
+            if self._indice is None:
+                self._indice = IndicePosicoes(*self._argumentos)
+        return self._indice.detentores(*args, **kwargs)
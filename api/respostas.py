@@ -0,0 +1,166 @@
+import json
+import os
+from datetime import date
+from typing import Any, AsyncIterator, Iterable, Iterator, List, Literal, Optional, Sequence, Sized, Tuple
+from fastapi import HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from execucao import executor, no_laco
+
+try:
+    import orjson
+except ImportError:  # dependência opcional
+    orjson = None
+
+# Itens serializados por bloco enviado ao cliente
+LOTE = 500
+
+# Listas de até tantos itens são serializadas no laço de eventos; as maiores, no executor
+ITENS_NO_LACO = 100
+
+# Serialização rápida (opcional): CVM_JSON_RAPIDO=1 usa orjson e monta as respostas
+# direto das colunas em memória, sem passar por modelos Pydantic
+JSON_RAPIDO = os.environ.get("CVM_JSON_RAPIDO", "0") == "1"
+if JSON_RAPIDO and orjson is None:
+    raise ImportError("CVM_JSON_RAPIDO=1 requer orjson: pip install orjson")
+
+# ------------------------------
+# PARÂMETROS COMUNS DAS LISTAS
+# ------------------------------
+class ParametrosLista:
+    """Paginação, projeção de campos e formato da resposta."""
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, description="Máximo de itens por página"),
+        cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor da página anterior"),
+        fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula"),
+        format: Literal["json", "ndjson"] = Query("json", description="json (array) ou ndjson (um item por linha)"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = fields
+        self.format = format
+
+class FiltroDatas:
+    """Intervalo de datas (inclusivo) aplicado ao campo `data` dos registros."""
+
+    def __init__(self, date_from: Optional[date] = None, date_to: Optional[date] = None):
+        self.date_from = date_from
+        self.date_to = date_to
+
+def campos_do_modelo(modelo) -> List[str]:
+    campos = getattr(modelo, "model_fields", None) or modelo.__fields__
+    return list(campos)
+
+def parse_fields(fields: Optional[str], permitidos: Sequence[str]) -> Optional[List[str]]:
+    """Valida a lista `fields=a,b,c` contra os campos do modelo."""
+    if not fields:
+        return None
+    campos = [f.strip() for f in fields.split(",") if f.strip()]
+    invalidos = [c for c in campos if c not in permitidos]
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalidos)}")
+    return campos
+
+# ------------------------------
+# PAGINAÇÃO
+# ------------------------------
+def paginar(registros: Sequence, cursor: Optional[str], limit: Optional[int]) -> Tuple[Sequence, Optional[str]]:
+    """Fatia os registros a partir do cursor (posição na lista). Retorna a página e o próximo cursor."""
+    try:
+        inicio = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if inicio < 0:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    fim = len(registros) if limit is None else min(inicio + limit, len(registros))
+    proximo = str(fim) if fim < len(registros) else None
+    return registros[inicio:fim], proximo
+
+# ------------------------------
+# RESPOSTAS EM STREAMING
+# ------------------------------
+def _como_dict(item, campos: Optional[List[str]]) -> dict:
+    if isinstance(item, dict):
+        dados = item
+    else:
+        # model_dump no Pydantic v2; dict() no v1
+        dados = item.model_dump() if hasattr(item, "model_dump") else item.dict()
+    if campos is None:
+        return dados
+    return {c: dados.get(c) for c in campos}
+
+def _dumps(dados) -> bytes:
+    if JSON_RAPIDO:
+        return orjson.dumps(dados)
+    return json.dumps(dados, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class RespostaJSONRapida(JSONResponse):
+    """JSONResponse serializada com orjson (ver JSON_RAPIDO)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+def _gerar_json(itens: Iterable, campos: Optional[List[str]]) -> Iterator[bytes]:
+    yield b"["
+    lote, primeiro = [], True
+    for item in itens:
+        lote.append(_dumps(_como_dict(item, campos)))
+        if len(lote) >= LOTE:
+            yield (b"" if primeiro else b",") + b",".join(lote)
+            lote, primeiro = [], False
+    if lote:
+        yield (b"" if primeiro else b",") + b",".join(lote)
+    yield b"]"
+
+def _gerar_ndjson(itens: Iterable, campos: Optional[List[str]]) -> Iterator[bytes]:
+    lote = []
+    for item in itens:
+        lote.append(_dumps(_como_dict(item, campos)) + b"\n")
+        if len(lote) >= LOTE:
+            yield b"".join(lote)
+            lote = []
+    if lote:
+        yield b"".join(lote)
+
+def _corpo(partes: Iterator[bytes], tamanho: Optional[int]) -> AsyncIterator[bytes]:
+    if tamanho is not None and tamanho <= ITENS_NO_LACO:
+        return no_laco(partes)
+    # Cada bloco é montado numa thread do executor (ver execucao.py)
+    return executor.iterar(partes)
+
+def responder_lista(itens: Iterable, params: ParametrosLista, campos: Optional[List[str]] = None,
+                    proximo_cursor: Optional[str] = None, tamanho: Optional[int] = None) -> StreamingResponse:
+    """
+    Serializa a lista em blocos de LOTE itens, sem montar o corpo inteiro em memória.
+    O cursor da próxima página, se houver, vai no cabeçalho X-Next-Cursor.
+    `tamanho` é o número de itens, quando `itens` é um gerador.
+    """
+    headers = {"X-Next-Cursor": proximo_cursor} if proximo_cursor else {}
+    if tamanho is None and isinstance(itens, Sized):
+        tamanho = len(itens)
+    if params.format == "ndjson":
+        return StreamingResponse(_corpo(_gerar_ndjson(itens, campos), tamanho),
+                                 media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(_corpo(_gerar_json(itens, campos), tamanho), media_type="application/json",
+                             headers=headers)
+
+def _gerar_lote(resultados: Iterable[Tuple[str, object]], nao_encontrados: List[str],
+                campos: Optional[List[str]]) -> Iterator[bytes]:
+    yield b'{"fundos":{'
+    for i, (chave, valor) in enumerate(resultados):
+        yield (b"," if i else b"") + _dumps(chave) + b":"
+        if isinstance(valor, dict) or hasattr(valor, "dict"):
+            yield _dumps(_como_dict(valor, None))
+        else:
+            yield from _gerar_json(valor, campos)
+    yield b'},"nao_encontrados":' + _dumps(nao_encontrados) + b"}"
+
+def responder_lote(resultados: Iterable[Tuple[str, object]], nao_encontrados: List[str],
+                   campos: Optional[List[str]] = None) -> StreamingResponse:
+    """
+    Resposta das consultas em lote: {"fundos": {cnpj: valor}, "nao_encontrados": [...]}.
+    `valor` é um fundo completo (modelo ou dict) ou um iterável de registros (histórico).
+    """
+    return StreamingResponse(executor.iterar(_gerar_lote(resultados, nao_encontrados, campos)),
+                             media_type="application/json")
@@ -0,0 +1,258 @@
+"""
+Representação compacta, em colunas, dos históricos dos fundos.
+
+Cada histórico (balances, applications, patrimonio, daily_info) de um fundo é
+guardado como um array por campo, ordenado por data:
+
+- campos numéricos em float64 (None vira NaN);
+- textos codificados por dicionário: int32 apontando para uma lista de strings
+  distintas compartilhada por todos os fundos (datas, tipo_ativo, isin, ...);
+- booleanos opcionais em int8 (-1 = None).
+
+Os modelos Pydantic só são montados na hora de responder, e apenas para as
+linhas retornadas.
+"""
+
+import threading
+from datetime import date
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+import numpy as np
+from indicadores import calcular_indicadores
+from models import Application, Balance, DailyInfo, Fundo, FundInfo, Patrimonio
+
+DataConsulta = Union[date, str, None]
+
+TEXTO = "texto"
+NUMERO = "numero"
+LOGICO = "logico"
+
+# Linhas convertidas por vez ao montar os modelos
+BLOCO = 500
+
+# Campos de cada histórico do modelo Fundo e seu tipo de armazenamento
+HISTORICOS = {
+    "balances": (Balance, {
+        "data": TEXTO, "plano_conta": TEXTO, "codigo_conta": TEXTO, "saldo": NUMERO,
+    }),
+    "applications": (Application, {
+        "data": TEXTO, "tipo_aplic": TEXTO, "tipo_ativo": TEXTO, "emissor_ligado": LOGICO,
+        "tipo_negoc": TEXTO, "quantidade": NUMERO, "valor_mercado": NUMERO, "custo": NUMERO,
+        "isin": TEXTO, "selic": TEXTO, "emissao": TEXTO, "vencimento": TEXTO,
+    }),
+    "patrimonio": (Patrimonio, {
+        "data": TEXTO, "vl_patrim_liq": NUMERO,
+    }),
+    "daily_info": (DailyInfo, {
+        "data": TEXTO, "vl_total": NUMERO, "vl_quota": NUMERO, "vl_patrim_liq": NUMERO,
+        "captc_dia": NUMERO, "resg_dia": NUMERO, "nr_cotst": NUMERO,
+    }),
+}
+
+def _obrigatorios(modelo) -> set:
+    campos = getattr(modelo, "model_fields", None)
+    if campos is not None:
+        return {nome for nome, campo in campos.items() if campo.is_required()}
+    return {nome for nome, campo in modelo.__fields__.items() if campo.required}
+
+OBRIGATORIOS = {atributo: _obrigatorios(modelo) for atributo, (modelo, _) in HISTORICOS.items()}
+
+def _construtor(modelo):
+    # Os dados já foram validados na carga: monta o modelo sem revalidar
+    return getattr(modelo, "model_construct", None) or modelo.construct
+
+def _para_dict(instancia) -> dict:
+    # model_dump no Pydantic v2; dict() no v1, onde model_dump não existe
+    return (getattr(instancia, "model_dump", None) or instancia.dict)()
+
+def _para_datetime64(valores: Sequence[Optional[str]]) -> np.ndarray:
+    """Converte datas AAAA-MM-DD em datetime64[D]; valores inválidos viram NaT."""
+    try:
+        return np.array(valores, dtype="datetime64[D]")
+    except (ValueError, TypeError):
+        saida = np.empty(len(valores), dtype="datetime64[D]")
+        for i, valor in enumerate(valores):
+            try:
+                saida[i] = np.datetime64(valor, "D")
+            except (ValueError, TypeError):
+                saida[i] = np.datetime64("NaT")
+        return saida
+
+# ------------------------------
+# DICIONÁRIO DE STRINGS
+# ------------------------------
+class Dicionario:
+    """
+    Strings distintas de um campo, compartilhadas por todos os fundos da base.
+    Pode ser usado por várias threads: só a inclusão de uma string nova é serializada.
+    """
+
+    __slots__ = ("valores", "_codigos", "_lock")
+
+    def __init__(self):
+        self.valores: List[str] = []
+        self._codigos: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _incluir(self, valor: str) -> int:
+        with self._lock:
+            codigo = self._codigos.get(valor)
+            if codigo is None:
+                # A string entra na lista antes de o código ficar visível
+                codigo = len(self.valores)
+                self.valores.append(valor)
+                self._codigos[valor] = codigo
+            return codigo
+
+    def codificar(self, valores: Sequence[Optional[str]]) -> np.ndarray:
+        codigos = self._codigos
+        saida = []
+        for valor in valores:
+            if valor is None:
+                saida.append(-1)
+                continue
+            if not isinstance(valor, str):
+                raise ValueError(f"texto esperado, recebido {valor!r}")
+            codigo = codigos.get(valor)
+            if codigo is None:
+                codigo = self._incluir(valor)
+            saida.append(codigo)
+        return np.array(saida, dtype=np.int32)
+
+    def codigo(self, valor: str) -> Optional[int]:
+        """Código de uma string, ou None se ela não aparece na base."""
+        return self._codigos.get(valor)
+
+    def decodificar(self, codigos: np.ndarray) -> List[Optional[str]]:
+        valores = self.valores
+        return [valores[c] if c >= 0 else None for c in codigos.tolist()]
+
+def _numeros(valores: Sequence) -> np.ndarray:
+    try:
+        return np.array([np.nan if v is None else float(v) for v in valores], dtype=np.float64)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"número esperado: {e}")
+
+def _logicos(valores: Sequence) -> np.ndarray:
+    saida = []
+    for valor in valores:
+        if valor is None:
+            saida.append(-1)
+        elif isinstance(valor, bool) or valor in (0, 1):
+            saida.append(int(valor))
+        else:
+            raise ValueError(f"booleano esperado, recebido {valor!r}")
+    return np.array(saida, dtype=np.int8)
+
+# ------------------------------
+# SÉRIE TEMPORAL DE UM FUNDO
+# ------------------------------
+class SerieTemporal:
+    """
+    Um histórico de um fundo em colunas, ordenado por data.
+
+    `datas` é um array datetime64[D] crescente usado nas consultas por
+    intervalo (busca binária: O(log n) para achar as bordas). Registros sem
+    data válida ficam no fim e só aparecem quando não há intervalo.
+    """
+
+    __slots__ = ("atributo", "datas", "colunas", "_dicionarios", "_validos")
+
+    def __init__(self, atributo: str, registros: Sequence[dict], dicionarios: Dict[str, Dicionario]):
+        self.atributo = atributo
+        _, campos = HISTORICOS[atributo]
+        obrigatorios = OBRIGATORIOS[atributo]
+        self._dicionarios = {}
+
+        colunas = {}
+        for campo, tipo in campos.items():
+            valores = [r.get(campo) for r in registros]
+            if campo in obrigatorios and any(v is None for v in valores):
+                raise ValueError(f"{atributo}: campo obrigatório '{campo}' ausente")
+            if tipo == NUMERO:
+                colunas[campo] = _numeros(valores)
+            elif tipo == LOGICO:
+                colunas[campo] = _logicos(valores)
+            else:
+                # Um dicionário por nome de campo, comum a todos os fundos e históricos
+                dicionario = dicionarios.setdefault(campo, Dicionario())
+                self._dicionarios[campo] = dicionario
+                colunas[campo] = dicionario.codificar(valores)
+
+        datas = _para_datetime64([r.get("data") for r in registros])
+        # Ordenação estável: registros da mesma data mantêm a ordem original
+        ordem = np.argsort(datas, kind="stable")
+        self.datas = datas[ordem]
+        self.colunas: Dict[str, np.ndarray] = {campo: coluna[ordem] for campo, coluna in colunas.items()}
+        self._validos = int(np.count_nonzero(~np.isnat(self.datas)))
+
+    def __len__(self) -> int:
+        return len(self.datas)
+
+    def _posicao(self, data: DataConsulta, lado: str, padrao: int) -> int:
+        if data is None:
+            return padrao
+        return int(np.searchsorted(self.datas[:self._validos], np.datetime64(data, "D"), side=lado))
+
+    def intervalo(self, inicio: DataConsulta = None, fim: DataConsulta = None) -> range:
+        """Posições dos registros com data entre `inicio` e `fim` (inclusivos; None = sem limite)."""
+        if inicio is None and fim is None:
+            return range(len(self))
+        return range(self._posicao(inicio, "left", 0), self._posicao(fim, "right", self._validos))
+
+    def coluna(self, campo: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(datas, valores) de um campo numérico, só das linhas com data válida."""
+        return self.datas[:self._validos], self.colunas[campo][:self._validos]
+
+    def _valores(self, campo: str, inicio: int, fim: int) -> list:
+        coluna = self.colunas[campo][inicio:fim]
+        if campo in self._dicionarios:
+            return self._dicionarios[campo].decodificar(coluna)
+        if coluna.dtype == np.int8:
+            return [None if v < 0 else bool(v) for v in coluna.tolist()]
+        return [None if v != v else v for v in coluna.tolist()]
+
+    def linhas(self, posicoes: Optional[range] = None) -> Iterator[dict]:
+        """Gera as linhas das posições pedidas (todas, por padrão) como dicts, em blocos."""
+        campos = list(HISTORICOS[self.atributo][1])
+        posicoes = range(len(self)) if posicoes is None else posicoes
+        for inicio in range(posicoes.start, posicoes.stop, BLOCO):
+            fim = min(inicio + BLOCO, posicoes.stop)
+            valores = [self._valores(campo, inicio, fim) for campo in campos]
+            for linha in zip(*valores):
+                yield dict(zip(campos, linha))
+
+    def registros(self, posicoes: Optional[range] = None) -> Iterator:
+        """Como `linhas`, mas gerando os modelos Pydantic do histórico."""
+        construir = _construtor(HISTORICOS[self.atributo][0])
+        for linha in self.linhas(posicoes):
+            yield construir(**linha)
+
+    def ultimo(self):
+        """Registro com a data mais recente, ou None se a série não tiver datas válidas."""
+        if not self._validos:
+            return None
+        return next(self.registros(range(self._validos - 1, self._validos)))
+
+# ------------------------------
+# FUNDO
+# ------------------------------
+class DadosFundo(NamedTuple):
+    fund: dict
+    series: Dict[str, SerieTemporal]
+    indicadores: dict  # pré-calculados na carga (ver indicadores.py)
+
+    def modelo(self) -> Fundo:
+        """Monta o modelo Fundo completo (usado em /fundos/{cnpj})."""
+        historicos = {atributo: list(serie.registros()) for atributo, serie in self.series.items()}
+        return _construtor(Fundo)(fund=_construtor(FundInfo)(**self.fund), **historicos)
+
+    def como_dict(self) -> dict:
+        """O mesmo conteúdo de `modelo().model_dump()`, montado direto das colunas."""
+        return {"fund": self.fund, **{atributo: list(serie.linhas()) for atributo, serie in self.series.items()}}
+
+def dados_do_fundo(dados: dict, dicionarios: Dict[str, Dicionario]) -> DadosFundo:
+    """Valida os dados de um fundo do database.json e os converte para colunas."""
+    fund = _para_dict(FundInfo(**dados["fund"]))
+    series = {atributo: SerieTemporal(atributo, dados.get(atributo) or [], dicionarios)
+              for atributo in HISTORICOS}
+    return DadosFundo(fund, series, calcular_indicadores(series))
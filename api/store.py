@@ -0,0 +1,429 @@
+import asyncio
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+import time
+import numpy as np
+from typing import Callable, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple, TypeVar
+from base_mapeada import BaseMapeada, FundosMapeados
+from base_sql import BaseSQL
+from busca import IndiceBusca
+from execucao import ExecutorLimitado
+from indicadores import Ranking, calcular_indicadores
+from posicoes import IndicePosicoes, PosicoesSobDemanda
+from models import Fundo
+from series import DadosFundo, Dicionario, SerieTemporal, dados_do_fundo
+
+T = TypeVar("T")
+
+# ------------------------------
+# FUNÇÃO PARA NORMALIZAR CNPJs
+# ------------------------------
+def normalize_cnpj(cnpj: str) -> str:
+    """Remove pontos, barras e hífens do CNPJ"""
+    return re.sub(r"\D", "", cnpj)
+
+def _modulos_pipeline():
+    """Importa sob demanda os módulos de utils/ usados para ler o armazenamento Parquet."""
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from utils import converte, parquet_store
+    return converte, parquet_store
+
+def ler_fundos(db_path: str) -> Iterator[Tuple[str, dict]]:
+    """Gera (cnpj, dados) de cada fundo de um database.json ou da pasta Parquet."""
+    if os.path.isdir(db_path):
+        # Lotes de CNPJs lidos do Parquet, montando um fundo por vez
+        yield from _modulos_pipeline()[0].fundos_do_parquet(db_path)
+        return
+    with open(db_path, "r", encoding="utf-8") as f:
+        raw_data = json.load(f)
+    for cnpj in list(raw_data):
+        # Libera os dicts de cada fundo assim que ele é convertido para colunas
+        yield cnpj, raw_data.pop(cnpj)
+
+# ------------------------------
+# ÍNDICE EM MEMÓRIA DOS FUNDOS
+# ------------------------------
+class Indice(NamedTuple):
+    fundos: Mapping[str, DadosFundo]  # CNPJ normalizado -> fundo em colunas
+    chaves: List[str]              # CNPJs normalizados em ordem crescente
+    resumo: List[dict]             # dados básicos para /fundos, na ordem de `chaves`
+    ranking: Ranking               # indicadores de todos os fundos por métrica
+    busca: IndiceBusca             # índice invertido de nome/tipo, na ordem de `chaves`
+    posicoes: IndicePosicoes       # índice reverso ISIN/SELIC -> fundos detentores (ou PosicoesSobDemanda/BaseSQL)
+    versao: str                    # identifica a versão da base (mtime/tamanho do arquivo)
+
+class FundStore:
+    """
+    Mantém os fundos do database.json em memória, indexados pelo CNPJ normalizado.
+    Os históricos ficam em colunas compactas (ver series.py), não como modelos Pydantic.
+
+    `db_path` também pode ser a pasta do armazenamento Parquet gerado por
+    `extrai_cnpj.py --parquet`; nesse caso só as colunas usadas são lidas e
+    normalizadas com as regras de utils/converte.py. Uma base mapeada (.cvmdb,
+    ver base_mapeada.py) é aberta com mmap e os fundos são convertidos sob demanda;
+    o mesmo vale para uma base SQLite (ver base_sql.py), que também atende às
+    consultas entre fundos.
+
+    O arquivo é lido uma única vez e só volta a ser lido quando seu mtime ou
+    tamanho mudam. A troca do índice é atômica: as requisições em andamento
+    continuam usando o índice antigo até o novo estar completamente montado.
+    """
+
+    def __init__(self, db_path: str, intervalo_verificacao: float = 1.0):
+        self.db_path = db_path
+        self.intervalo_verificacao = intervalo_verificacao
+        # Se as consultas verificam o arquivo antes de responder. O StoreAssincrono desliga:
+        # ele agenda a verificação fora do laço de eventos e as consultas só leem o índice
+        self.verificar_ao_consultar = True
+        self._lock = threading.Lock()
+        self._assinatura: Optional[Tuple[int, int]] = None
+        self._ultima_verificacao = 0.0
+        # Trocado inteiro numa única atribuição a cada recarga
+        self._dados = Indice({}, [], [], Ranking([], []), IndiceBusca([], np.empty(0)), IndicePosicoes([], {}, {}), "")
+
+    def _assinatura_arquivo(self) -> Tuple[int, int]:
+        if os.path.isdir(self.db_path):
+            return _modulos_pipeline()[1].assinatura(self.db_path)
+        st = os.stat(self.db_path)
+        return st.st_mtime_ns, st.st_size
+
+    def _carregar(self, versao: str) -> Indice:
+        if BaseMapeada.reconhece(self.db_path):
+            return self._abrir_mapeada(versao)
+        if BaseSQL.reconhece(self.db_path):
+            return self._abrir_sql(versao)
+
+        fundos = {}
+        dicionarios: Dict[str, Dicionario] = {}
+        for cnpj, data in ler_fundos(self.db_path):
+            try:
+                fundos[normalize_cnpj(cnpj)] = dados_do_fundo(data, dicionarios)
+            except Exception as e:
+                print(f"Erro ao carregar fundo {cnpj}: {e}")
+
+        chaves = sorted(fundos)
+        resumo = [fundos[c].fund for c in chaves]
+        ranking = Ranking(chaves, [fundos[c].indicadores for c in chaves])
+        busca = IndiceBusca(resumo, ranking.valores["pl"])
+        posicoes = IndicePosicoes(chaves, fundos, dicionarios)
+        return Indice(fundos, chaves, resumo, ranking, busca, posicoes, versao)
+
+    def _abrir_mapeada(self, versao: str) -> Indice:
+        """Índice de uma base .cvmdb: só o índice do arquivo é lido; os fundos, sob demanda."""
+        base = BaseMapeada(self.db_path)
+        dicionarios: Dict[str, Dicionario] = {}
+        fundos = FundosMapeados(base, dicionarios)
+        ranking = Ranking(base.chaves, base.indicadores)
+        busca = IndiceBusca(base.resumo, ranking.valores["pl"])
+        posicoes = PosicoesSobDemanda(base.chaves, fundos, dicionarios)
+        return Indice(fundos, base.chaves, base.resumo, ranking, busca, posicoes, versao)
+
+    def _abrir_sql(self, versao: str) -> Indice:
+        """
+        Índice de uma base SQLite: os indicadores do ranking vêm da tabela gravada na
+        montagem da base; os fundos são lidos sob demanda e os detentores de um ativo,
+        consultados no banco.
+        """
+        base = BaseSQL(self.db_path)
+        dicionarios: Dict[str, Dicionario] = {}
+        indicadores = base.indicadores()
+        if indicadores is None:
+            print(f"{self.db_path} não tem a tabela de indicadores; calculando a partir dos históricos "
+                  f"(gere a base de novo com utils/monta_base.py)")
+            indicadores = self._calcular_indicadores(base)
+        fundos = FundosMapeados(base, dicionarios)
+        ranking = Ranking(base.chaves, indicadores)
+        busca = IndiceBusca(base.resumo, ranking.valores["pl"])
+        return Indice(fundos, base.chaves, base.resumo, ranking, busca, base, versao)
+
+    @staticmethod
+    def _calcular_indicadores(base: BaseSQL) -> List[dict]:
+        """Indicadores de um banco antigo, um fundo por vez, lendo só os históricos de que dependem."""
+        dicionarios: Dict[str, Dicionario] = {}
+        indicadores = []
+        for chave in base.chaves:
+            try:
+                series = {atributo: SerieTemporal(atributo, base.historico(chave, atributo), dicionarios)
+                          for atributo in ("daily_info", "patrimonio")}
+            except Exception as e:
+                print(f"Erro ao carregar fundo {chave}: {e}")
+                series = {atributo: SerieTemporal(atributo, [], dicionarios) for atributo in ("daily_info", "patrimonio")}
+            indicadores.append(calcular_indicadores(series))
+        return indicadores
+
+    def atualizar(self, forcar: bool = False) -> bool:
+        """Recarrega o arquivo se ele mudou. Retorna True se houve recarga."""
+        agora = time.monotonic()
+        if not forcar and agora - self._ultima_verificacao < self.intervalo_verificacao:
+            return False
+
+        # Se outra thread já está verificando (ou recarregando), segue com o índice atual
+        if not self._lock.acquire(blocking=forcar):
+            return False
+        try:
+            self._ultima_verificacao = agora
+            try:
+                assinatura = self._assinatura_arquivo()
+            except OSError as e:
+                print(f"Erro ao verificar {self.db_path}: {e}")
+                return False
+            if not forcar and assinatura == self._assinatura:
+                return False
+
+            try:
+                indice = self._carregar("%x-%x" % assinatura)
+            except Exception as e:
+                # Mantém o índice anterior se o arquivo estiver sendo reescrito
+                print(f"Erro ao recarregar {self.db_path}: {e}")
+                return False
+
+            # O índice anterior não é fechado aqui: requisições que o pegaram antes da troca
+            # ainda podem estar lendo dele. O mmap de uma base .cvmdb é liberado quando a
+            # última referência ao índice antigo some
+            self._dados = indice
+            self._assinatura = assinatura
+            print(f"Base carregada: {len(indice.fundos)} fundos")
+            return True
+        finally:
+            self._lock.release()
+
+    def _verificar(self):
+        if self.verificar_ao_consultar:
+            self.atualizar()
+
+    def verificacao_pendente(self) -> bool:
+        """True se já passou o intervalo e a próxima chamada a `atualizar` vai consultar o arquivo."""
+        return time.monotonic() - self._ultima_verificacao >= self.intervalo_verificacao
+
+    @property
+    def em_memoria(self) -> bool:
+        """True se todos os fundos já estão convertidos em memória (base JSON ou Parquet)."""
+        return isinstance(self._dados.fundos, dict)
+
+    @property
+    def versao(self) -> str:
+        """Versão da base carregada; muda a cada recarga. Usada nos ETags da API."""
+        return self._dados.versao
+
+    def get(self, cnpj: str) -> Optional[Fundo]:
+        """Busca um fundo pelo CNPJ (qualquer formato). O modelo é montado a cada chamada."""
+        self._verificar()
+        fundo = self._dados.fundos.get(normalize_cnpj(cnpj))
+        return fundo.modelo() if fundo else None
+
+    def json_do_fundo(self, cnpj: str) -> Optional[bytes]:
+        """JSON pronto de /fundos/{cnpj}, se a base for mapeada (.cvmdb); senão None."""
+        self._verificar()
+        base = getattr(self._dados.fundos, "base", None)
+        if isinstance(base, BaseMapeada):
+            return base.json(normalize_cnpj(cnpj))
+        return None
+
+    def _base_sql(self) -> Optional[BaseSQL]:
+        self._verificar()
+        base = getattr(self._dados.fundos, "base", None)
+        return base if isinstance(base, BaseSQL) else None
+
+    def patrimonio_na_data(self, data: str, tipo: Optional[str] = None, pl_min: Optional[float] = None,
+                           pl_max: Optional[float] = None, limit: int = 100) -> Optional[List[dict]]:
+        """Fundos (de um tipo) com PL na faixa, na data do informe diário. None se a base não for SQL."""
+        base = self._base_sql()
+        return None if base is None else base.patrimonio_na_data(data, tipo, pl_min, pl_max, limit)
+
+    def saldos_da_conta(self, codigo_conta: str, data: Optional[str] = None,
+                        limit: int = 100) -> Optional[List[dict]]:
+        """Saldos de uma conta do balancete em todos os fundos. None se a base não for SQL."""
+        base = self._base_sql()
+        return None if base is None else base.saldos_da_conta(codigo_conta, data, limit)
+
+    def dados(self, cnpj: str) -> Optional[DadosFundo]:
+        """Representação em colunas de um fundo, sem montar modelos."""
+        self._verificar()
+        return self._dados.fundos.get(normalize_cnpj(cnpj))
+
+    def buscar(self, cnpjs: List[str]) -> Tuple[List[DadosFundo], List[str]]:
+        """
+        Busca vários fundos (CNPJs em qualquer formato) numa única consulta ao índice.
+        Retorna os fundos encontrados, na ordem pedida e sem repetição, e os CNPJs não encontrados.
+        """
+        self._verificar()
+        fundos = self._dados.fundos
+        encontrados, nao_encontrados, vistos = [], [], set()
+        for cnpj in cnpjs:
+            chave = normalize_cnpj(cnpj)
+            fundo = fundos.get(chave)
+            if fundo is None:
+                nao_encontrados.append(cnpj)
+            elif chave not in vistos:
+                vistos.add(chave)
+                encontrados.append(fundo)
+        return encontrados, nao_encontrados
+
+    def serie(self, cnpj: str, atributo: str) -> Optional[SerieTemporal]:
+        """Histórico de um fundo ordenado por data (balances, applications, patrimonio, daily_info)."""
+        self._verificar()
+        fundo = self._dados.fundos.get(normalize_cnpj(cnpj))
+        return fundo.series[atributo] if fundo else None
+
+    def indicadores(self, cnpj: str) -> Optional[dict]:
+        """Indicadores pré-calculados de um fundo (retornos, volatilidade, captação, ...)."""
+        self._verificar()
+        fundo = self._dados.fundos.get(normalize_cnpj(cnpj))
+        return fundo.indicadores if fundo else None
+
+    def ranking(self, metrica: str, n: int, decrescente: bool = True) -> List[dict]:
+        """Os `n` fundos com maior (ou menor) valor da métrica, com seus dados básicos."""
+        self._verificar()
+        indice = self._dados
+        # Dados básicos pelo resumo, sem converter os fundos de uma base mapeada
+        return [{**indice.resumo[bisect.bisect_left(indice.chaves, chave)], metrica: valor}
+                for chave, valor in indice.ranking.top(metrica, n, decrescente)]
+
+    def pesquisar(self, consulta: Optional[str] = None, tipo: Optional[str] = None,
+                  pl_min: Optional[float] = None, pl_max: Optional[float] = None,
+                  limit: int = 50) -> List[dict]:
+        """Fundos cujo nome/tipo contém as palavras da consulta (por prefixo, sem acentos), maior PL primeiro."""
+        self._verificar()
+        indice = self._dados
+        posicoes = indice.busca.buscar(consulta, tipo, pl_min, pl_max)[:limit]
+        pls = indice.ranking.valores["pl"]
+        return [{**indice.resumo[i], "pl": None if np.isnan(pls[i]) else float(pls[i])} for i in posicoes.tolist()]
+
+    def detentores(self, codigo: str, periodo: Optional[str] = None, limit: int = 100) -> Optional[dict]:
+        """
+        Fundos que detêm um ativo (ISIN ou código SELIC), com a exposição de cada um.
+        Numa base SQLite a consulta vai ao banco (BaseSQL.detentores), sem converter os fundos.
+        """
+        self._verificar()
+        indice = self._dados
+        return indice.posicoes.detentores(codigo.strip().upper(), indice.resumo, periodo, limit)
+
+    def listar(self) -> List[dict]:
+        """Dados básicos de todos os fundos, ordenados por CNPJ."""
+        self._verificar()
+        return self._dados.resumo
+
+    def pagina(self, cursor: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Dados básicos dos fundos com CNPJ maior que `cursor` (até `limit` itens).
+        Retorna também o cursor da próxima página, ou None se esta for a última.
+        """
+        self._verificar()
+        indice = self._dados
+        inicio = bisect.bisect_right(indice.chaves, normalize_cnpj(cursor)) if cursor else 0
+        fim = len(indice.chaves) if limit is None else min(inicio + limit, len(indice.chaves))
+        proximo = indice.chaves[fim - 1] if fim < len(indice.chaves) and fim > inicio else None
+        return indice.resumo[inicio:fim], proximo
+
+    def __len__(self) -> int:
+        return len(self._dados.fundos)
+
+# ------------------------------
+# ACESSO ASSÍNCRONO
+# ------------------------------
+class StoreAssincrono:
+    """
+    O FundStore para os endpoints async: cada consulta roda no laço de eventos
+    quando só lê índices em memória e no executor limitado (ver execucao.py)
+    quando lê arquivo, converte fundos ou monta modelos. A verificação da base
+    é sempre a de `atualizar`, fora do laço; as consultas do FundStore nunca a fazem.
+    """
+
+    def __init__(self, store: FundStore, executor: ExecutorLimitado):
+        # As consultas do store não tocam no arquivo: só `atualizar`, abaixo, o verifica
+        store.verificar_ao_consultar = False
+        self.store = store
+        self.executor = executor
+        self._verificacao: Optional[asyncio.Future] = None
+
+    @property
+    def versao(self) -> str:
+        return self.store.versao
+
+    async def atualizar(self, forcar: bool = False) -> bool:
+        """
+        Verifica (e recarrega, se mudou) a base. Dentro do intervalo não sai do laço, e
+        enquanto uma verificação está em andamento as demais requisições seguem com o
+        índice atual. A verificação usa o executor padrão do laço, não a fila do executor
+        limitado, para não esperar atrás das tarefas pesadas.
+        """
+        if not forcar and (self._verificacao is not None or not self.store.verificacao_pendente()):
+            return False
+        self._verificacao = asyncio.get_running_loop().run_in_executor(None, self.store.atualizar, forcar)
+        try:
+            return await self._verificacao
+        finally:
+            self._verificacao = None
+
+    async def executar(self, funcao, *args, admitir: bool = True):
+        """Trabalho pesado qualquer (ex.: serializar uma resposta) no executor."""
+        return await self.executor.executar(funcao, *args, admitir=admitir)
+
+    async def _indice(self, funcao, *args):
+        # Com a base em memória é só uma consulta a dicts; nas bases sob demanda o
+        # fundo pode precisar ser lido do arquivo e convertido
+        await self.atualizar()
+        if self.store.em_memoria:
+            return funcao(*args)
+        return await self.executor.executar(funcao, *args)
+
+    async def _pesado(self, funcao, *args):
+        await self.atualizar()
+        return await self.executor.executar(funcao, *args)
+
+    async def _no_laco(self, funcao, *args):
+        await self.atualizar()
+        return funcao(*args)
+
+    async def com_fundo(self, cnpj: str, funcao: Callable[[DadosFundo], T]) -> Optional[T]:
+        """`funcao(fundo)` no executor, lendo o fundo na mesma tarefa. None se o fundo não existe."""
+        def tarefa():
+            dados = self.store.dados(cnpj)
+            return None if dados is None else funcao(dados)
+        return await self._pesado(tarefa)
+
+    async def json_do_fundo(self, cnpj: str) -> Optional[bytes]:
+        # Fatia do mmap: não converte nada
+        return await self._no_laco(self.store.json_do_fundo, cnpj)
+
+    async def dados(self, cnpj: str) -> Optional[DadosFundo]:
+        return await self._indice(self.store.dados, cnpj)
+
+    async def buscar(self, cnpjs: List[str]) -> Tuple[List[DadosFundo], List[str]]:
+        return await self._indice(self.store.buscar, cnpjs)
+
+    async def serie(self, cnpj: str, atributo: str) -> Optional[SerieTemporal]:
+        return await self._indice(self.store.serie, cnpj, atributo)
+
+    async def indicadores(self, cnpj: str) -> Optional[dict]:
+        return await self._indice(self.store.indicadores, cnpj)
+
+    async def ranking(self, metrica: str, n: int, decrescente: bool = True) -> List[dict]:
+        return await self._no_laco(self.store.ranking, metrica, n, decrescente)
+
+    async def pesquisar(self, consulta: Optional[str] = None, tipo: Optional[str] = None,
+                        pl_min: Optional[float] = None, pl_max: Optional[float] = None,
+                        limit: int = 50) -> List[dict]:
+        return await self._no_laco(self.store.pesquisar, consulta, tipo, pl_min, pl_max, limit)
+
+    async def pagina(self, cursor: Optional[str] = None,
+                     limit: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        return await self._no_laco(self.store.pagina, cursor, limit)
+
+    async def detentores(self, codigo: str, periodo: Optional[str] = None, limit: int = 100) -> Optional[dict]:
+        # Agrega as posições (e, nas bases sob demanda, monta o índice na primeira vez)
+        return await self._pesado(self.store.detentores, codigo, periodo, limit)
+
+    async def patrimonio_na_data(self, data: str, tipo: Optional[str] = None, pl_min: Optional[float] = None,
+                                 pl_max: Optional[float] = None, limit: int = 100) -> Optional[List[dict]]:
+        return await self._pesado(self.store.patrimonio_na_data, data, tipo, pl_min, pl_max, limit)
+
+    async def saldos_da_conta(self, codigo_conta: str, data: Optional[str] = None,
+                              limit: int = 100) -> Optional[List[dict]]:
+        return await self._pesado(self.store.saldos_da_conta, codigo_conta, data, limit)
@@ -13,7 +13,6 @@ Autor: Pipeline CVM
 Data: 2024
 """
 
-import subprocess
 import sys
 import argparse
 import json
@@ -22,16 +21,25 @@ from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Any
 
+from utils.cvm_utils import gerar_lista_ano_mes
+from utils.downloader import DownloadEngine, DownloadResult
+from utils.monta_base import destino_padrao, montar_base
+from Balancete import cvm_balancete
+from Composição import cvm_composicao
+from Diario import cvm_diario
+from Essenciais import cvm_essenciais
+
 class CVMPipeline:
     """Classe principal do pipeline CVM para downloads."""
     
     def __init__(self):
         self.root = Path(__file__).parent
-        self.scripts_download = {
-            'essenciais': self.root / 'Essenciais' / 'cvm_essenciais.py',
-            'diario': self.root / 'Diario' / 'cvm_diario.py', 
-            'composicao': self.root / 'Composição' / 'cvm_composicao.py',
-            'balancete': self.root / 'Balancete' / 'cvm_balancete.py',
+        # Módulos de download, chamados diretamente no mesmo processo
+        self.datasets = {
+            'essenciais': cvm_essenciais,
+            'diario': cvm_diario,
+            'composicao': cvm_composicao,
+            'balancete': cvm_balancete,
         }
         
     def log(self, message: str, level: str = "INFO"):
@@ -55,64 +63,6 @@ class CVMPipeline:
                 
         return True
         
-    def update_script_parameters(self, script_path: Path, anos: List[int], meses: List[int]):
-        """Atualiza os parâmetros de anos e meses nos scripts."""
-        try:
-            with open(script_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                
-            new_lines = []
-            for line in lines:
-                if line.strip().startswith('anos ='):
-                    new_lines.append(f'anos = {anos}\n')
-                elif line.strip().startswith('meses ='):
-                    new_lines.append(f'meses = {meses}\n')
-                else:
-                    new_lines.append(line)
-                    
-            with open(script_path, 'w', encoding='utf-8') as f:
-                f.writelines(new_lines)
-                
-            self.log(f"Parâmetros atualizados em {script_path.name}")
-            
-        except Exception as e:
-            self.log(f"Erro ao atualizar {script_path.name}: {e}", "ERROR")
-            raise
-            
-    def run_script(self, script_path: Path, description: str = None) -> bool:
-        """Executa um script Python e retorna sucesso/falha."""
-        script_name = script_path.name
-        desc = description or f"script {script_name}"
-        
-        self.log(f"Executando {desc}...")
-        
-        try:
-            result = subprocess.run(
-                [sys.executable, str(script_path)], 
-                capture_output=True, 
-                text=True,
-                timeout=300  # 5 minutos de timeout
-            )
-            
-            if result.stdout.strip():
-                print(result.stdout)
-                
-            if result.returncode == 0:
-                self.log(f"✓ {desc} executado com sucesso")
-                return True
-            else:
-                self.log(f"✗ Erro ao executar {desc}", "ERROR")
-                if result.stderr:
-                    print("STDERR:", result.stderr)
-                return False
-                
-        except subprocess.TimeoutExpired:
-            self.log(f"✗ Timeout ao executar {desc}", "ERROR")
-            return False
-        except Exception as e:
-            self.log(f"✗ Erro inesperado ao executar {desc}: {e}", "ERROR")
-            return False
-            
     def get_user_inputs(self) -> tuple[List[int], List[int]]:
         """Coleta anos e meses do usuário interativamente."""
         while True:
@@ -138,12 +88,13 @@ class CVMPipeline:
         print("\n" + "="*60)
         print("RESUMO DA EXECUÇÃO")
         print("="*60)
-        print("Anos selecionados: {', '.join(map(str, anos))}")
+        print(f"Anos selecionados: {', '.join(map(str, anos))}")
         print(f"Meses selecionados: {', '.join(map(str, meses))}")
         print(f"Total de períodos: {len(anos) * len(meses)}")
+        print(f"Total de arquivos: {len(anos) * len(meses) * len(self.datasets)}")
         print("\nTipos de dados que serão baixados:")
-        for nome, script in self.scripts_download.items():
-            print(f"  • {nome.capitalize()}: {script.name}")
+        for nome, modulo in self.datasets.items():
+            print(f"  • {nome.capitalize()}: {modulo.URL.rsplit('/', 1)[-1]}")
         print("="*60)
         
         resposta = input("\nDeseja continuar com o download? (s/N): ").lower()
@@ -151,8 +102,20 @@ class CVMPipeline:
             print("Download cancelado pelo usuário.")
             sys.exit(0)
             
-    def run_pipeline(self, anos: List[int], meses: List[int], skip_download: bool = False):
-        """Executa apenas os downloads dos dados."""
+    def log_download(self, resultado: DownloadResult):
+        """Registra a conclusão de um job de download."""
+        job = resultado.job
+        if resultado.status == "nao_modificado":
+            self.log(f"= {job.dataset} {job.periodo} (não modificado, nada transferido)")
+        elif resultado.ok:
+            self.log(f"✓ {job.dataset} {job.periodo} {resultado.status} ({resultado.tamanho / 1e6:.1f} MB em "
+                     f"{resultado.duracao:.1f}s, {resultado.throughput / 1e6:.2f} MB/s)")
+        else:
+            self.log(f"✗ {job.dataset} {job.periodo}: {resultado.erro}", "WARNING")
+
+    def run_pipeline(self, anos: List[int], meses: List[int], skip_download: bool = False,
+                     workers: int = 4, max_por_host: int = None, build_db: str = None):
+        """Executa os downloads dos dados e, com `build_db`, monta a base da API a partir dos ZIPs."""
         start_time = datetime.now()
         self.log("Iniciando pipeline de download CVM")
         
@@ -163,27 +126,25 @@ class CVMPipeline:
         # Resumo
         self.show_summary(anos, meses)
         
+        periodos = gerar_lista_ano_mes(anos, meses)
+        jobs = [job for modulo in self.datasets.values() for job in modulo.montar_jobs(periodos)]
         success_count = 0
-        total_steps = len(self.scripts_download)
+        total_steps = len(jobs)
         
         if not skip_download:
-            # Fase única: Atualizar parâmetros e executar downloads
-            self.log("=== EXECUTANDO DOWNLOADS DOS DADOS ===")
+            # Fase única: todos os arquivos (dataset × período) em paralelo
+            self.log(f"=== EXECUTANDO DOWNLOADS DOS DADOS ({workers} workers) ===")
             
-            for nome, script_path in self.scripts_download.items():
-                if not script_path.exists():
-                    self.log(f"Script não encontrado: {script_path}", "WARNING")
-                    continue
-                    
-                self.update_script_parameters(script_path, anos, meses)
-                
-                if self.run_script(script_path, f"download de dados {nome}"):
-                    success_count += 1
-                else:
-                    self.log(f"Falha no download de {nome}", "WARNING")
+            with DownloadEngine(workers=workers, max_por_host=max_por_host) as engine:
+                resultados = engine.executar(jobs, callback=self.log_download)
+            success_count = sum(1 for r in resultados if r.ok)
+            total_bytes = sum(r.tamanho for r in resultados)
+            self.log(f"Total transferido: {total_bytes / 1e6:.1f} MB")
+            falhas = sorted((r.job.dataset, r.job.periodo, r.erro) for r in resultados if not r.ok)
         else:
             self.log("=== DOWNLOAD PULADO (--skip-download) ===")
-            success_count = len(self.scripts_download)
+            success_count = total_steps
+            falhas = []
             
         # Relatório final
         end_time = datetime.now()
@@ -194,6 +155,10 @@ class CVMPipeline:
         print("="*60)
         print(f"Downloads executados com sucesso: {success_count}/{total_steps}")
         print(f"Tempo total de execução: {duration}")
+        if falhas:
+            print("Períodos com falha:")
+            for dataset, periodo, erro in falhas:
+                print(f"  ✗ {dataset} {periodo}: {erro}")
         
         # Verificar arquivos baixados na pasta temp
         temp_path = self.root / "utils" / "temp"
@@ -208,6 +173,9 @@ class CVMPipeline:
         
         print("="*60)
         
+        if build_db and not self.build_database(temp_path, build_db):
+            return False
+        
         if success_count == total_steps:
             self.log("✓ Downloads executados com sucesso!")
             return True
@@ -215,6 +183,20 @@ class CVMPipeline:
             self.log(f"✗ Downloads finalizados com {total_steps - success_count} falhas", "WARNING")
             return False
 
+    def build_database(self, temp_path: Path, destino: str) -> bool:
+        """Monta a base da API (database.json) direto dos ZIPs da pasta temp."""
+        self.log(f"=== MONTANDO BASE DA API EM {destino} ===")
+        try:
+            total = montar_base(str(temp_path), destino)
+        except Exception as e:
+            self.log(f"✗ Falha ao montar a base da API: {e}", "ERROR")
+            return False
+        if not total:
+            self.log("✗ Nenhum fundo encontrado nos ZIPs da pasta temp", "WARNING")
+            return False
+        self.log(f"✓ Base da API montada com {total} fundos")
+        return True
+
 def main():
     """Função principal."""
     parser = argparse.ArgumentParser(
@@ -224,7 +206,10 @@ def main():
 Exemplos de uso:
   python pipeline_cvm.py --ano 2024 --mes 1 2 3
   python pipeline_cvm.py --ano 2023 2024 --mes 12 1
+  python pipeline_cvm.py --ano 2020 2021 2022 2023 2024 --mes 1 2 3 4 5 6 7 8 9 10 11 12 --workers 8
   python pipeline_cvm.py --skip-download (pula downloads)
+  python pipeline_cvm.py --ano 2024 --mes 1 2 3 --build-db (baixa e monta api/database.json)
+  python pipeline_cvm.py --skip-download --build-db /caminho/database.json
   python pipeline_cvm.py  (modo interativo)
         """
     )
@@ -235,6 +220,12 @@ Exemplos de uso:
                        help='Mês(es) desejado(s), ex: --mes 1 3 4')
     parser.add_argument('--skip-download', action='store_true',
                        help='Pula a fase de download (retorna sucesso sem fazer nada)')
+    parser.add_argument('--workers', type=int, default=4,
+                       help='Número de downloads simultâneos (padrão: 4)')
+    parser.add_argument('--max-por-host', type=int, default=None,
+                       help='Limite de conexões simultâneas por host (padrão: igual a --workers)')
+    parser.add_argument('--build-db', nargs='?', const=destino_padrao, default=None, metavar='DESTINO',
+                       help='Após os downloads, monta a base da API direto dos ZIPs: .json ou .sqlite (padrão: api/database.json)')
     
     args = parser.parse_args()
     
@@ -256,7 +247,8 @@ Exemplos de uso:
             _, meses = pipeline.get_user_inputs()
     
     # Executar pipeline
-    success = pipeline.run_pipeline(anos, meses, args.skip_download)
+    success = pipeline.run_pipeline(anos, meses, args.skip_download, args.workers, args.max_por_host,
+                                   args.build_db)
     sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Mesmo esquema dos scripts: a raiz do projeto no sys.path para `from utils.x import ...`
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
@@ -0,0 +1,45 @@
+"""
+Troca de uma base .cvmdb em uso: quem pegou o índice antigo continua lendo dele
+depois da recarga, e o mmap antigo é liberado quando a última referência some.
+"""
+
+import gc
+import os
+import sys
+import weakref
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+from base_mapeada import gravar_base_mapeada  # noqa: E402
+from series import dados_do_fundo  # noqa: E402
+from store import FundStore  # noqa: E402
+
+def _fundo(nome):
+    return {"fund": {"cnpj": "11.111.111/0001-11", "name": nome, "tipo": "FI"},
+            "balances": [], "applications": [], "patrimonio": [],
+            "daily_info": [{"data": "2024-01-02", "vl_total": None, "vl_quota": 1.0, "vl_patrim_liq": 10.0,
+                            "captc_dia": 0.0, "resg_dia": 0.0, "nr_cotst": 1.0}]}
+
+def _gravar(caminho, nome):
+    temporario = str(caminho) + ".tmp"
+    gravar_base_mapeada([("11111111111111", dados_do_fundo(_fundo(nome), {}))], temporario)
+    os.replace(temporario, caminho)
+
+def test_indice_antigo_continua_legivel_ate_a_ultima_referencia(tmp_path):
+    caminho = tmp_path / "database.cvmdb"
+    _gravar(caminho, "FUNDO A")
+    fundos = FundStore(str(caminho))
+    fundos.atualizar(forcar=True)
+
+    # Uma requisição em andamento segura o índice da versão anterior
+    em_uso = fundos._dados
+    antiga = weakref.ref(em_uso.fundos.base)
+    for nome in ("FUNDO B", "FUNDO C", "FUNDO D"):
+        _gravar(caminho, nome)
+        assert fundos.atualizar(forcar=True)
+        assert fundos.dados("11111111111111").fund["name"] == nome
+    assert b"FUNDO A" in em_uso.fundos.base.json("11111111111111")
+    assert em_uso.fundos["11111111111111"].fund["name"] == "FUNDO A"
+
+    del em_uso
+    gc.collect()
+    assert antiga() is None
@@ -0,0 +1,62 @@
+"""
+Base SQLite da API: os indicadores gravados na montagem e os detentores de um
+ativo consultados no banco devem ser os mesmos da base carregada do JSON.
+"""
+
+import json
+import os
+import random
+import sys
+import pytest
+from utils.base_sql import gravar_base_sql
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+from store import FundStore  # noqa: E402
+
+def _base(fundos=20):
+    rng = random.Random(7)
+    dias = [f"2024-{m:02d}-{d:02d}" for m in range(1, 4) for d in range(1, 29, 3)]
+    base = {}
+    for i in range(fundos):
+        cnpj = f"00.000.{i:03d}/0001-{i % 97:02d}"
+        base[cnpj] = {
+            "fund": {"cnpj": cnpj, "name": f"FUNDO {i}", "tipo": rng.choice(["FI", "FIC"])},
+            "balances": [],
+            "applications": [{"data": rng.choice(dias[::9]), "tipo_aplic": "Títulos Públicos", "tipo_ativo": None,
+                              "emissor_ligado": None, "tipo_negoc": None, "quantidade": float(rng.randint(1, 9)),
+                              "valor_mercado": rng.choice([None, rng.random() * 1e5]), "custo": None,
+                              "isin": rng.choice(["BRSTN0000001", "BRSTN0000002", None]),
+                              "selic": rng.choice(["760001", "760002"]), "emissao": None, "vencimento": None}
+                             for _ in range(rng.randint(0, 6))],
+            "patrimonio": [{"data": "2024-03-28", "vl_patrim_liq": rng.random() * 1e7}],
+            "daily_info": [{"data": d, "vl_total": None, "vl_quota": 1 + rng.random(), "vl_patrim_liq": rng.random() * 1e7,
+                            "captc_dia": 0.0, "resg_dia": rng.random(), "nr_cotst": 10.0}
+                           for d in dias[:rng.randint(0, len(dias))]],
+        }
+    return base
+
+@pytest.fixture(scope="module")
+def stores(tmp_path_factory):
+    pasta = tmp_path_factory.mktemp("base")
+    base = _base()
+    caminho_json = pasta / "database.json"
+    caminho_json.write_text(json.dumps(base), encoding="utf-8")
+    gravar_base_sql(base.items(), pasta / "database.sqlite")
+    lojas = FundStore(str(caminho_json)), FundStore(str(pasta / "database.sqlite"))
+    for loja in lojas:
+        loja.atualizar(forcar=True)
+    return lojas
+
+def test_ranking_vem_da_tabela_de_indicadores(stores):
+    em_memoria, sql = stores
+    for metrica in ("pl", "retorno_dia", "retorno_mes", "volatilidade_anual", "captacao_liquida"):
+        assert sql.ranking(metrica, 20) == em_memoria.ranking(metrica, 20)
+    # Nenhum fundo foi lido do banco para montar o ranking
+    assert len(sql._dados.fundos._cache) == 0
+
+@pytest.mark.parametrize("codigo", ["BRSTN0000001", "BRSTN0000002", "760001", "760002", "INEXISTENTE"])
+@pytest.mark.parametrize("periodo", [None, "2024-01", "2025-01"])
+def test_detentores_consulta_o_banco(stores, codigo, periodo):
+    em_memoria, sql = stores
+    assert sql.detentores(codigo, periodo, 5) == em_memoria.detentores(codigo, periodo, 5)
+    assert len(sql._dados.fundos._cache) == 0
@@ -0,0 +1,98 @@
+"""
+CacheHTTP com um app Starlette mínimo: ETag/304 também em HEAD, respostas
+pequenas montadas inteiras e as grandes em streaming, cacheadas ao final.
+"""
+
+import os
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from api import cache
+from api.cache import CacheHTTP
+
+class StoreFalso:
+    """O mínimo do StoreAssincrono que o middleware usa."""
+
+    versao = "v1"
+
+    async def atualizar(self):
+        pass
+
+    async def executar(self, funcao, *args, admitir=True):
+        return funcao(*args)
+
+PEQUENO = b"x" * 10_000
+GRANDE = os.urandom(cache.LIMITE_BUFFER * 3)
+
+def _app(orcamento_bytes):
+    chamadas = {"grande": 0}
+
+    async def fundo(request):
+        if request.path_params["cnpj"] != "11111111111111":
+            return Response('{"detail":"Fundo não encontrado"}', status_code=404,
+                            media_type="application/json")
+        return Response(PEQUENO, media_type="application/json")
+
+    async def pequeno(request):
+        return Response(PEQUENO, media_type="application/json")
+
+    async def grande(request):
+        chamadas["grande"] += 1
+        blocos = [GRANDE[i:i + 64 * 1024] for i in range(0, len(GRANDE), 64 * 1024)]
+
+        async def gerar():
+            for bloco in blocos:
+                yield bloco
+        return StreamingResponse(gerar(), media_type="application/json")
+
+    app = Starlette(routes=[Route("/pequeno", pequeno), Route("/grande", grande),
+                                 Route("/fundos/{cnpj}", fundo)])
+    app.add_middleware(CacheHTTP, store=StoreFalso(), orcamento_bytes=orcamento_bytes)
+    return TestClient(app), chamadas
+
+def test_head_responde_304_com_if_none_match():
+    cliente, _ = _app(cache.ORCAMENTO_PADRAO)
+    etag = cliente.get("/pequeno").headers["etag"]
+    resposta = cliente.head("/pequeno", headers={"If-None-Match": etag})
+    assert resposta.status_code == 304
+    resposta = cliente.head("/pequeno")
+    assert resposta.status_code == 200
+    assert resposta.headers["etag"] == etag
+    assert resposta.content == b""
+
+def test_resposta_pequena_comprimida_e_cacheada():
+    cliente, _ = _app(cache.ORCAMENTO_PADRAO)
+    resposta = cliente.get("/pequeno", headers={"Accept-Encoding": "gzip"})
+    assert resposta.headers["content-encoding"] == "gzip"
+    assert int(resposta.headers["content-length"]) < len(PEQUENO)
+    assert resposta.content == PEQUENO
+
+def test_resposta_grande_em_streaming_entra_no_cache():
+    cliente, chamadas = _app(cache.ORCAMENTO_PADRAO)
+    for _ in range(2):
+        resposta = cliente.get("/grande", headers={"Accept-Encoding": "gzip"})
+        assert resposta.headers["content-encoding"] == "gzip"
+        assert resposta.content == GRANDE
+    # A segunda veio do cache
+    assert chamadas["grande"] == 1
+
+def test_resposta_grande_acima_do_limite_por_item_nao_entra_no_cache():
+    # maximo_item = orçamento / 8, menor que o corpo
+    cliente, chamadas = _app(len(GRANDE) * 4)
+    for _ in range(2):
+        assert cliente.get("/grande").content == GRANDE
+    assert chamadas["grande"] == 2
+
+def test_if_none_match_asterisco_em_fundo_inexistente_responde_404():
+    cliente, _ = _app(cache.ORCAMENTO_PADRAO)
+    assert cliente.get("/fundos/00000000000000", headers={"If-None-Match": "*"}).status_code == 404
+    assert cliente.get("/fundos/11111111111111", headers={"If-None-Match": "*"}).status_code == 304
+
+def test_etag_igual_em_resposta_grande_responde_304():
+    cliente, chamadas = _app(len(GRANDE) * 4)
+    etag = cliente.get("/grande").headers["etag"]
+    resposta = cliente.get("/grande", headers={"If-None-Match": etag})
+    assert resposta.status_code == 304
+    assert resposta.content == b""
+    assert chamadas["grande"] == 2
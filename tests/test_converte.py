@@ -0,0 +1,138 @@
+"""
+normalize_json_vetorizado deve produzir exatamente o mesmo que normalize_json,
+inclusive nos valores ausentes/malformados e com períodos fora de ordem.
+"""
+
+import json
+import random
+import zipfile
+import pytest
+from utils.converte import (fundos_do_json, normalize_dataframes, normalize_json, normalize_json_vetorizado,
+                            tabelas_do_parquet)
+from utils.grava_json import ler_json_por_chave
+
+DATAS = ["2024-01-31", "2023-12-01", "NaN", "", "nan", None, "2024-13-01", "31/01/2024", "2024-02-30",
+         "2024-1-5", "2024-01-05 00:00:00", " 2024-01-05", "abc"]
+NUMEROS = ["1234.56", "0.1", "-3", "1e3", "NaN", "", "nan", None, "1,5", "abc", " 2 ", "inf",
+           "0.30000000000000004", "123456789.123456789", 1.5, 0.0, -7.25, 10]
+TEXTOS = ["FI", "FIC", "NaN", "", None, "Ação", "Títulos Públicos"]
+SIM_NAO = ["S", "N", "NaN", "", None, "s"]
+
+def _registro(rng, colunas):
+    return {coluna: rng.choice(valores) for coluna, valores in colunas.items()}
+
+def _base_aleatoria(semente, fundos=30):
+    rng = random.Random(semente)
+    colunas = {
+        "balancete": {"DT_COMPTC": DATAS, "PLANO_CONTA_BALCTE": TEXTOS, "CD_CONTA_BALCTE": TEXTOS,
+                      "VL_SALDO_BALCTE": NUMEROS},
+        "cda_fi_BLC_1": {"DENOM_SOCIAL": ["FUNDO A", "FUNDO B", "NaN", None], "TP_FUNDO_CLASSE": TEXTOS,
+                         "DT_COMPTC": DATAS, "TP_APLIC": TEXTOS, "TP_ATIVO": TEXTOS, "EMISSOR_LIGADO": SIM_NAO,
+                         "TP_NEGOC": TEXTOS, "QT_POS_FINAL": NUMEROS, "VL_MERC_POS_FINAL": NUMEROS,
+                         "VL_CUSTO_POS_FINAL": NUMEROS, "CD_ISIN": TEXTOS, "CD_SELIC": TEXTOS,
+                         "DT_EMISSAO": DATAS, "DT_VENC": DATAS},
+        "cda_fi_PL": {"DT_COMPTC": DATAS, "VL_PATRIM_LIQ": NUMEROS},
+        "inf_diario": {"DT_COMPTC": DATAS, "VL_TOTAL": NUMEROS, "VL_QUOTA": NUMEROS, "VL_PATRIM_LIQ": NUMEROS,
+                       "CAPTC_DIA": NUMEROS, "RESG_DIA": NUMEROS, "NR_COTST": NUMEROS},
+    }
+    nomes = {"balancete": "balancete_fi_{}.csv", "cda_fi_BLC_1": "cda_fi_BLC_1_{}.csv",
+             "cda_fi_PL": "cda_fi_PL_{}.csv", "inf_diario": "inf_diario_fi_{}.csv"}
+    base = {}
+    for i in range(fundos):
+        arquivos = []
+        for periodo in rng.sample(["202312", "202401", "202402", "202403"], rng.randint(1, 4)):
+            for tipo in rng.sample(list(colunas), rng.randint(1, len(colunas))):
+                linhas = [_registro(rng, colunas[tipo]) for _ in range(rng.randint(0, 4))]
+                for linha in linhas:
+                    # Colunas ausentes em alguns registros
+                    if rng.random() < 0.1:
+                        linha.pop(rng.choice(list(linha)))
+                arquivos.append((nomes[tipo].format(periodo), linhas))
+        # Períodos e arquivos fora de ordem, como no JSON incremental
+        rng.shuffle(arquivos)
+        base[f"00.000.{i:03d}/0001-{rng.randint(10, 99)}"] = dict(arquivos)
+    return base
+
+def test_base_vazia():
+    assert normalize_json_vetorizado({}) == normalize_json({})
+
+def test_casos_de_borda():
+    base = {
+        "11.111.111/0001-11": {
+            # Período mais recente antes do mais antigo
+            "inf_diario_fi_202402.csv": [{"DT_COMPTC": "2024-02-01", "VL_QUOTA": "NaN", "NR_COTST": ""}],
+            "cda_fi_BLC_1_202402.csv": [{"DENOM_SOCIAL": "FUNDO X", "TP_FUNDO_CLASSE": "FI",
+                                         "DT_COMPTC": "2024-02-29", "EMISSOR_LIGADO": "S", "QT_POS_FINAL": 10.0}],
+            "inf_diario_fi_202401.csv": [{"DT_COMPTC": "2024-13-01", "VL_QUOTA": "abc", "NR_COTST": "1,5"}],
+            "cda_fi_BLC_1_202401.csv": [{"DENOM_SOCIAL": None, "TP_FUNDO_CLASSE": "NaN",
+                                         "DT_COMPTC": "NaN", "EMISSOR_LIGADO": "", "QT_POS_FINAL": "1e3"}],
+            "balancete_fi_202401.csv": [],
+        },
+        # Sem CDA: fica fora da base
+        "22.222.222/0001-22": {"cda_fi_PL_202401.csv": [{"DT_COMPTC": "2024-01-31", "VL_PATRIM_LIQ": "10"}]},
+        # Arquivo sem período no nome
+        "33.333.333/0001-33": {"outro.csv": [{"X": "1"}]},
+    }
+    assert normalize_json_vetorizado(base) == normalize_json(base)
+
+@pytest.mark.parametrize("semente", range(20))
+def test_base_aleatoria(semente):
+    base = _base_aleatoria(semente)
+    esperado = normalize_json(base)
+    obtido = normalize_json_vetorizado(base)
+    assert list(obtido) == list(esperado)
+    for cnpj in esperado:
+        assert obtido[cnpj] == esperado[cnpj], cnpj
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_json_lido_em_lotes(tmp_path, indent):
+    base = _base_aleatoria(7, fundos=50)
+    caminho = tmp_path / "informacoes_cnpj.json"
+    caminho.write_text(json.dumps(base, ensure_ascii=False, indent=indent), encoding="utf-8")
+    # Blocos de leitura e lotes pequenos: valores partidos entre blocos e vários lotes
+    fundos = fundos_do_json(ler_json_por_chave(caminho, bloco=64), cnpjs_por_lote=7)
+    esperado = normalize_json(base)
+    obtido = dict(fundos)
+    assert list(obtido) == list(esperado)
+    assert obtido == esperado
+
+# CDA no layout antigo (CNPJ_FUNDO/TP_FUNDO, sem CD_ISIN/CD_SELIC) e no atual, com células vazias
+CDA_ANTIGO = (
+    "TP_FUNDO;CNPJ_FUNDO;DENOM_SOCIAL;DT_COMPTC;TP_APLIC;TP_ATIVO;EMISSOR_LIGADO;TP_NEGOC;"
+    "QT_POS_FINAL;VL_MERC_POS_FINAL;VL_CUSTO_POS_FINAL;DT_VENC\n"
+    "FI;11.111.111/0001-11;FUNDO A;2018-12-31;Títulos Públicos;LTN;N;Para negociação;10;1000.5;;2020-01-01\n"
+    "FI;22.222.222/0001-22;FUNDO B;2018-12-31;Outros;;S;;;;;\n"
+)
+CDA_ATUAL = (
+    "TP_FUNDO_CLASSE;CNPJ_FUNDO_CLASSE;DENOM_SOCIAL;DT_COMPTC;TP_APLIC;TP_ATIVO;EMISSOR_LIGADO;TP_NEGOC;"
+    "QT_POS_FINAL;VL_MERC_POS_FINAL;VL_CUSTO_POS_FINAL;CD_ISIN;CD_SELIC;DT_EMISSAO;DT_VENC\n"
+    "FI;11.111.111/0001-11;FUNDO A;2024-01-31;Títulos Públicos;LTN;N;Para negociação;5;500;490;BRSTNCLTN7X1;;;\n"
+)
+
+def test_cda_no_layout_antigo_igual_pelo_json_e_pelo_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    from utils.extrai_cnpj import process_csv
+    caminho_zip = tmp_path / "cda.zip"
+    with zipfile.ZipFile(caminho_zip, "w") as z:
+        z.writestr("cda_fi_BLC_1_201812.csv", CDA_ANTIGO.encode("latin1"))
+        z.writestr("cda_fi_BLC_1_202401.csv", CDA_ATUAL.encode("latin1"))
+
+    pasta = tmp_path / "parquet"
+    informacoes = {}
+    for membro in ("cda_fi_BLC_1_201812.csv", "cda_fi_BLC_1_202401.csv"):
+        nome_arquivo, resultado = process_csv(str(caminho_zip), membro, str(pasta))
+        for cnpj, registros in resultado.registros():
+            informacoes.setdefault(cnpj, {})[nome_arquivo] = registros
+
+    esperado = normalize_json(informacoes)
+    # Só o fundo com um arquivo no layout atual tem tipo; o outro fica fora nos dois caminhos
+    assert list(esperado) == ["11.111.111/0001-11"]
+    aplicacoes = esperado["11.111.111/0001-11"]["applications"]
+    assert [(a["isin"], a["selic"]) for a in aplicacoes] == [(None, None), ("BRSTNCLTN7X1", "NaN")]
+    assert normalize_dataframes(tabelas_do_parquet(str(pasta))) == esperado
+
+    # E na montagem direta dos ZIPs (monta_base.py)
+    from utils.monta_base import montar_base
+    destino = tmp_path / "database.json"
+    montar_base(str(tmp_path), str(destino), workers=1)
+    assert json.loads(destino.read_text(encoding="utf-8")) == esperado
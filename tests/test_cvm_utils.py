@@ -0,0 +1,173 @@
+"""
+transferir_arquivo contra um servidor HTTP local que imita o da CVM
+(ETag, If-None-Match, Range/If-Range e 416).
+"""
+
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from utils import cvm_utils
+from utils.cvm_utils import transferir_arquivo
+
+NOME = "inf_diario_fi_202401.zip"
+
+class ServidorFalso:
+    """Serve um único arquivo, com conteúdo e ETag trocáveis, e registra as requisições."""
+
+    def __init__(self, conteudo: bytes, etag: str):
+        self.conteudo = conteudo
+        self.etag = etag
+        self.requisicoes = []
+        # Trecho devolvido num 206 (None = o pedido pelo cliente)
+        self.inicio_forcado = None
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                cabecalhos = dict(self.headers)
+                servidor.requisicoes.append(cabecalhos)
+                if self.headers.get("If-None-Match") == servidor.etag:
+                    self.send_response(304)
+                    self.send_header("ETag", servidor.etag)
+                    self.end_headers()
+                    return
+                intervalo = self.headers.get("Range")
+                if intervalo and self.headers.get("If-Range") == servidor.etag:
+                    inicio = int(intervalo.split("=")[1].rstrip("-"))
+                    if inicio >= len(servidor.conteudo):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(servidor.conteudo)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    if servidor.inicio_forcado is not None:
+                        inicio = servidor.inicio_forcado
+                    corpo = servidor.conteudo[inicio:]
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {inicio}-{len(servidor.conteudo) - 1}/{len(servidor.conteudo)}")
+                else:
+                    corpo = servidor.conteudo
+                    self.send_response(200)
+                self.send_header("ETag", servidor.etag)
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_port}/{NOME}"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def fechar(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+@pytest.fixture
+def servidor():
+    s = ServidorFalso(os.urandom(300_000), '"v1"')
+    yield s
+    s.fechar()
+
+@pytest.fixture
+def pasta(tmp_path):
+    yield str(tmp_path)
+    # O manifesto é compartilhado por pasta dentro do processo
+    cvm_utils._manifestos.pop(os.path.abspath(str(tmp_path)), None)
+
+def _baixar(servidor, pasta):
+    return transferir_arquivo(servidor.url, NOME, pasta, timeout=10, chunk_size=64 * 1024)
+
+def _conteudo(pasta):
+    with open(os.path.join(pasta, NOME), "rb") as f:
+        return f.read()
+
+def _manifesto(pasta):
+    with open(os.path.join(pasta, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)[NOME]
+
+def _interromper(servidor, pasta, bytes_recebidos):
+    """Simula um download interrompido: .part com o começo do arquivo e manifesto de retomada."""
+    with open(os.path.join(pasta, NOME + ".part"), "wb") as f:
+        f.write(servidor.conteudo[:bytes_recebidos])
+    cvm_utils.get_manifesto(pasta).atualizar(NOME, parcial={"url": servidor.url, "etag": servidor.etag,
+                                                            "last_modified": None})
+
+def test_download_completo_grava_manifesto(servidor, pasta):
+    resultado = _baixar(servidor, pasta)
+    assert resultado.status == "baixado"
+    assert _conteudo(pasta) == servidor.conteudo
+    entrada = _manifesto(pasta)
+    assert entrada["etag"] == '"v1"'
+    assert entrada["tamanho"] == len(servidor.conteudo)
+    assert entrada["sha256"] == hashlib.sha256(servidor.conteudo).hexdigest()
+    assert not os.path.exists(os.path.join(pasta, NOME + ".part"))
+
+def test_nao_modificado_responde_304(servidor, pasta):
+    _baixar(servidor, pasta)
+    resultado = _baixar(servidor, pasta)
+    assert resultado.status == "nao_modificado"
+    assert resultado.bytes_transferidos == 0
+    assert servidor.requisicoes[-1]["If-None-Match"] == '"v1"'
+
+def test_arquivo_alterado_localmente_nao_usa_304(servidor, pasta):
+    _baixar(servidor, pasta)
+    caminho = os.path.join(pasta, NOME)
+    with open(caminho, "r+b") as f:
+        f.write(b"\x00" * 16)  # mesmo tamanho, conteúdo diferente
+    resultado = _baixar(servidor, pasta)
+    assert resultado.status == "baixado"
+    assert "If-None-Match" not in servidor.requisicoes[-1]
+    assert _conteudo(pasta) == servidor.conteudo
+
+def test_retoma_download_interrompido(servidor, pasta):
+    _interromper(servidor, pasta, 100_000)
+    resultado = _baixar(servidor, pasta)
+    assert resultado.status == "retomado"
+    assert resultado.bytes_transferidos == len(servidor.conteudo) - 100_000
+    assert servidor.requisicoes[-1]["Range"] == "bytes=100000-"
+    assert _conteudo(pasta) == servidor.conteudo
+    assert _manifesto(pasta)["sha256"] == hashlib.sha256(servidor.conteudo).hexdigest()
+
+def test_etag_mudou_durante_retomada_baixa_tudo(servidor, pasta):
+    _interromper(servidor, pasta, 100_000)
+    servidor.conteudo, servidor.etag = os.urandom(250_000), '"v2"'
+    resultado = _baixar(servidor, pasta)
+    # If-Range não confere: o servidor responde 200 com o arquivo novo inteiro
+    assert resultado.status == "baixado"
+    assert resultado.bytes_transferidos == len(servidor.conteudo)
+    assert _conteudo(pasta) == servidor.conteudo
+    assert _manifesto(pasta)["etag"] == '"v2"'
+
+def test_416_descarta_parcial_e_recomeca(servidor, pasta):
+    # .part maior que o arquivo remoto: o Range pedido não existe mais
+    _interromper(servidor, pasta, len(servidor.conteudo))
+    with open(os.path.join(pasta, NOME + ".part"), "ab") as f:
+        f.write(b"lixo")
+    resultado = _baixar(servidor, pasta)
+    assert resultado.status == "baixado"
+    assert _conteudo(pasta) == servidor.conteudo
+    assert _manifesto(pasta)["parcial"] is None
+
+def test_206_com_outro_intervalo_recomeca(servidor, pasta):
+    _interromper(servidor, pasta, 100_000)
+    servidor.inicio_forcado = 50_000
+    resultado = _baixar(servidor, pasta)
+    assert resultado.status == "baixado"
+    assert "Range" not in servidor.requisicoes[-1]
+    assert _conteudo(pasta) == servidor.conteudo
+
+def test_parcial_antigo_com_arquivo_completo(servidor, pasta):
+    _baixar(servidor, pasta)
+    _interromper(servidor, pasta, 100_000)
+    resultado = _baixar(servidor, pasta)
+    # A requisição é só de Range (sem If-None-Match) e o .part não fica para trás
+    assert "If-None-Match" not in servidor.requisicoes[-1]
+    assert resultado.status == "retomado"
+    assert _conteudo(pasta) == servidor.conteudo
+    assert not os.path.exists(os.path.join(pasta, NOME + ".part"))
+    assert _manifesto(pasta)["parcial"] is None
@@ -0,0 +1,32 @@
+"""
+Atualização incremental de informacoes_cnpj.json: só os arquivos reprocessados
+são substituídos, e os CNPJs que eles não tocam são copiados com o texto original.
+"""
+
+import json
+from utils.extrai_cnpj import mesclar_com_existente
+from utils.grava_json import JsonBruto, gravar_json_por_chave, ler_json_por_chave
+
+def test_mescla_substitui_so_os_arquivos_reprocessados(tmp_path):
+    existente = {
+        "11": {"balancete_fi_202401.csv": [{"X": "1"}], "inf_diario_fi_202401.csv": [{"Y": "2"}]},
+        "22": {"inf_diario_fi_202401.csv": [{"Y": "3"}]},
+        "33": {"balancete_fi_202401.csv": [{"X": "4"}]},
+    }
+    caminho = tmp_path / "informacoes_cnpj.json"
+    gravar_json_por_chave(existente.items(), caminho, indent=2)
+    novos = {"11": {"balancete_fi_202401.csv": [{"X": "5"}]}, "44": {"balancete_fi_202401.csv": [{"X": "6"}]}}
+
+    pares = list(mesclar_com_existente(ler_json_por_chave(caminho, com_texto=True), novos,
+                                       {"balancete_fi_202401.csv"}))
+    # "22" não tem o arquivo reprocessado: sai como o texto lido; "33" perdeu seu único arquivo
+    assert isinstance(dict(pares)["22"], JsonBruto)
+    assert [cnpj for cnpj, _ in pares] == ["11", "22", "44"]
+
+    destino = tmp_path / "novo.json"
+    gravar_json_por_chave(pares, destino, indent=2)
+    assert json.loads(destino.read_text(encoding="utf-8")) == {
+        "11": {"inf_diario_fi_202401.csv": [{"Y": "2"}], "balancete_fi_202401.csv": [{"X": "5"}]},
+        "22": {"inf_diario_fi_202401.csv": [{"Y": "3"}]},
+        "44": {"balancete_fi_202401.csv": [{"X": "6"}]},
+    }
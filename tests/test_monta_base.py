@@ -0,0 +1,34 @@
+"""
+tabelas_por_faixa: as faixas juntam as linhas de todos os arquivos na ordem deles,
+e os arquivos de origem são consumidos em vez de ficarem vivos até o fim.
+"""
+
+import gc
+import weakref
+import pandas as pd
+from utils.monta_base import tabelas_por_faixa
+
+def _arquivo(periodo, cnpjs):
+    return pd.DataFrame({"CNPJ": cnpjs, "PERIODO": periodo, "VL_PATRIM_LIQ": [float(i) for i in range(len(cnpjs))]})
+
+def test_faixas_consomem_os_arquivos():
+    arquivos = [_arquivo("202401", ["01", "02", "02", "05"]), _arquivo("202402", ["02", "03", "04", "06"])]
+    esperado = pd.concat(arquivos, ignore_index=True)
+    origens = [weakref.ref(df) for df in arquivos]
+    blocos = {"cda_pl": arquivos}
+    del arquivos
+
+    faixas = tabelas_por_faixa(blocos, cnpjs_por_lote=2)
+    primeira = next(faixas)
+    # Repartidos nas faixas, os arquivos de origem já foram descartados
+    gc.collect()
+    assert blocos == {"cda_pl": []}
+    assert all(origem() is None for origem in origens)
+
+    obtido = [primeira["cda_pl"]] + [tabelas["cda_pl"] for tabelas in faixas]
+    assert [sorted(set(df["CNPJ"])) for df in obtido] == [["01", "02"], ["03", "04"], ["05", "06"]]
+    # Dentro da faixa, as linhas seguem a ordem dos arquivos
+    assert obtido[0]["PERIODO"].tolist() == ["202401", "202401", "202401", "202402"]
+    juntos = pd.concat(obtido, ignore_index=True).sort_values(["CNPJ", "PERIODO"], kind="stable")
+    assert juntos.reset_index(drop=True).equals(
+        esperado.sort_values(["CNPJ", "PERIODO"], kind="stable").reset_index(drop=True))
@@ -0,0 +1,52 @@
+"""
+StoreAssincrono: as consultas feitas no laço de eventos nunca verificam nem
+recarregam o arquivo da base; isso só acontece fora do laço, em `atualizar`.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+from execucao import ExecutorLimitado  # noqa: E402
+from store import FundStore, StoreAssincrono  # noqa: E402
+
+FUNDO = {"fund": {"cnpj": "11.111.111/0001-11", "name": "FUNDO A", "tipo": "FI"},
+         "balances": [], "applications": [], "patrimonio": [],
+         "daily_info": [{"data": "2024-01-02", "vl_total": None, "vl_quota": 1.0, "vl_patrim_liq": 10.0,
+                         "captc_dia": 0.0, "resg_dia": 0.0, "nr_cotst": 1.0}]}
+
+def test_consultas_no_laco_nao_tocam_no_arquivo(tmp_path):
+    caminho = tmp_path / "database.json"
+    caminho.write_text(json.dumps({"11.111.111/0001-11": FUNDO}), encoding="utf-8")
+    # Intervalo zero: toda consulta encontraria uma verificação pendente
+    fundos = FundStore(str(caminho), intervalo_verificacao=0)
+    threads = []
+    original = fundos._assinatura_arquivo
+
+    def assinatura():
+        threads.append(threading.get_ident())
+        return original()
+    fundos._assinatura_arquivo = assinatura
+
+    async def consultar():
+        store = StoreAssincrono(fundos, ExecutorLimitado(2, 8))
+        await store.atualizar(forcar=True)
+        laco = threading.get_ident()
+        # Uma verificação em andamento e, em paralelo, consultas que rodam no laço
+        verificacao = asyncio.ensure_future(store.atualizar())
+        await asyncio.sleep(0)
+        for _ in range(20):
+            assert (await store.ranking("pl", 10))[0]["name"] == "FUNDO A"
+            assert len(await store.pesquisar("fundo")) == 1
+            assert (await store.pagina())[0]
+        await verificacao
+        # E sem verificação em andamento: a consulta agenda uma e não repete no laço
+        for _ in range(5):
+            assert (await store.ranking("pl", 10))[0]["name"] == "FUNDO A"
+        return laco
+
+    laco = asyncio.run(consultar())
+    assert threads and laco not in threads
@@ -0,0 +1,131 @@
+"""
+Base da API em SQLite (embutido, da biblioteca padrão), com tabelas indexadas.
+
+Tabelas (uma por histórico do fundo normalizado, com os mesmos campos):
+
+    fundos(chave, cnpj, name, tipo)
+    balances(chave, data, plano_conta, codigo_conta, saldo)
+    applications(chave, data, tipo_aplic, tipo_ativo, emissor_ligado, ...)
+    patrimonio(chave, data, vl_patrim_liq)
+    daily_info(chave, data, vl_total, vl_quota, vl_patrim_liq, ...)
+    indicadores(chave, retorno_dia, ..., pl)   métricas do ranking da API
+
+`chave` é o CNPJ só com dígitos (o mesmo usado pela API) e os históricos são
+indexados por (chave, data). Índices extras atendem às consultas entre fundos:
+PL por data, contas do balancete e códigos ISIN/SELIC. As linhas de cada fundo
+são gravadas na ordem do fundo normalizado (rowid crescente).
+
+Os indicadores do ranking são calculados aqui, com o mesmo código da API
+(api/indicadores.py), para que a API não precise ler o histórico diário de
+todos os fundos ao abrir o banco.
+
+Uso:
+    python utils/monta_base.py --destino api/database.sqlite
+    CVM_DATABASE=api/database.sqlite uvicorn main:app
+"""
+
+import os
+import re
+import sqlite3
+import sys
+from typing import Iterable, Tuple
+from utils.converte import CAMPOS, CNPJS_POR_LOTE
+
+pasta_api = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+# Histórico -> campos, na ordem do fundo normalizado
+HISTORICOS = {chave: [campo for campo, _, _ in campos] for chave, campos in CAMPOS.values()}
+
+_TIPOS = {"numero": "REAL", "sim_nao": "INTEGER"}
+
+INDICES = [
+    "CREATE UNIQUE INDEX fundos_cnpj ON fundos(cnpj)",
+    "CREATE INDEX fundos_tipo ON fundos(tipo)",
+    "CREATE INDEX balances_chave_data ON balances(chave, data)",
+    "CREATE INDEX balances_conta_data ON balances(codigo_conta, data)",
+    "CREATE INDEX applications_chave_data ON applications(chave, data)",
+    "CREATE INDEX applications_isin ON applications(isin, data)",
+    "CREATE INDEX applications_selic ON applications(selic, data)",
+    "CREATE INDEX patrimonio_chave_data ON patrimonio(chave, data)",
+    "CREATE INDEX daily_info_chave_data ON daily_info(chave, data)",
+    "CREATE INDEX daily_info_data_pl ON daily_info(data, vl_patrim_liq)",
+]
+
+def _modulos_api():
+    """Importa sob demanda os módulos de api/ que calculam os indicadores do ranking."""
+    if pasta_api not in sys.path:
+        sys.path.append(pasta_api)
+    from indicadores import METRICAS_RANKING, calcular_indicadores
+    from series import SerieTemporal
+    return METRICAS_RANKING, calcular_indicadores, SerieTemporal
+
+def _indicadores(fundo: dict) -> dict:
+    """Indicadores do fundo normalizado, como a API os calcula ao carregar a base."""
+    _, calcular_indicadores, SerieTemporal = _modulos_api()
+    # Dicionários de strings próprios do fundo: só as colunas numéricas entram no cálculo
+    dicionarios = {}
+    try:
+        series = {atributo: SerieTemporal(atributo, fundo.get(atributo) or [], dicionarios)
+                  for atributo in ("daily_info", "patrimonio")}
+    except Exception as e:
+        print(f"Erro ao calcular indicadores de {fundo['fund'].get('cnpj')}: {e}")
+        series = {atributo: SerieTemporal(atributo, [], dicionarios) for atributo in ("daily_info", "patrimonio")}
+    return calcular_indicadores(series)
+
+def _criar_tabelas(conexao):
+    conexao.execute("CREATE TABLE fundos (chave TEXT PRIMARY KEY, cnpj TEXT NOT NULL, name TEXT, tipo TEXT)")
+    for chave, campos in CAMPOS.values():
+        colunas = ", ".join(f"{campo} {_TIPOS.get(conversao, 'TEXT')}" for campo, _, conversao in campos)
+        conexao.execute(f"CREATE TABLE {chave} (chave TEXT NOT NULL, {colunas})")
+    metricas = ", ".join(f"{metrica} REAL" for metrica in _modulos_api()[0])
+    conexao.execute(f"CREATE TABLE indicadores (chave TEXT PRIMARY KEY, {metricas})")
+
+def gravar_base_sql(fundos: Iterable[Tuple[str, dict]], destino, fundos_por_commit: int = CNPJS_POR_LOTE) -> int:
+    """
+    Grava (cnpj, fundo normalizado) num banco SQLite novo, um fundo por vez, com um
+    commit a cada `fundos_por_commit` fundos (uma faixa de monta_base.py).
+    Os índices são criados depois da carga e o arquivo só substitui o destino ao final.
+    """
+    destino = os.fspath(destino)
+    tmp_path = destino + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    inserts = {chave: f"INSERT INTO {chave} VALUES ({', '.join('?' * (len(campos) + 1))})"
+               for chave, campos in HISTORICOS.items()}
+    metricas = _modulos_api()[0]
+    insert_indicadores = f"INSERT INTO indicadores VALUES ({', '.join('?' * (len(metricas) + 1))})"
+    vistos = set()
+    try:
+        conexao = sqlite3.connect(tmp_path)
+        try:
+            # Arquivo temporário: sem journal, a carga em transações de uma faixa de fundos
+            conexao.execute("PRAGMA journal_mode = OFF")
+            conexao.execute("PRAGMA synchronous = OFF")
+            _criar_tabelas(conexao)
+            for cnpj, fundo in fundos:
+                chave = re.sub(r"\D", "", cnpj)
+                if chave in vistos:
+                    continue
+                vistos.add(chave)
+                info = fundo["fund"]
+                conexao.execute("INSERT INTO fundos VALUES (?, ?, ?, ?)",
+                                (chave, info["cnpj"], info.get("name"), info.get("tipo")))
+                for historico, campos in HISTORICOS.items():
+                    conexao.executemany(inserts[historico],
+                                        ((chave, *(r.get(c) for c in campos)) for r in fundo.get(historico) or []))
+                indicadores = _indicadores(fundo)
+                conexao.execute(insert_indicadores, (chave, *(indicadores.get(m) for m in metricas)))
+                if len(vistos) % fundos_por_commit == 0:
+                    conexao.commit()
+            for indice in INDICES:
+                conexao.execute(indice)
+            conexao.execute("ANALYZE")
+            conexao.commit()
+        finally:
+            conexao.close()
+        os.replace(tmp_path, destino)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(vistos)
@@ -1,7 +1,26 @@
+import argparse
 import json
+import os
+import sys
 from datetime import datetime
 from pathlib import Path
 import re
+import numpy as np
+import pandas as pd
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from utils.grava_json import gravar_json_por_chave, ler_json_por_chave
+
+# Colunas lidas de cada tipo do armazenamento Parquet (apenas as usadas em normalize_json)
+COLUNAS_PARQUET = {
+    'balancete': ['DT_COMPTC', 'PLANO_CONTA_BALCTE', 'CD_CONTA_BALCTE', 'VL_SALDO_BALCTE'],
+    'cda_blc': ['DENOM_SOCIAL', 'TP_FUNDO_CLASSE', 'DT_COMPTC', 'TP_APLIC', 'TP_ATIVO', 'EMISSOR_LIGADO',
+                'TP_NEGOC', 'QT_POS_FINAL', 'VL_MERC_POS_FINAL', 'VL_CUSTO_POS_FINAL', 'CD_ISIN', 'CD_SELIC',
+                'DT_EMISSAO', 'DT_VENC'],
+    'cda_pl': ['DT_COMPTC', 'VL_PATRIM_LIQ'],
+    'inf_diario': ['DT_COMPTC', 'VL_TOTAL', 'VL_QUOTA', 'VL_PATRIM_LIQ', 'CAPTC_DIA', 'RESG_DIA', 'NR_COTST'],
+}
 
 # Função para converter valores numéricos
 def to_float(value):
@@ -120,26 +139,252 @@ def normalize_json(original_json):
             }
     return funds_dict
 
+# ---------------- NORMALIZAÇÃO VETORIZADA ----------------
+# Mesmo resultado de normalize_json, convertendo colunas inteiras de uma vez
+# (por tipo de arquivo) em vez de chamar to_float/to_date campo a campo.
+
+NULOS = ["NaN", "", "nan"]
+
+# CNPJs lidos por vez do armazenamento Parquet na gravação fundo a fundo
+CNPJS_POR_LOTE = 2000
+
+# Arquivos usados na normalização de cada tipo (o grupo captura o período AAAAMM)
+ARQUIVOS_NORMALIZADOS = {
+    'balancete': re.compile(r'balancete_fi_(\d{6})\.csv'),
+    'cda_blc': re.compile(r'cda_fi_BLC_1_(\d{6})\.csv'),
+    'cda_pl': re.compile(r'cda_fi_PL_(\d{6})\.csv'),
+    'inf_diario': re.compile(r'inf_diario_fi_(\d{6})\.csv'),
+}
+
+# Tipo de arquivo -> (lista no fundo normalizado, [(campo, coluna de origem, conversão)])
+CAMPOS = {
+    'balancete': ('balances', [
+        ("data", "DT_COMPTC", "data"),
+        ("plano_conta", "PLANO_CONTA_BALCTE", "texto"),
+        ("codigo_conta", "CD_CONTA_BALCTE", "texto"),
+        ("saldo", "VL_SALDO_BALCTE", "numero"),
+    ]),
+    'cda_blc': ('applications', [
+        ("data", "DT_COMPTC", "data"),
+        ("tipo_aplic", "TP_APLIC", "texto"),
+        ("tipo_ativo", "TP_ATIVO", "texto"),
+        ("emissor_ligado", "EMISSOR_LIGADO", "sim_nao"),
+        ("tipo_negoc", "TP_NEGOC", "texto"),
+        ("quantidade", "QT_POS_FINAL", "numero"),
+        ("valor_mercado", "VL_MERC_POS_FINAL", "numero"),
+        ("custo", "VL_CUSTO_POS_FINAL", "numero"),
+        ("isin", "CD_ISIN", "texto"),
+        ("selic", "CD_SELIC", "texto"),
+        ("emissao", "DT_EMISSAO", "data"),
+        ("vencimento", "DT_VENC", "data"),
+    ]),
+    'cda_pl': ('patrimonio', [
+        ("data", "DT_COMPTC", "data"),
+        ("vl_patrim_liq", "VL_PATRIM_LIQ", "numero"),
+    ]),
+    'inf_diario': ('daily_info', [
+        ("data", "DT_COMPTC", "data"),
+        ("vl_total", "VL_TOTAL", "numero"),
+        ("vl_quota", "VL_QUOTA", "numero"),
+        ("vl_patrim_liq", "VL_PATRIM_LIQ", "numero"),
+        ("captc_dia", "CAPTC_DIA", "numero"),
+        ("resg_dia", "RESG_DIA", "numero"),
+        ("nr_cotst", "NR_COTST", "numero"),
+    ]),
+}
+
+def _como_python(serie):
+    """Série de objetos Python, com None no lugar de valores ausentes."""
+    serie = serie.astype(object)
+    return serie.where(serie.notna(), None)
+
+def converter_coluna(df, coluna, conversao):
+    """Aplica a conversão de normalize_json a uma coluna inteira."""
+    if coluna not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    serie = df[coluna]
+    if conversao == "texto":
+        return _como_python(serie)
+    valida = serie.notna() & ~serie.isin(NULOS)
+    if conversao == "numero":
+        valores = serie.where(valida)
+        try:
+            # astype converte cada texto com float(), como to_float (pd.to_numeric usa outro
+            # parser, que pode diferir no último dígito)
+            numeros = valores.astype("float64")
+        except (TypeError, ValueError):
+            # Há valores malformados: converte um a um
+            numeros = valores.map(to_float).astype("float64")
+        return _como_python(numeros)
+    if conversao == "data":
+        datas = pd.to_datetime(serie.where(valida), format="%Y-%m-%d", errors="coerce")
+        return _como_python(datas.dt.strftime("%Y-%m-%d"))
+    if conversao == "sim_nao":
+        # "NaN"/ausente -> None, senão True se "S"
+        sim = (serie == "S").astype(object)
+        return sim.where(serie.notna() & (serie != "NaN"), None)
+    raise ValueError(f"Conversão desconhecida: {conversao}")
+
+def tabelas_do_json(original_json):
+    """Converte o formato de informacoes_cnpj.json em um DataFrame por tipo (com colunas CNPJ e PERIODO)."""
+    tabelas = {}
+    for tipo, padrao in ARQUIVOS_NORMALIZADOS.items():
+        registros, cnpjs, periodos = [], [], []
+        for cnpj, data_dict in original_json.items():
+            for arquivo, linhas in data_dict.items():
+                match = padrao.fullmatch(arquivo)
+                if match:
+                    registros.extend(linhas)
+                    cnpjs.extend([cnpj] * len(linhas))
+                    periodos.extend([match.group(1)] * len(linhas))
+        df = pd.DataFrame.from_records(registros) if registros else pd.DataFrame()
+        df["CNPJ"] = cnpjs
+        df["PERIODO"] = periodos
+        tabelas[tipo] = df
+    return tabelas
+
+def tabelas_do_parquet(pasta, faixa_cnpj=None):
+    """
+    Lê do armazenamento Parquet um DataFrame por tipo, só com as colunas usadas na
+    normalização. `faixa_cnpj` (primeiro, último) limita a leitura a uma faixa de CNPJs.
+    """
+    from utils import parquet_store
+    tabelas = {}
+    for tipo in parquet_store.tipos_disponiveis(pasta):
+        df = parquet_store.ler_tipo(pasta, tipo, COLUNAS_PARQUET.get(tipo), faixa_cnpj=faixa_cnpj)
+        df = df[df[parquet_store.COLUNA_ARQUIVO].str.fullmatch(ARQUIVOS_NORMALIZADOS[tipo].pattern)]
+        # Textos vazios já estão gravados como "NaN"; nulos são colunas ausentes no arquivo de
+        # origem e ficam None, como a chave ausente em informacoes_cnpj.json
+        df = df.rename(columns={parquet_store.COLUNA_CNPJ: "CNPJ", "periodo": "PERIODO"})
+        tabelas[tipo] = df.reset_index(drop=True)
+    return tabelas
+
+def _limites_por_cnpj(cnpjs):
+    """{cnpj: (início, fim)} das linhas de cada CNPJ numa coluna já ordenada por CNPJ."""
+    if len(cnpjs) == 0:
+        return {}
+    inicios = np.concatenate(([0], np.flatnonzero(cnpjs[1:] != cnpjs[:-1]) + 1, [len(cnpjs)]))
+    return {cnpjs[i]: (i, j) for i, j in zip(inicios[:-1], inicios[1:])}
+
+def iterar_fundos(tabelas, ordem_cnpjs=None):
+    """
+    Versão vetorizada de normalize_json, fundo a fundo. Recebe um DataFrame por
+    tipo de arquivo (com colunas CNPJ e PERIODO) e gera (cnpj, fundo) na ordem de
+    `ordem_cnpjs` (ou dos CNPJs ordenados). As colunas são convertidas de uma vez,
+    mas os dicts dos registros só são montados para o fundo que está sendo gerado.
+    """
+    listas = {}
+    nomes = {}
+    for tipo, (chave, campos) in CAMPOS.items():
+        df = tabelas.get(tipo)
+        if df is None or df.empty:
+            listas[chave] = ([], [], {})
+            continue
+        # Ordem de normalize_json: períodos crescentes e, dentro do período, a ordem do arquivo
+        df = df.reset_index(drop=True)
+        df["_ORDEM"] = np.arange(len(df))
+        df = df.sort_values(["CNPJ", "PERIODO", "_ORDEM"], kind="stable")
+        colunas = [converter_coluna(df, coluna, conversao).tolist() for _, coluna, conversao in campos]
+        nomes_campos = [campo for campo, _, _ in campos]
+        listas[chave] = (nomes_campos, colunas, _limites_por_cnpj(df["CNPJ"].to_numpy()))
+        if tipo == "cda_blc":
+            # Nome e tipo: primeiro valor presente nas aplicações, na mesma ordem
+            primeiros = df.reindex(columns=["CNPJ", "DENOM_SOCIAL", "TP_FUNDO_CLASSE"]).groupby("CNPJ", sort=False).first()
+            nomes = dict(zip(primeiros.index, zip(_como_python(primeiros["DENOM_SOCIAL"]).tolist(),
+                                                  _como_python(primeiros["TP_FUNDO_CLASSE"]).tolist())))
+
+    if ordem_cnpjs is None:
+        ordem_cnpjs = sorted(set().union(*(limites.keys() for _, _, limites in listas.values())))
+
+    for cnpj in ordem_cnpjs:
+        name, tipo = nomes.get(cnpj, (None, None))
+        if name is None or tipo is None:
+            continue
+        fundo = {"fund": {"cnpj": cnpj, "name": name, "tipo": tipo}}
+        for chave, (nomes_campos, colunas, limites) in listas.items():
+            inicio, fim = limites.get(cnpj, (0, 0))
+            fundo[chave] = [dict(zip(nomes_campos, linha)) for linha in zip(*(c[inicio:fim] for c in colunas))]
+        yield cnpj, fundo
+
+def normalize_dataframes(tabelas, ordem_cnpjs=None):
+    """Versão vetorizada de normalize_json: o dicionário completo de fundos (ver iterar_fundos)."""
+    return dict(iterar_fundos(tabelas, ordem_cnpjs))
+
+def fundos_do_parquet(pasta, cnpjs=None, cnpjs_por_lote=CNPJS_POR_LOTE):
+    """
+    Gera (cnpj, fundo) a partir do armazenamento Parquet, em ordem de CNPJ, lendo
+    um lote de CNPJs por vez: a memória usada é a de um lote, não a da base inteira.
+    """
+    from utils import parquet_store
+    if cnpjs is None:
+        cnpjs = parquet_store.cnpjs_disponiveis(pasta)
+    for inicio in range(0, len(cnpjs), cnpjs_por_lote):
+        lote = cnpjs[inicio:inicio + cnpjs_por_lote]
+        # Os dados estão ordenados por CNPJ: uma faixa contígua lê só os row groups dela
+        yield from iterar_fundos(tabelas_do_parquet(pasta, faixa_cnpj=(lote[0], lote[-1])))
+
+def fundos_do_json(pares, cnpjs_por_lote=CNPJS_POR_LOTE):
+    """
+    Gera (cnpj, fundo) a partir dos pares (cnpj, arquivos) de informacoes_cnpj.json,
+    como os de grava_json.ler_json_por_chave, normalizando um lote de CNPJs por vez:
+    como no Parquet, a memória usada é a de um lote, não a do arquivo inteiro.
+    """
+    lote = {}
+    for cnpj, dados in pares:
+        lote[cnpj] = dados
+        if len(lote) >= cnpjs_por_lote:
+            yield from iterar_fundos(tabelas_do_json(lote), ordem_cnpjs=list(lote))
+            lote = {}
+    if lote:
+        yield from iterar_fundos(tabelas_do_json(lote), ordem_cnpjs=list(lote))
+
+def normalize_json_vetorizado(original_json):
+    """Mesma entrada e saída de normalize_json, usando a normalização vetorizada."""
+    if not original_json:
+        print('Nenhum dado de CNPJ encontrado no JSON. Verifique os arquivos de entrada.')
+        return []
+    return normalize_dataframes(tabelas_do_json(original_json), ordem_cnpjs=list(original_json))
+
 # ---------------- MAIN ----------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normaliza os dados agrupados por CNPJ.")
+    parser.add_argument('--parquet', metavar='PASTA',
+                        help='Lê do armazenamento Parquet em vez de informacoes_cnpj.json')
+    parser.add_argument('--indent', type=int, default=None,
+                        help='Indentação do JSON gerado (padrão: compacto)')
+    args = parser.parse_args()
+
     # Caminho do JSON original
     input_file = Path("informacoes_cnpj.json")
     output_file = Path("normalized.json")
 
-    print(f"Lendo dados de {input_file}...")
-    # Lê o JSON original
-    with open(input_file, "r", encoding="utf-8") as f:
-        original_data = json.load(f)
+    if args.parquet:
+        from utils import parquet_store
+        print(f"Lendo dados do armazenamento Parquet em {args.parquet}...")
+        cnpjs = parquet_store.cnpjs_disponiveis(args.parquet)
+        total_cnpjs = len(cnpjs)
+        # Lotes de CNPJs lidos do Parquet e gravados fundo a fundo
+        fundos = fundos_do_parquet(args.parquet, cnpjs)
+        print(f"Encontrados {total_cnpjs} CNPJs para processar...")
+    else:
+        print(f"Lendo dados de {input_file}...")
+        # Lotes de CNPJs lidos do JSON original em streaming, sem carregá-lo inteiro;
+        # o total de CNPJs só é conhecido ao final da leitura
+        total_cnpjs = 0
 
-    print(f"Encontrados {len(original_data)} CNPJs para processar...")
-    
-    # Normaliza todos os CNPJs
-    normalized_dict = normalize_json(original_data)
-
-    print(f"Processados {len(normalized_dict)} fundos com sucesso (fundos com name e tipo válidos).")
-    print(f"Filtrados: {len(original_data) - len(normalized_dict)} fundos com dados incompletos.")
-    # Salva o novo JSON
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(normalized_dict, f, indent=2, ensure_ascii=False)
+        def cnpjs_lidos():
+            global total_cnpjs
+            for par in ler_json_por_chave(input_file):
+                total_cnpjs += 1
+                yield par
+        fundos = fundos_do_json(cnpjs_lidos())
+
+    # Normaliza (conversão vetorizada por tipo de arquivo) e grava cada fundo assim que fica pronto
+    total_fundos = gravar_json_por_chave(fundos, output_file, indent=args.indent)
+    if not args.parquet:
+        print(f"Encontrados {total_cnpjs} CNPJs em {input_file}.")
+
+    print(f"Processados {total_fundos} fundos com sucesso (fundos com name e tipo válidos).")
+    print(f"Filtrados: {total_cnpjs - total_fundos} fundos com dados incompletos.")
     print(f"Nova lista de fundos salva em {output_file}")
-    print(f"Total de fundos válidos processados: {len(normalized_dict)}")
+    print(f"Total de fundos válidos processados: {total_fundos}")
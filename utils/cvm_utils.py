@@ -1,34 +1,240 @@
+import hashlib
+import json
 import os
+import re
+import threading
+import time
 import requests
-from typing import Optional
+from requests.adapters import HTTPAdapter
+from typing import Dict, NamedTuple, Optional
 
-def baixar_arquivo(url: str, nome_arquivo: str, pasta_temp: Optional[str] = None, timeout: int = 60) -> str:
+# ------------------------------
+# SESSÃO HTTP COMPARTILHADA
+# ------------------------------
+_sessao: Optional[requests.Session] = None
+_sessao_lock = threading.Lock()
+
+def criar_sessao(pool_maxsize: int = 10) -> requests.Session:
     """
-    Baixa um arquivo de uma URL e salva em uma pasta temporária.
+    Cria uma sessão HTTP com pool de conexões (keep-alive) reutilizável entre threads.
     Args:
-        url (str): URL do arquivo para download.
-        nome_arquivo (str): Nome do arquivo para salvar.
-        pasta_temp (str, opcional): Caminho da pasta temporária. Se None, usa 'temp' ao lado do arquivo chamador.
-        timeout (int): Tempo limite para download em segundos.
+        pool_maxsize (int): Número máximo de conexões mantidas por host.
     Returns:
-        str: Caminho completo do arquivo salvo.
+        requests.Session: Sessão configurada.
+    """
+    sessao = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+    sessao.mount("https://", adapter)
+    sessao.mount("http://", adapter)
+    return sessao
+
+def get_sessao() -> requests.Session:
+    """Retorna a sessão HTTP padrão do processo, criando-a na primeira chamada."""
+    global _sessao
+    if _sessao is None:
+        with _sessao_lock:
+            if _sessao is None:
+                _sessao = criar_sessao()
+    return _sessao
+
+# ------------------------------
+# MANIFESTO DOS ARQUIVOS BAIXADOS
+# ------------------------------
+class Manifesto:
+    """
+    Registro persistente (manifest.json na pasta temporária) dos arquivos baixados.
+
+    Para cada arquivo guarda URL, ETag, Last-Modified, tamanho e SHA-256, usados
+    para requisições condicionais e para retomar downloads interrompidos.
+    """
+
+    def __init__(self, pasta: str):
+        self.caminho = os.path.join(pasta, "manifest.json")
+        self._lock = threading.Lock()
+        self._entradas: Dict[str, dict] = {}
+        if os.path.exists(self.caminho):
+            try:
+                with open(self.caminho, "r", encoding="utf-8") as f:
+                    self._entradas = json.load(f)
+            except Exception as e:
+                print(f"Manifesto inválido em {self.caminho}, ignorando: {e}")
+
+    def get(self, nome_arquivo: str) -> dict:
+        with self._lock:
+            return dict(self._entradas.get(nome_arquivo, {}))
+
+    def atualizar(self, nome_arquivo: str, **campos):
+        with self._lock:
+            self._entradas.setdefault(nome_arquivo, {}).update(campos)
+            tmp_path = self.caminho + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entradas, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.caminho)
+
+_manifestos: Dict[str, Manifesto] = {}
+_manifestos_lock = threading.Lock()
+
+def get_manifesto(pasta: str) -> Manifesto:
+    """Retorna o manifesto da pasta, compartilhado entre as threads do processo."""
+    pasta = os.path.abspath(pasta)
+    with _manifestos_lock:
+        if pasta not in _manifestos:
+            _manifestos[pasta] = Manifesto(pasta)
+        return _manifestos[pasta]
+
+def _sha256_arquivo(caminho: str, chunk_size: int):
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(chunk_size), b""):
+            sha.update(bloco)
+    return sha
+
+def _inicio_do_intervalo(content_range: Optional[str]) -> Optional[int]:
+    """Primeiro byte de um Content-Range 'bytes início-fim/total', ou None se inválido."""
+    match = re.fullmatch(r"\s*bytes\s+(\d+)-\d+/(?:\d+|\*)\s*", content_range or "")
+    return int(match.group(1)) if match else None
+
+# ------------------------------
+# DOWNLOAD
+# ------------------------------
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+class Transferencia(NamedTuple):
+    caminho: str
+    bytes_transferidos: int
+    status: str  # 'baixado', 'retomado' ou 'nao_modificado'
+
+def transferir_arquivo(url: str, nome_arquivo: str, pasta_temp: Optional[str] = None, timeout: int = 60,
+                       sessao: Optional[requests.Session] = None, chunk_size: int = CHUNK_SIZE) -> Transferencia:
+    """
+    Baixa um arquivo transferindo apenas o que falta ou mudou.
+
+    - Se o arquivo já existe e confere com o manifesto (URL, tamanho e
+      SHA-256), envia If-None-Match / If-Modified-Since e não baixa nada
+      quando o servidor responde 304.
+    - Se existe um `.part` de uma tentativa anterior, pede só os bytes
+      restantes (Range + If-Range), sem cabeçalhos condicionais; se o arquivo
+      mudou no servidor, ou a resposta 206 não começa no fim do `.part`, recomeça.
+    - O conteúdo é gravado em blocos de `chunk_size` bytes e o `.part` só é
+      renomeado para o nome final quando o download termina.
+    Returns:
+        Transferencia: caminho final, bytes transferidos e status.
     Raises:
-        Exception: Se o download falhar.
+        Exception: Se o download falhar. O `.part` é mantido para retomada.
     """
     if pasta_temp is None:
         pasta_temp = os.path.join(os.path.dirname(__file__), "temp")
     os.makedirs(pasta_temp, exist_ok=True)
     zip_path = os.path.join(pasta_temp, nome_arquivo)
+    part_path = zip_path + ".part"
+    manifesto = get_manifesto(pasta_temp)
+    entrada = manifesto.get(nome_arquivo)
+
+    def descartar_parcial():
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        manifesto.atualizar(nome_arquivo, parcial=None)
+
+    def recomecar():
+        descartar_parcial()
+        return transferir_arquivo(url, nome_arquivo, pasta_temp, timeout, sessao, chunk_size)
+
+    headers = {}
+    parcial = entrada.get("parcial") or {}
+    offset = 0
+    if os.path.exists(part_path) and parcial.get("url") == url:
+        validador = parcial.get("etag") or parcial.get("last_modified")
+        if validador:
+            offset = os.path.getsize(part_path)
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validador
+
+    completo = (os.path.exists(zip_path) and entrada.get("url") == url
+                and entrada.get("tamanho") == os.path.getsize(zip_path)
+                and entrada.get("sha256") == _sha256_arquivo(zip_path, chunk_size).hexdigest())
+    # Com um .part a retomar a requisição é de Range; um 304 não diria nada sobre ele
+    if completo and "Range" not in headers:
+        if entrada.get("etag"):
+            headers["If-None-Match"] = entrada["etag"]
+        if entrada.get("last_modified"):
+            headers["If-Modified-Since"] = entrada["last_modified"]
+
+    sessao = sessao or get_sessao()
+    inicio = time.monotonic()
+    total = 0
+    with sessao.get(url, timeout=timeout, stream=True, headers=headers) as download:
+        if download.status_code == 304 and completo:
+            if os.path.exists(part_path) or parcial:
+                descartar_parcial()
+            print(f"Arquivo não modificado: {zip_path}")
+            return Transferencia(zip_path, 0, "nao_modificado")
+        if download.status_code == 416:
+            # O .part não corresponde mais ao arquivo remoto
+            download.close()
+            return recomecar()
+        if download.status_code == 206 and _inicio_do_intervalo(download.headers.get("Content-Range")) != offset:
+            # O servidor devolveu outro trecho: não dá para emendar no .part
+            download.close()
+            return recomecar()
+        if download.status_code not in (200, 206):
+            raise Exception(f"Arquivo não encontrado: {url}")
+
+        retomado = download.status_code == 206 and offset > 0
+        if retomado:
+            sha = _sha256_arquivo(part_path, chunk_size)
+            modo = "ab"
+        else:
+            sha = hashlib.sha256()
+            offset = 0
+            modo = "wb"
+
+        etag = download.headers.get("ETag")
+        last_modified = download.headers.get("Last-Modified")
+        esperado = download.headers.get("Content-Length")
+        if esperado is None or download.headers.get("Content-Encoding"):
+            esperado = None  # tamanho final desconhecido (ou comprimido no transporte)
+        else:
+            esperado = offset + int(esperado)
+        manifesto.atualizar(nome_arquivo, parcial={"url": url, "etag": etag, "last_modified": last_modified})
+
+        with open(part_path, modo) as arquivo:
+            for bloco in download.iter_content(chunk_size=chunk_size):
+                arquivo.write(bloco)
+                sha.update(bloco)
+                total += len(bloco)
+
+    tamanho = offset + total
+    if esperado is not None and tamanho != esperado:
+        raise Exception(f"Download incompleto de {url}: {tamanho} de {esperado} bytes")
+    os.replace(part_path, zip_path)
+    manifesto.atualizar(nome_arquivo, url=url, etag=etag, last_modified=last_modified,
+                        tamanho=tamanho, sha256=sha.hexdigest(), parcial=None)
 
-    download = requests.get(url, timeout=timeout)
-    if download.status_code != 200:
-        raise Exception(f"Arquivo não encontrado: {url}")
+    duracao = max(time.monotonic() - inicio, 1e-6)
+    status = "retomado" if retomado else "baixado"
+    print(f"Arquivo {status}: {zip_path} ({total / 1e6:.1f} MB, {total / duracao / 1e6:.2f} MB/s)")
+    return Transferencia(zip_path, total, status)
 
-    with open(zip_path, "wb") as arquivo:
-        arquivo.write(download.content)
+def baixar_arquivo(url: str, nome_arquivo: str, pasta_temp: Optional[str] = None, timeout: int = 60,
+                   sessao: Optional[requests.Session] = None, chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    Baixa um arquivo de uma URL e salva em uma pasta temporária.
 
-    print(f"Arquivo baixado: {zip_path}")
-    return zip_path
+    Arquivos já baixados e inalterados no servidor não são transferidos de
+    novo, e downloads interrompidos são retomados (ver `transferir_arquivo`).
+    Args:
+        url (str): URL do arquivo para download.
+        nome_arquivo (str): Nome do arquivo para salvar.
+        pasta_temp (str, opcional): Caminho da pasta temporária. Se None, usa 'temp' ao lado do arquivo chamador.
+        timeout (int): Tempo limite para download em segundos.
+        sessao (requests.Session, opcional): Sessão HTTP a usar. Se None, usa a sessão compartilhada.
+        chunk_size (int): Tamanho de cada bloco lido da rede, em bytes.
+    Returns:
+        str: Caminho completo do arquivo salvo.
+    Raises:
+        Exception: Se o download falhar.
+    """
+    return transferir_arquivo(url, nome_arquivo, pasta_temp, timeout, sessao, chunk_size).caminho
 
 def gerar_lista_ano_mes(anos, meses):
     """
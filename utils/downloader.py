@@ -0,0 +1,119 @@
+"""
+Motor de downloads concorrentes dos conjuntos de dados da CVM.
+
+Recebe uma lista de jobs (conjunto de dados × período) e executa todos em um
+pool de threads que compartilha uma única sessão HTTP com pool de conexões,
+respeitando um limite de downloads simultâneos por host.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from utils.cvm_utils import criar_sessao, transferir_arquivo
+
+@dataclass
+class DownloadJob:
+    dataset: str
+    periodo: str
+    url: str
+    nome_arquivo: str
+
+@dataclass
+class DownloadResult:
+    job: DownloadJob
+    caminho: Optional[str] = None
+    erro: Optional[str] = None
+    duracao: float = 0.0
+    tamanho: int = 0  # bytes efetivamente transferidos
+    status: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.erro is None
+
+    @property
+    def throughput(self) -> float:
+        """Taxa de transferência em bytes por segundo."""
+        return self.tamanho / self.duracao if self.duracao > 0 else 0.0
+
+def montar_jobs(dataset: str, url_modelo: str, periodos: Iterable[str]) -> List[DownloadJob]:
+    """Gera um job por período AAAAMM a partir do modelo de URL do conjunto de dados."""
+    jobs = []
+    for periodo in periodos:
+        url = url_modelo.format(periodo=periodo)
+        jobs.append(DownloadJob(dataset, periodo, url, url.rsplit('/', 1)[-1]))
+    return jobs
+
+# ------------------------------
+# MOTOR DE DOWNLOADS
+# ------------------------------
+class DownloadEngine:
+    """Executa jobs de download em paralelo com sessão HTTP compartilhada."""
+
+    def __init__(self, workers: int = 4, max_por_host: Optional[int] = None,
+                 timeout: int = 60, pasta_temp: Optional[str] = None):
+        self.workers = max(1, workers)
+        self.max_por_host = max(1, max_por_host or self.workers)
+        self.timeout = timeout
+        self.pasta_temp = pasta_temp
+        self.sessao = criar_sessao(pool_maxsize=self.max_por_host)
+        self._semaforos: Dict[str, threading.Semaphore] = defaultdict(
+            lambda: threading.BoundedSemaphore(self.max_por_host))
+        self._semaforos_lock = threading.Lock()
+
+    def _semaforo(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self._semaforos_lock:
+            return self._semaforos[host]
+
+    def baixar(self, job: DownloadJob) -> DownloadResult:
+        """Baixa um único job, capturando o erro em vez de propagá-lo."""
+        inicio = time.monotonic()
+        with self._semaforo(job.url):
+            try:
+                transferencia = transferir_arquivo(job.url, job.nome_arquivo, self.pasta_temp,
+                                                   self.timeout, sessao=self.sessao)
+                return DownloadResult(job, caminho=transferencia.caminho, duracao=time.monotonic() - inicio,
+                                      tamanho=transferencia.bytes_transferidos, status=transferencia.status)
+            except Exception as e:
+                return DownloadResult(job, erro=str(e), duracao=time.monotonic() - inicio)
+
+    def executar(self, jobs: List[DownloadJob],
+                 callback: Optional[Callable[[DownloadResult], None]] = None) -> List[DownloadResult]:
+        """Executa todos os jobs e retorna os resultados na ordem de conclusão."""
+        resultados = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.baixar, job) for job in jobs]
+            for future in as_completed(futures):
+                resultado = future.result()
+                resultados.append(resultado)
+                if callback:
+                    callback(resultado)
+        return resultados
+
+    def fechar(self):
+        self.sessao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+def baixar_periodos(dataset: str, url_modelo: str, periodos: Iterable[str],
+                    engine: Optional[DownloadEngine] = None,
+                    callback: Optional[Callable[[DownloadResult], None]] = None) -> List[DownloadResult]:
+    """
+    Baixa os arquivos de um conjunto de dados para os períodos informados.
+    Se `engine` for None, usa um motor temporário com as configurações padrão.
+    """
+    jobs = montar_jobs(dataset, url_modelo, periodos)
+    if engine is not None:
+        return engine.executar(jobs, callback)
+    with DownloadEngine() as engine:
+        return engine.executar(jobs, callback)
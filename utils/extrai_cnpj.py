@@ -1,109 +1,313 @@
+import argparse
+import io
 import os
+import sys
+import numpy as np
 import pandas as pd
-import json
 import zipfile
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, NamedTuple, Optional
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from utils.grava_json import gravar_json_por_chave, ler_json_por_chave
+from utils.schemas import CsvSchema, schema_para
+from utils import parquet_store
+from utils.ingestao import LedgerIngestao, assinatura_membro
 
-# Descompacta arquivos ZIP da pasta temp
+# Lê os CSVs diretamente de dentro dos arquivos ZIP da pasta temp
 temp_dir = os.path.join(os.path.dirname(__file__), 'temp')
-data_dir = os.path.join(os.path.dirname(__file__), 'data')
-
-# Cria a pasta data se não existir
-if not os.path.exists(data_dir):
-    os.makedirs(data_dir)
-
-# Descompacta todos os arquivos ZIP da pasta temp para a pasta data
-if os.path.exists(temp_dir):
-    for arquivo in os.listdir(temp_dir):
-        if arquivo.endswith('.zip'):
-            caminho_zip = os.path.join(temp_dir, arquivo)
-            print(f'Descompactando {arquivo}...')
-            try:
-                with zipfile.ZipFile(caminho_zip, 'r') as zip_ref:
-                    zip_ref.extractall(data_dir)
-                print(f'{arquivo} descompactado com sucesso!')
-            except Exception as e:
-                print(f'Erro ao descompactar {arquivo}: {e}')
+json_path = 'informacoes_cnpj.json'
+ledger_json_path = 'informacoes_cnpj.ingestao.json'
 
+# Linhas lidas por vez de cada CSV. Limita o texto bruto decodificado de uma vez,
+# mas não o pico por arquivo: ordenar_por_cnpj junta os blocos para ordenar o
+# arquivo inteiro por CNPJ
+CHUNK_LINHAS = 200_000
 
-# Novo: Organiza todos os CNPJs encontrados nos arquivos CSV
+def listar_csvs_zip(pasta):
+    """Lista (caminho_zip, membro_csv, assinatura) de todos os CSVs dos ZIPs da pasta."""
+    membros = []
+    if not os.path.exists(pasta):
+        return membros
+    for arquivo in sorted(os.listdir(pasta)):
+        if not arquivo.endswith('.zip'):
+            continue
+        caminho_zip = os.path.join(pasta, arquivo)
+        try:
+            with zipfile.ZipFile(caminho_zip, 'r') as zip_ref:
+                for info in zip_ref.infolist():
+                    if info.filename.lower().endswith('.csv'):
+                        membros.append((caminho_zip, info.filename, assinatura_membro(info)))
+        except Exception as e:
+            print(f'Erro ao abrir {arquivo}: {e}')
+    return membros
 
-# Salva incrementalmente cada CNPJ encontrado
-resultados = {}
-json_path = 'informacoes_cnpj.json'
-if os.path.exists(json_path):
-    try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            resultados = json.load(f)
-    except Exception:
-        resultados = {}
+def ler_csv_zip(caminho_zip, membro, encoding, sep, chunksize=CHUNK_LINHAS):
+    """Lê um CSV de dentro do ZIP em blocos de `chunksize` linhas, sem extraí-lo."""
+    with zipfile.ZipFile(caminho_zip, 'r') as zip_ref:
+        with zip_ref.open(membro) as bruto:
+            texto = io.TextIOWrapper(bruto, encoding=encoding, newline='')
+            yield from pd.read_csv(texto, dtype=str, sep=sep, engine='python', chunksize=chunksize)
 
+def ler_csv_zip_schema(caminho_zip, membro, schema: CsvSchema, chunksize=CHUNK_LINHAS):
+    """Lê um CSV de layout conhecido com o engine C, carregando só as colunas do esquema."""
+    with zipfile.ZipFile(caminho_zip, 'r') as zip_ref:
+        with zip_ref.open(membro) as bruto:
+            yield from pd.read_csv(bruto, sep=schema.sep, encoding=schema.encoding, engine='c',
+                                   usecols=schema.usa_coluna, dtype=schema.dtypes, chunksize=chunksize)
 
-csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
+class ResultadoColunar(NamedTuple):
+    """
+    Registros de um arquivo em formato colunar, ordenados por CNPJ.
 
-def process_csv(nome_arquivo):
-    caminho_arquivo = os.path.join(data_dir, nome_arquivo)
-    df = None
-    for encoding in ['utf-8', 'latin1']:
-        for sep in [None, ';', ',']:
-            try:
-                df = pd.read_csv(caminho_arquivo, dtype=str, sep=sep, engine='python', encoding=encoding)
-                break
-            except Exception:
-                df = None
-        if df is not None:
-            break
-    if df is None:
-        return nome_arquivo, None
+    As linhas do CNPJ `cnpjs[i]` ocupam as posições `limites[i]:limites[i + 1]`
+    de cada array em `dados` (um por coluna, na ordem de `colunas`). Colunas
+    numéricas vão como arrays float64; as de texto, como códigos int32 em
+    `categorias[j]` (-1 = ausente). Entre processos isso é serializado como
+    blocos de memória, sem um objeto Python por célula; os dicts (com 'NaN'
+    nos ausentes) só são montados no processo principal, em `registros`.
+    """
+    colunas: List[str]
+    cnpjs: List[str]
+    limites: np.ndarray
+    dados: List[np.ndarray]
+    categorias: List[Optional[np.ndarray]]  # None nas colunas numéricas
+
+    def _valores(self, j: int) -> list:
+        """Coluna `j` como lista de valores Python, com 'NaN' nos ausentes."""
+        if self.categorias[j] is None:
+            coluna = self.dados[j]
+            valores = coluna.tolist()
+            if coluna.dtype.kind == 'f':
+                for i in np.flatnonzero(np.isnan(coluna)).tolist():
+                    valores[i] = 'NaN'
+            return valores
+        # 'NaN' na última posição: o código -1 cai nela
+        return np.append(self.categorias[j], 'NaN').astype(object)[self.dados[j]].tolist()
+
+    def registros(self):
+        """Gera (cnpj, lista de registros) no formato usado em informacoes_cnpj.json."""
+        colunas = [self._valores(j) for j in range(len(self.colunas))]
+        limites = self.limites.tolist()
+        for i, cnpj in enumerate(self.cnpjs):
+            inicio, fim = limites[i], limites[i + 1]
+            fatias = [coluna[inicio:fim] for coluna in colunas]
+            yield cnpj, [dict(zip(self.colunas, linha)) for linha in zip(*fatias)]
+
+def ordenar_por_cnpj(chunks, nome_arquivo, coluna_cnpj):
+    """
+    Junta os blocos de um arquivo ordenando as linhas por CNPJ.
+    `coluna_cnpj` recebe as colunas do primeiro bloco. Retorna (df, coluna) ou (None, None).
+    """
+    col_cnpj = None
+    blocos = []
+    for i, df in enumerate(chunks):
+        if i == 0:
+            col_cnpj = coluna_cnpj(df.columns)
+            tqdm.write(f'Arquivo {nome_arquivo}: Coluna CNPJ encontrada = {col_cnpj}')
+        if not col_cnpj:
+            return None, None
+        blocos.append(df[df[col_cnpj].notna()])
+    if not blocos:
+        return None, None
+
+    # Ordenação estável: mantém a ordem original das linhas dentro de cada CNPJ
+    df = pd.concat(blocos, ignore_index=True)
+    df = df.sort_values(col_cnpj, kind='stable', ignore_index=True)
+    if df.empty:
+        return None, None
+    return df, col_cnpj
+
+def para_colunar(df, col_cnpj):
+    """Converte um DataFrame ordenado por CNPJ em ResultadoColunar."""
+    chaves = df[col_cnpj].to_numpy()
+    # Posição da primeira linha de cada CNPJ
+    inicios = np.concatenate(([0], np.flatnonzero(chaves[1:] != chaves[:-1]) + 1))
+
+    dados, categorias = [], []
+    for col in df.columns:
+        serie = df[col]
+        if serie.dtype.kind in 'fiu':
+            dados.append(serie.to_numpy())
+            categorias.append(None)
+        else:
+            codigos, valores = pd.factorize(serie)
+            dados.append(codigos.astype(np.int32))
+            categorias.append(np.asarray(valores, dtype=object))
+    return ResultadoColunar(
+        colunas=list(df.columns),
+        cnpjs=chaves[inicios].tolist(),
+        limites=np.append(inicios, len(df)),
+        dados=dados,
+        categorias=categorias,
+    )
+
+def encontrar_coluna_cnpj(colunas):
     # Busca por colunas de CNPJ de forma mais flexível
     possiveis_colunas_cnpj = ['CNPJ_FUNDO_CLASSE', 'CNPJ_FUNDO', 'CNPJ', 'Cnpj_Fundo']
-    col_cnpj = None
     for col in possiveis_colunas_cnpj:
-        if col in df.columns:
-            col_cnpj = col
-            break
-    
+        if col in colunas:
+            return col
+
     # Se não encontrou, procura por qualquer coluna que contenha 'cnpj'
-    if col_cnpj is None:
-        for col in df.columns:
-            if 'cnpj' in col.lower():
-                col_cnpj = col
-                break
-    
-    tqdm.write(f'Arquivo {nome_arquivo}: Coluna CNPJ encontrada = {col_cnpj}')
-    cnpj_dict = {}
-    if col_cnpj:
-        df = df.fillna('NaN')
-        grupos = df.groupby(col_cnpj)
-        for cnpj, grupo in grupos:
-            cnpj_dict[cnpj] = grupo.to_dict(orient='records')
-        return nome_arquivo, cnpj_dict
-    return nome_arquivo, None
+    for col in colunas:
+        if 'cnpj' in col.lower():
+            return col
+    return None
+
+def process_csv(caminho_zip, membro, pasta_parquet=None):
+    """
+    Lê um CSV de dentro do ZIP e agrupa seus registros por CNPJ.
+    Arquivos de layout conhecido trazem só as colunas do esquema, com as
+    numéricas já como float (ver utils/schemas.py); os demais, todas as colunas
+    como texto. Se `pasta_parquet` for informada, arquivos de layout conhecido
+    também são gravados no armazenamento Parquet (ver utils/parquet_store.py).
+    """
+    nome_arquivo = os.path.basename(membro)
 
-num_workers = min(32, os.cpu_count() or 4)  # Usa até 32 threads
-with ThreadPoolExecutor(max_workers=num_workers) as executor:
-    futures = {executor.submit(process_csv, nome_arquivo): nome_arquivo for nome_arquivo in csv_files}
-    for future in tqdm(as_completed(futures), total=len(futures), desc=f'Processando arquivos CSV ({num_workers} threads)'):
-        nome_arquivo = futures[future]
+    # Layout conhecido: leitura direta com engine C e apenas as colunas usadas
+    schema = schema_para(nome_arquivo)
+    if schema is not None:
         try:
-            nome_arquivo, cnpj_dict = future.result()
-            if cnpj_dict:
-                for cnpj, registros in cnpj_dict.items():
-                    if cnpj not in resultados:
-                        resultados[cnpj] = {}
-                    resultados[cnpj][nome_arquivo] = registros
-                tqdm.write(f'{len(cnpj_dict)} CNPJs do arquivo {nome_arquivo} processados')
-            else:
-                tqdm.write(f'Não foi possível ler o arquivo {nome_arquivo}')
+            chunks = ler_csv_zip_schema(caminho_zip, membro, schema)
+            df, col_cnpj = ordenar_por_cnpj(chunks, nome_arquivo, schema.coluna_cnpj)
+            if df is None:
+                return nome_arquivo, None
+            if pasta_parquet:
+                parquet_store.gravar_arquivo(pasta_parquet, schema, nome_arquivo, df, col_cnpj)
+            return nome_arquivo, para_colunar(df, col_cnpj)
         except Exception as e:
-            tqdm.write(f'Erro ao processar {nome_arquivo}: {e}')
+            tqdm.write(f'Arquivo {nome_arquivo} fora do layout {schema.nome} ({e}), usando detecção automática')
+
+    # Cada combinação é tentada sobre o arquivo inteiro: um erro de decodificação
+    # no meio do stream descarta o parcial e tenta a próxima combinação
+    for encoding in ['utf-8', 'latin1']:
+        for sep in [None, ';', ',']:
+            try:
+                chunks = ler_csv_zip(caminho_zip, membro, encoding, sep)
+                df, col_cnpj = ordenar_por_cnpj(chunks, nome_arquivo, encontrar_coluna_cnpj)
+                return nome_arquivo, para_colunar(df, col_cnpj) if df is not None else None
+            except Exception:
+                continue
+    return nome_arquivo, None
+
+def mesclar_com_existente(existentes, novos, reprocessados):
+    """
+    Gera os pares de informacoes_cnpj.json com os arquivos reprocessados substituídos.
+    `existentes` são os (cnpj, arquivos, texto) do JSON atual, lidos em streaming;
+    `novos`, {cnpj: {arquivo: registros}} só dos arquivos reprocessados. Um CNPJ que
+    nenhum desses arquivos toca é copiado com o texto original, sem nova serialização.
+    """
+    for cnpj, arquivos, texto in existentes:
+        if cnpj not in novos and reprocessados.isdisjoint(arquivos):
+            yield cnpj, texto
+            continue
+        for nome_arquivo in reprocessados:
+            arquivos.pop(nome_arquivo, None)
+        arquivos.update(novos.pop(cnpj, {}))
+        if arquivos:
+            yield cnpj, arquivos
+    yield from novos.items()
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrupa por CNPJ os CSVs dos ZIPs da pasta temp.")
+    parser.add_argument('--parquet', metavar='PASTA',
+                        help='Também grava os dados em Parquet, particionados por tipo e período')
+    parser.add_argument('--sem-json', action='store_true',
+                        help='Não gera informacoes_cnpj.json (use com --parquet)')
+    parser.add_argument('--completo', action='store_true',
+                        help='Reprocessa todos os arquivos, ignorando o registro de ingestão')
+    parser.add_argument('--indent', type=int, default=None,
+                        help='Indentação de informacoes_cnpj.json (padrão: compacto)')
+    args = parser.parse_args()
+    if args.parquet:
+        parquet_store.exigir_pyarrow()
 
+    # Um registro de ingestão por armazenamento de destino
+    ledgers = []
+    if not args.sem_json:
+        ledger_json = LedgerIngestao(ledger_json_path)
+        if args.completo or not os.path.exists(json_path):
+            ledger_json.limpar()
+        ledgers.append(ledger_json)
+    if args.parquet:
+        # Arquivos iniciados por "_" são ignorados pela leitura do dataset
+        ledger_parquet = LedgerIngestao(os.path.join(args.parquet, '_ingestao.json'))
+        if args.completo:
+            ledger_parquet.limpar()
+        ledgers.append(ledger_parquet)
+
+    # Só os registros dos arquivos processados nesta execução ficam em memória; o JSON
+    # existente é lido em streaming na gravação (ver mesclar_com_existente)
+    novos = {}
+    reprocessados = set()
+    incremental = not args.sem_json and os.path.exists(json_path) and bool(ledger_json.entradas)
+
+    csv_membros = listar_csvs_zip(temp_dir)
+    pendentes = [(caminho_zip, membro, assinatura) for caminho_zip, membro, assinatura in csv_membros
+                 if any(l.pendente(os.path.basename(membro), assinatura) for l in ledgers)]
+    print(f'{len(pendentes)} de {len(csv_membros)} arquivos CSV novos ou alterados desde a última ingestão')
+    if not pendentes:
+        return
+
+    # Processos em vez de threads: parsing e agrupamento são limitados pelo GIL
+    num_workers = os.cpu_count() or 4
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(process_csv, caminho_zip, membro, args.parquet): (membro, assinatura)
+                   for caminho_zip, membro, assinatura in pendentes}
+        for future in tqdm(as_completed(futures), total=len(futures), desc=f'Processando arquivos CSV ({num_workers} processos)'):
+            membro, assinatura = futures[future]
+            nome_arquivo = os.path.basename(membro)
+            try:
+                nome_arquivo, resultado = future.result()
+                if not args.sem_json:
+                    # Substitui apenas o período deste arquivo em cada CNPJ
+                    reprocessados.add(nome_arquivo)
+                if resultado and args.sem_json:
+                    tqdm.write(f'{len(resultado.cnpjs)} CNPJs do arquivo {nome_arquivo} processados')
+                elif resultado:
+                    # Junta o resultado de cada arquivo assim que ele fica pronto
+                    for cnpj, registros in resultado.registros():
+                        if cnpj not in novos:
+                            novos[cnpj] = {}
+                        novos[cnpj][nome_arquivo] = registros
+                    tqdm.write(f'{len(resultado.cnpjs)} CNPJs do arquivo {nome_arquivo} processados')
+                else:
+                    tqdm.write(f'Não foi possível ler o arquivo {nome_arquivo}')
+                for ledger in ledgers:
+                    ledger.registrar(nome_arquivo, assinatura)
+            except Exception as e:
+                tqdm.write(f'Erro ao processar {nome_arquivo}: {e}')
+
+
+    if args.parquet:
+        ledger_parquet.salvar()
+        print(f'Armazenamento Parquet atualizado em {args.parquet}')
+    if args.sem_json:
+        print(f'Total de arquivos CSV processados: {len(pendentes)}')
+        return
+
+    # Salva o JSON apenas uma vez ao final, CNPJ a CNPJ (e só então o registro de ingestão).
+    # Por ser um arquivo único, uma atualização incremental ainda reescreve o arquivo
+    # inteiro, mas os CNPJs não afetados são copiados sem serializar de novo
+    cnpjs_atualizados = len(novos)
+    if incremental:
+        pares = mesclar_com_existente(ler_json_por_chave(json_path, com_texto=True), novos, reprocessados)
+        try:
+            total_cnpjs = gravar_json_por_chave(pares, json_path, indent=args.indent)
+        except ValueError as e:
+            # O arquivo anterior fica como estava e o registro de ingestão não é salvo
+            print(f'{json_path} inválido ({e}); reprocesse tudo com --completo')
+            return
+    else:
+        total_cnpjs = gravar_json_por_chave(novos.items(), json_path, indent=args.indent)
+    ledger_json.salvar()
 
-# Salva o JSON apenas uma vez ao final
-with open(json_path, 'w', encoding='utf-8') as f:
-    json.dump(resultados, f, ensure_ascii=False, indent=2)
+    print(f'Arquivo informacoes_cnpj.json criado com dados de {total_cnpjs} CNPJs.')
+    print(f'Total de arquivos CSV processados: {len(pendentes)}')
+    print(f'CNPJs com dados novos ou alterados: {cnpjs_atualizados}')
 
-print(f'Arquivo informacoes_cnpj.json criado com dados de {len(resultados)} CNPJs.')
-print(f'Total de arquivos CSV processados: {len(csv_files)}')
-print(f'CNPJs encontrados: {list(resultados.keys())}')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Gravação em streaming de JSONs no formato {chave: objeto} (CNPJ -> dados).
+
+Em vez de montar o dicionário inteiro e chamar json.dump, cada par
+(chave, objeto) é serializado e escrito assim que é produzido: a memória
+usada pela gravação é a de um único objeto. A saída é compacta por padrão;
+com `indent` o resultado é idêntico ao de json.dump(..., indent=indent).
+
+A gravação é feita num arquivo temporário que só substitui o destino ao
+final, então um leitor (a API, por exemplo) nunca vê um arquivo incompleto.
+
+A leitura (`ler_json_por_chave`) faz o caminho inverso: gera os pares de um
+objeto JSON um por vez, com a memória de um único valor mais o buffer. Com o
+texto original de cada valor (JsonBruto), quem reescreve o arquivo copia os
+valores que não mudaram sem serializá-los de novo.
+"""
+
+import json
+import os
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+BLOCO_LEITURA = 1024 * 1024  # 1 MiB
+
+class JsonBruto(str):
+    """Valor já serializado (como lido do arquivo), gravado sem passar por json.dumps."""
+
+def _item(chave: str, valor: Any, indent: Optional[int]) -> str:
+    if indent is None:
+        corpo = valor if isinstance(valor, JsonBruto) else json.dumps(valor, ensure_ascii=False, separators=(',', ':'))
+        return json.dumps(chave, ensure_ascii=False) + ':' + corpo
+    recuo = ' ' * indent
+    # Strings JSON não contêm quebras de linha literais: toda quebra é da indentação
+    if isinstance(valor, JsonBruto):
+        corpo = valor
+    else:
+        corpo = json.dumps(valor, ensure_ascii=False, indent=indent).replace('\n', '\n' + recuo)
+    return recuo + json.dumps(chave, ensure_ascii=False) + ': ' + corpo
+
+def gravar_json_por_chave(pares: Iterable[Tuple[str, Any]], destino, indent: Optional[int] = None) -> int:
+    """Grava `pares` como um objeto JSON em `destino`, um par por vez. Retorna o número de pares."""
+    destino = os.fspath(destino)
+    tmp_path = destino + '.tmp'
+    separador = ',' if indent is None else ',\n'
+    total = 0
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('{')
+            for chave, valor in pares:
+                if total:
+                    f.write(separador)
+                elif indent is not None:
+                    f.write('\n')
+                f.write(_item(chave, valor, indent))
+                total += 1
+            f.write('\n}' if indent is not None and total else '}')
+        os.replace(tmp_path, destino)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return total
+
+def ler_json_por_chave(origem, bloco: int = BLOCO_LEITURA, com_texto: bool = False) -> Iterator[tuple]:
+    """
+    Gera os pares (chave, valor) do objeto JSON em `origem`, na ordem do arquivo,
+    sem carregar o arquivo inteiro: cada valor é decodificado assim que o buffer
+    o contém por completo. Com `com_texto`, gera (chave, valor, JsonBruto) com o
+    texto do valor como está no arquivo.
+    """
+    decoder = json.JSONDecoder()
+    with open(origem, 'r', encoding='utf-8') as f:
+        buffer, pos, fim_arquivo = '', 0, False
+
+        def ler_mais():
+            # Descarta o que já foi consumido e traz o próximo bloco
+            nonlocal buffer, pos, fim_arquivo
+            dados = f.read(max(bloco, len(buffer) - pos))  # dobra a janela para valores grandes
+            fim_arquivo = not dados
+            buffer, pos = buffer[pos:] + dados, 0
+
+        def pular_espacos():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buffer) or fim_arquivo:
+                    return
+                ler_mais()
+
+        def esperar(caractere):
+            nonlocal pos
+            pular_espacos()
+            if pos >= len(buffer) or buffer[pos] != caractere:
+                raise ValueError(f"JSON inválido em {origem}: esperado {caractere!r}")
+            pos += 1
+
+        def decodificar():
+            nonlocal pos
+            pular_espacos()
+            while True:
+                try:
+                    valor, fim = decoder.raw_decode(buffer, pos)
+                    # Um número no fim do buffer pode continuar no próximo bloco
+                    if fim < len(buffer) or fim_arquivo:
+                        inicio, pos = pos, fim
+                        return valor, inicio
+                except json.JSONDecodeError:
+                    if fim_arquivo:
+                        raise
+                ler_mais()
+
+        esperar('{')
+        pular_espacos()
+        if buffer[pos:pos + 1] == '}':
+            return
+        while True:
+            chave, _ = decodificar()
+            esperar(':')
+            valor, inicio = decodificar()
+            if com_texto:
+                yield chave, valor, JsonBruto(buffer[inicio:pos])
+            else:
+                yield chave, valor
+            pular_espacos()
+            if buffer[pos:pos + 1] == '}':
+                return
+            esperar(',')
@@ -0,0 +1,48 @@
+"""
+Registro (ledger) dos arquivos de origem já ingeridos em um armazenamento.
+
+Cada CSV de dentro dos ZIPs é identificado pelo nome e por uma assinatura
+(CRC-32 e tamanho descompactado, lidos do diretório do ZIP sem descompactar
+nada). Uma execução só precisa processar os arquivos novos ou cuja assinatura
+mudou desde a última ingestão.
+"""
+
+import json
+import os
+import zipfile
+from typing import Dict
+
+def assinatura_membro(info: zipfile.ZipInfo) -> str:
+    """Assinatura de um membro do ZIP: CRC-32 e tamanho descompactado."""
+    return f"{info.CRC:08x}:{info.file_size}"
+
+class LedgerIngestao:
+    """Arquivo JSON com {nome do CSV: assinatura} do que já está no armazenamento."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.entradas: Dict[str, str] = {}
+        if os.path.exists(caminho):
+            try:
+                with open(caminho, 'r', encoding='utf-8') as f:
+                    self.entradas = json.load(f)
+            except Exception as e:
+                print(f'Registro de ingestão inválido em {caminho}, reprocessando tudo: {e}')
+
+    def pendente(self, nome_arquivo: str, assinatura: str) -> bool:
+        """True se o arquivo é novo ou mudou desde a última ingestão."""
+        return self.entradas.get(nome_arquivo) != assinatura
+
+    def registrar(self, nome_arquivo: str, assinatura: str):
+        self.entradas[nome_arquivo] = assinatura
+
+    def limpar(self):
+        self.entradas = {}
+
+    def salvar(self):
+        pasta = os.path.dirname(os.path.abspath(self.caminho))
+        os.makedirs(pasta, exist_ok=True)
+        tmp_path = self.caminho + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entradas, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.caminho)
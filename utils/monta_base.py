@@ -0,0 +1,198 @@
+"""
+Monta a base da API (database.json) direto dos ZIPs baixados, numa única passagem.
+
+Substitui a sequência extrai_cnpj.py -> informacoes_cnpj.json -> converte.py ->
+normalized.json -> normalize_cnpj_as_id.py -> api/database.json, que serializava
+e relia a base inteira três vezes. Aqui:
+
+- só os CSVs usados na normalização são lidos (balancete, CDA BLC_1 e PL,
+  informe diário), e apenas as colunas de que ela precisa, direto dos ZIPs;
+- cada arquivo é lido num processo separado e devolvido em colunas;
+- a normalização vetorizada de converte.py é aplicada por faixa de CNPJs
+  (os arquivos já vêm ordenados por CNPJ) e cada fundo é gravado no destino
+  assim que fica pronto (de forma atômica, para a API recarregar sem ler um
+  arquivo pela metade).
+
+Com destino .sqlite/.db a base é gravada em SQLite (ver base_sql.py).
+
+Uso:
+    python utils/monta_base.py --destino api/database.json
+    python utils/monta_base.py --destino api/database.sqlite
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import replace
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from utils.converte import ARQUIVOS_NORMALIZADOS, CNPJS_POR_LOTE, COLUNAS_PARQUET, iterar_fundos
+from utils.extrai_cnpj import (encontrar_coluna_cnpj, ler_csv_zip, ler_csv_zip_schema, listar_csvs_zip,
+                               ordenar_por_cnpj, temp_dir)
+from utils.base_sql import gravar_base_sql
+from utils.grava_json import gravar_json_por_chave
+from utils.schemas import schema_para
+
+destino_padrao = os.path.join(project_root, 'api', 'database.json')
+EXTENSOES_SQL = ('.sqlite', '.sqlite3', '.db')
+
+def tipo_do_arquivo(nome_arquivo):
+    """(tipo, período AAAAMM) de um CSV usado na normalização, ou (None, None)."""
+    for tipo, padrao in ARQUIVOS_NORMALIZADOS.items():
+        match = padrao.fullmatch(nome_arquivo)
+        if match:
+            return tipo, match.group(1)
+    return None, None
+
+def _ler_sem_esquema(caminho_zip, membro, nome_arquivo):
+    # Mesma detecção automática de extrai_cnpj.process_csv
+    for encoding in ['utf-8', 'latin1']:
+        for sep in [None, ';', ',']:
+            try:
+                return ordenar_por_cnpj(ler_csv_zip(caminho_zip, membro, encoding, sep), nome_arquivo,
+                                        encontrar_coluna_cnpj)
+            except Exception:
+                continue
+    return None, None
+
+def ler_arquivo(caminho_zip, membro):
+    """
+    Lê um CSV usado na normalização e devolve (tipo, DataFrame) com as colunas
+    CNPJ, PERIODO e as de COLUNAS_PARQUET do tipo, no formato esperado por
+    converte.normalize_dataframes.
+    """
+    nome_arquivo = os.path.basename(membro)
+    tipo, periodo = tipo_do_arquivo(nome_arquivo)
+    colunas = COLUNAS_PARQUET[tipo]
+
+    df, col_cnpj = None, None
+    schema = schema_para(nome_arquivo)
+    if schema is not None:
+        # Esquema reduzido às colunas usadas: o engine C nem converte as demais
+        enxuto = replace(schema, colunas={c: t for c, t in schema.colunas.items() if c in colunas})
+        try:
+            df, col_cnpj = ordenar_por_cnpj(ler_csv_zip_schema(caminho_zip, membro, enxuto), nome_arquivo,
+                                            enxuto.coluna_cnpj)
+        except Exception as e:
+            tqdm.write(f'Arquivo {nome_arquivo} fora do layout {schema.nome} ({e}), usando detecção automática')
+            df, col_cnpj = _ler_sem_esquema(caminho_zip, membro, nome_arquivo)
+    else:
+        df, col_cnpj = _ler_sem_esquema(caminho_zip, membro, nome_arquivo)
+    if df is None:
+        return tipo, None
+
+    df = df.reindex(columns=[col_cnpj, *colunas]).rename(columns={col_cnpj: 'CNPJ'})
+    # Mesmo preenchimento usado em informacoes_cnpj.json para textos ausentes
+    textos = [c for c in colunas if df[c].dtype != float]
+    df[textos] = df[textos].astype(object).fillna('NaN')
+    df['PERIODO'] = periodo
+    return tipo, df
+
+def gravar_base(fundos, destino):
+    """Grava (cnpj, fundo) em SQLite ou JSON, conforme a extensão do destino. Retorna o número de fundos."""
+    if os.path.splitext(destino)[1].lower() in EXTENSOES_SQL:
+        return gravar_base_sql(fundos, destino)
+    return gravar_json_por_chave(fundos, destino)
+
+def tabelas_por_faixa(blocos, cnpjs_por_lote=CNPJS_POR_LOTE):
+    """
+    Gera, para cada faixa de `cnpjs_por_lote` CNPJs, um DataFrame por tipo só com as
+    linhas da faixa (na ordem dos arquivos em `blocos`). Cada arquivo já vem ordenado
+    por CNPJ (ver ordenar_por_cnpj), então as faixas são fatias achadas por busca binária.
+
+    `blocos` é consumido: cada arquivo é repartido nas faixas e descartado, e as
+    partes de uma faixa são liberadas assim que ela é gerada, então a memória
+    ocupada pelos arquivos diminui à medida que as faixas são gravadas.
+    """
+    distintos = [pd.unique(df['CNPJ'].to_numpy()) for dfs in blocos.values() for df in dfs]
+    if not distintos:
+        return
+    # Primeiro CNPJ de cada faixa
+    primeiros = np.unique(np.concatenate(distintos))[::cnpjs_por_lote]
+    del distintos
+
+    # partes[tipo][faixa]: fatias dos arquivos do tipo, na ordem dos arquivos
+    partes = {tipo: [[] for _ in primeiros] for tipo in blocos}
+    for tipo, dfs in blocos.items():
+        while dfs:
+            df = dfs.pop(0)
+            cortes = np.append(np.searchsorted(df['CNPJ'].to_numpy(), primeiros, 'left'), len(df))
+            for faixa, (inicio, fim) in enumerate(zip(cortes[:-1], cortes[1:])):
+                if fim > inicio:
+                    # Cópia: a fatia não mantém o arquivo inteiro vivo
+                    partes[tipo][faixa].append(df.iloc[inicio:fim].copy())
+            del df
+
+    for faixa in range(len(primeiros)):
+        tabelas = {}
+        for tipo, por_faixa in partes.items():
+            fatias, por_faixa[faixa] = por_faixa[faixa], None
+            if fatias:
+                tabelas[tipo] = pd.concat(fatias, ignore_index=True)
+        yield tabelas
+
+def montar_base(pasta_zips=temp_dir, destino=destino_padrao, workers=None, cnpjs_por_lote=CNPJS_POR_LOTE):
+    """
+    Lê os ZIPs de `pasta_zips` e grava em `destino` a base normalizada por CNPJ
+    usada pela API. Retorna o número de fundos gravados (0 se nada foi gravado).
+
+    Os arquivos lidos ficam em memória como vieram dos processos (colunas do pandas)
+    até todos serem lidos; então são repartidos em faixas de `cnpjs_por_lote` CNPJs.
+    A junção entre arquivos e os dicts dos registros são montados por faixa, cada
+    faixa é gravada no destino assim que fica pronta e suas linhas são liberadas
+    em seguida (ver tabelas_por_faixa).
+    """
+    inicio = time.monotonic()
+    membros = [(caminho_zip, membro) for caminho_zip, membro, _ in listar_csvs_zip(pasta_zips)
+               if tipo_do_arquivo(os.path.basename(membro))[0]]
+    print(f'{len(membros)} arquivos CSV usados na base da API em {pasta_zips}')
+
+    blocos = {tipo: [] for tipo in ARQUIVOS_NORMALIZADOS}
+    num_workers = workers or os.cpu_count() or 4
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(ler_arquivo, caminho_zip, membro): membro for caminho_zip, membro in membros}
+        for future in tqdm(as_completed(futures), total=len(futures), desc=f'Lendo CSVs ({num_workers} processos)'):
+            membro = futures[future]
+            try:
+                tipo, df = future.result()
+            except Exception as e:
+                tqdm.write(f'Erro ao processar {os.path.basename(membro)}: {e}')
+                continue
+            if df is None:
+                tqdm.write(f'Não foi possível ler o arquivo {os.path.basename(membro)}')
+                continue
+            blocos[tipo].append(df)
+
+    # Ordem dos arquivos por período, como em informacoes_cnpj.json
+    for dfs in blocos.values():
+        dfs.sort(key=lambda d: d['PERIODO'].iat[0] if len(d) else '')
+    # Uma faixa de CNPJs por vez: só as linhas da faixa são juntadas e convertidas
+    fundos = (fundo for tabelas in tabelas_por_faixa(blocos, cnpjs_por_lote) for fundo in iterar_fundos(tabelas))
+    primeiro = next(fundos, None)
+    if primeiro is None:
+        # Não troca a base em uso por uma vazia
+        print(f'Nenhum fundo encontrado; {destino} não foi alterado')
+        return 0
+
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    total = gravar_base(itertools.chain([primeiro], fundos), destino)
+    print(f'Base com {total} fundos gravada em {destino} ({time.monotonic() - inicio:.1f}s)')
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Monta a base da API direto dos ZIPs da pasta temp.")
+    parser.add_argument('--pasta', default=temp_dir, help='Pasta com os ZIPs baixados (padrão: utils/temp)')
+    parser.add_argument('--destino', default=destino_padrao, help='Arquivo de saída: .json ou .sqlite (padrão: api/database.json)')
+    parser.add_argument('--workers', type=int, default=None, help='Processos de leitura (padrão: nº de CPUs)')
+    args = parser.parse_args()
+    montar_base(args.pasta, args.destino, args.workers)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Armazenamento colunar (Parquet) opcional dos dados extraídos.
+
+Cada tipo de arquivo com esquema conhecido (balancete, cda_blc, cda_pl,
+inf_diario) vira um dataset Parquet próprio, particionado por período e
+ordenado por CNPJ:
+
+    <pasta>/<tipo>/periodo=AAAAMM/<arquivo de origem>.parquet
+
+Como as linhas estão ordenadas por CNPJ, as estatísticas de cada row group
+permitem que filtros por CNPJ e por período leiam apenas os trechos
+necessários. Requer `pyarrow` (pip install pyarrow).
+"""
+
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # dependência opcional
+    pa = ds = pq = None
+
+from utils.schemas import NUMERO, SCHEMAS, CsvSchema
+
+COLUNA_CNPJ = 'CNPJ_FUNDO_CLASSE'
+COLUNA_ARQUIVO = 'ARQUIVO'
+LINHAS_POR_ROW_GROUP = 64_000
+
+def exigir_pyarrow():
+    if pa is None:
+        raise ImportError("O armazenamento Parquet requer pyarrow: pip install pyarrow")
+
+def periodo_do_arquivo(nome_arquivo: str) -> Optional[str]:
+    match = re.search(r'(\d{6})', nome_arquivo)
+    return match.group(1) if match else None
+
+def _schema_arrow(schema: CsvSchema):
+    campos = [pa.field(COLUNA_CNPJ, pa.string()), pa.field(COLUNA_ARQUIVO, pa.string())]
+    for coluna, tipo in schema.colunas.items():
+        campos.append(pa.field(coluna, pa.float64() if tipo == NUMERO else pa.string()))
+    return pa.schema(campos)
+
+# ------------------------------
+# ESCRITA
+# ------------------------------
+def gravar_arquivo(pasta: str, schema: CsvSchema, nome_arquivo: str, df: pd.DataFrame, col_cnpj: str) -> str:
+    """
+    Grava os registros de um CSV de origem (já ordenados por CNPJ) na partição do seu período.
+    Todas as partições de um tipo compartilham o mesmo esquema: colunas ausentes
+    no arquivo de origem ficam nulas e a coluna de CNPJ é sempre CNPJ_FUNDO_CLASSE.
+    Células vazias das colunas de texto que o arquivo tem são gravadas como 'NaN',
+    como em informacoes_cnpj.json; assim um nulo de texto significa "coluna ausente".
+    """
+    exigir_pyarrow()
+    periodo = periodo_do_arquivo(nome_arquivo)
+    destino_dir = os.path.join(pasta, schema.nome, f"periodo={periodo}")
+    os.makedirs(destino_dir, exist_ok=True)
+    destino = os.path.join(destino_dir, os.path.splitext(nome_arquivo)[0] + ".parquet")
+
+    df = df.rename(columns={col_cnpj: COLUNA_CNPJ})
+    df[COLUNA_ARQUIVO] = nome_arquivo
+    textos = [c for c in df.columns if schema.colunas.get(c, NUMERO) != NUMERO]
+    df[textos] = df[textos].astype(object).fillna('NaN')
+    esquema = _schema_arrow(schema)
+    df = df.reindex(columns=esquema.names)
+    tabela = pa.Table.from_pandas(df, schema=esquema, preserve_index=False)
+
+    tmp_path = destino + ".tmp"
+    pq.write_table(tabela, tmp_path, row_group_size=LINHAS_POR_ROW_GROUP, compression='zstd')
+    os.replace(tmp_path, destino)
+    return destino
+
+# ------------------------------
+# LEITURA
+# ------------------------------
+def tipos_disponiveis(pasta: str) -> List[str]:
+    return [s.nome for s in SCHEMAS if os.path.isdir(os.path.join(pasta, s.nome))]
+
+def _dataset(pasta: str, tipo: str):
+    exigir_pyarrow()
+    particionamento = ds.partitioning(pa.schema([('periodo', pa.string())]), flavor='hive')
+    return ds.dataset(os.path.join(pasta, tipo), format='parquet', partitioning=particionamento)
+
+def cnpjs_disponiveis(pasta: str) -> List[str]:
+    """CNPJs presentes em qualquer tipo do armazenamento, em ordem."""
+    cnpjs = set()
+    for tipo in tipos_disponiveis(pasta):
+        coluna = _dataset(pasta, tipo).to_table(columns=[COLUNA_CNPJ]).column(COLUNA_CNPJ)
+        cnpjs.update(coluna.unique().to_pylist())
+    cnpjs.discard(None)
+    return sorted(cnpjs)
+
+def ler_tipo(pasta: str, tipo: str, colunas: Optional[List[str]] = None,
+             periodos: Optional[Iterable[str]] = None, cnpjs: Optional[Iterable[str]] = None,
+             faixa_cnpj: Optional[Tuple[str, str]] = None) -> pd.DataFrame:
+    """
+    Lê um tipo do armazenamento como DataFrame, carregando só as colunas pedidas
+    e apenas as partições/row groups que atendem aos filtros de período e CNPJ.
+    `faixa_cnpj` (primeiro, último) seleciona uma faixa contígua de CNPJs.
+    """
+    dataset = _dataset(pasta, tipo)
+    filtro = None
+    if periodos is not None:
+        filtro = ds.field('periodo').isin([str(p) for p in periodos])
+    if cnpjs is not None:
+        filtro_cnpj = ds.field(COLUNA_CNPJ).isin(list(cnpjs))
+        filtro = filtro_cnpj if filtro is None else filtro & filtro_cnpj
+    if faixa_cnpj is not None:
+        filtro_faixa = (ds.field(COLUNA_CNPJ) >= faixa_cnpj[0]) & (ds.field(COLUNA_CNPJ) <= faixa_cnpj[1])
+        filtro = filtro_faixa if filtro is None else filtro & filtro_faixa
+    if colunas is not None:
+        colunas = list(dict.fromkeys([COLUNA_CNPJ, COLUNA_ARQUIVO, 'periodo', *colunas]))
+    return dataset.to_table(columns=colunas, filter=filtro).to_pandas()
+
+def carregar_informacoes(pasta: str, colunas: Optional[Dict[str, List[str]]] = None,
+                         cnpjs: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, list]]:
+    """
+    Monta o dicionário no formato de informacoes_cnpj.json (CNPJ → arquivo → registros)
+    a partir do armazenamento Parquet. `colunas` limita, por tipo, as colunas lidas.
+    """
+    resultados: Dict[str, Dict[str, list]] = {}
+    for tipo in tipos_disponiveis(pasta):
+        df = ler_tipo(pasta, tipo, (colunas or {}).get(tipo), cnpjs=cnpjs)
+        df = df.drop(columns=['periodo'], errors='ignore')
+        # Numéricos vazios viram 'NaN' como no JSON; textos nulos são colunas que o arquivo não tinha
+        numeros = [c for c in df.columns if df[c].dtype == float]
+        df = df.astype(object)
+        df[numeros] = df[numeros].fillna('NaN')
+        df = df.where(df.notna(), None)
+        for (cnpj, arquivo), grupo in df.groupby([COLUNA_CNPJ, COLUNA_ARQUIVO], sort=False):
+            registros = grupo.drop(columns=[COLUNA_ARQUIVO]).to_dict(orient='records')
+            resultados.setdefault(cnpj, {})[arquivo] = registros
+    return resultados
+
+def assinatura(pasta: str):
+    """(maior mtime, tamanho total) dos arquivos Parquet, para detectar atualizações."""
+    mtime, tamanho = 0, 0
+    for raiz, _, arquivos in os.walk(pasta):
+        for arquivo in arquivos:
+            if arquivo.endswith('.parquet'):
+                st = os.stat(os.path.join(raiz, arquivo))
+                mtime, tamanho = max(mtime, st.st_mtime_ns), tamanho + st.st_size
+    return mtime, tamanho
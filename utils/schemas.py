@@ -0,0 +1,122 @@
+"""
+Layouts conhecidos dos arquivos CSV da CVM.
+
+Cada esquema declara, para um padrão de nome de arquivo, o separador, a
+codificação, as colunas usadas (com seus tipos) e as possíveis colunas de
+CNPJ. Com isso a leitura usa o engine C do pandas e carrega só as colunas
+necessárias; arquivos sem esquema continuam passando pela detecção automática.
+
+Consequência para informacoes_cnpj.json: nos arquivos com esquema só as colunas
+declaradas aparecem, e as colunas NUMERO são gravadas como números JSON (não
+como texto); ausentes continuam como 'NaN'. converte.to_float aceita os dois.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+TEXTO = 'str'
+NUMERO = 'float64'
+
+@dataclass(frozen=True)
+class CsvSchema:
+    nome: str
+    padrao: str
+    colunas: Dict[str, str]
+    colunas_cnpj: Tuple[str, ...] = ('CNPJ_FUNDO_CLASSE', 'CNPJ_FUNDO')
+    sep: str = ';'
+    encoding: str = 'latin1'
+    _regex: re.Pattern = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, '_regex', re.compile(self.padrao))
+
+    def aceita(self, nome_arquivo: str) -> bool:
+        return self._regex.fullmatch(nome_arquivo) is not None
+
+    def usa_coluna(self, coluna: str) -> bool:
+        return coluna in self.colunas or coluna in self.colunas_cnpj
+
+    @property
+    def dtypes(self) -> Dict[str, str]:
+        tipos = dict(self.colunas)
+        tipos.update({col: TEXTO for col in self.colunas_cnpj})
+        return tipos
+
+    def coluna_cnpj(self, colunas) -> Optional[str]:
+        """Primeira coluna de CNPJ do esquema presente no cabeçalho."""
+        for col in self.colunas_cnpj:
+            if col in colunas:
+                return col
+        return None
+
+# ------------------------------
+# REGISTRO DE ESQUEMAS
+# ------------------------------
+_IDENTIFICACAO = {
+    'TP_FUNDO_CLASSE': TEXTO,
+    'TP_FUNDO': TEXTO,
+    'DT_COMPTC': TEXTO,
+}
+
+SCHEMAS = [
+    CsvSchema(
+        nome='balancete',
+        padrao=r'balancete_fi_\d{6}\.csv',
+        colunas={
+            **_IDENTIFICACAO,
+            'PLANO_CONTA_BALCTE': TEXTO,
+            'CD_CONTA_BALCTE': TEXTO,
+            'VL_SALDO_BALCTE': NUMERO,
+        },
+    ),
+    CsvSchema(
+        nome='cda_blc',
+        padrao=r'cda_fi_BLC_\d+_\d{6}\.csv',
+        colunas={
+            **_IDENTIFICACAO,
+            'DENOM_SOCIAL': TEXTO,
+            'TP_APLIC': TEXTO,
+            'TP_ATIVO': TEXTO,
+            'EMISSOR_LIGADO': TEXTO,
+            'TP_NEGOC': TEXTO,
+            'QT_POS_FINAL': NUMERO,
+            'VL_MERC_POS_FINAL': NUMERO,
+            'VL_CUSTO_POS_FINAL': NUMERO,
+            'CD_ISIN': TEXTO,
+            'CD_SELIC': TEXTO,
+            'DT_EMISSAO': TEXTO,
+            'DT_VENC': TEXTO,
+        },
+    ),
+    CsvSchema(
+        nome='cda_pl',
+        padrao=r'cda_fi_PL_\d{6}\.csv',
+        colunas={
+            **_IDENTIFICACAO,
+            'DENOM_SOCIAL': TEXTO,
+            'VL_PATRIM_LIQ': NUMERO,
+        },
+    ),
+    CsvSchema(
+        nome='inf_diario',
+        padrao=r'inf_diario_fi_\d{6}\.csv',
+        colunas={
+            **_IDENTIFICACAO,
+            'ID_SUBCLASSE': TEXTO,
+            'VL_TOTAL': NUMERO,
+            'VL_QUOTA': NUMERO,
+            'VL_PATRIM_LIQ': NUMERO,
+            'CAPTC_DIA': NUMERO,
+            'RESG_DIA': NUMERO,
+            'NR_COTST': NUMERO,
+        },
+    ),
+]
+
+def schema_para(nome_arquivo: str) -> Optional[CsvSchema]:
+    """Retorna o esquema do arquivo pelo nome, ou None se o layout for desconhecido."""
+    for schema in SCHEMAS:
+        if schema.aceita(nome_arquivo):
+            return schema
+    return None